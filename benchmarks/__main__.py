@@ -0,0 +1,145 @@
+"""
+Keystroke latency benchmarks for esc.
+
+Run the suite against the working tree and save the results:
+
+    python -m benchmarks run -o results.json
+
+Compare two result files, or two git revisions (each is checked out into a
+temporary worktree and benchmarked with this copy of the suite):
+
+    python -m benchmarks compare old.json new.json
+    python -m benchmarks compare master HEAD --threshold 15
+
+compare exits with status 1 if any scenario's median latency got worse by
+more than the threshold (a percentage).
+"""
+
+import argparse
+import json
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _git(*args, cwd=REPO_ROOT):
+    return subprocess.run(('git',) + args, cwd=cwd, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def _describe_revision(esc_path):
+    try:
+        return _git('rev-parse', 'HEAD', cwd=esc_path)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def run(args):
+    "Run the suite and write (or print) the results as JSON."
+    esc_path = Path(args.esc_path).resolve() if args.esc_path else REPO_ROOT
+    sys.path.insert(0, str(esc_path))
+    from benchmarks import scenarios  # pylint: disable=import-outside-toplevel
+
+    depths = tuple(args.depths) if args.depths else scenarios.DEFAULT_DEPTHS
+    results = scenarios.run_all(args.iterations, depths, args.only)
+    document = {
+        'revision': _describe_revision(esc_path),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    output = json.dumps(document, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    for name, stats in results.items():
+        print(f"{name:40} {stats['median_ms']:10.3f} ms", file=sys.stderr)
+
+
+def _results_for(spec, args, workdir):
+    """
+    Load results from /spec/, which is a JSON file if one exists by that
+    name and otherwise a git revision to benchmark.
+    """
+    if Path(spec).is_file():
+        return json.loads(Path(spec).read_text())
+
+    revision = _git('rev-parse', '--verify', spec)
+    tree = Path(workdir) / revision
+    output = Path(workdir) / f"{revision}.json"
+    _git('worktree', 'add', '--detach', str(tree), revision)
+    try:
+        command = [sys.executable, '-m', 'benchmarks', 'run',
+                   '--esc-path', str(tree), '-o', str(output),
+                   '--iterations', str(args.iterations)]
+        if args.depths:
+            command += ['--depths', *(str(d) for d in args.depths)]
+        if args.only:
+            command += ['--only', args.only]
+        subprocess.run(command, cwd=REPO_ROOT, check=True)
+    finally:
+        _git('worktree', 'remove', '--force', str(tree))
+    return json.loads(output.read_text())
+
+
+def compare(args):
+    "Compare two sets of results, returning 1 if there are regressions."
+    with tempfile.TemporaryDirectory() as workdir:
+        old = _results_for(args.old, args, workdir)['results']
+        new = _results_for(args.new, args, workdir)['results']
+
+    regressions = 0
+    for name in sorted(old.keys() & new.keys()):
+        before = old[name]['median_ms']
+        after = new[name]['median_ms']
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:40} {before:10.3f} -> {after:10.3f} ms "
+              f"({change:+7.1f}%){flag}")
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f"{name:40} (only in {'old' if name in old else 'new'})")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Keystroke latency benchmarks for esc.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="run the benchmark suite")
+    run_parser.add_argument('-o', '--output', help="write JSON results here")
+    run_parser.add_argument('--esc-path',
+                            help="directory containing the esc package to test")
+
+    compare_parser = subparsers.add_parser(
+        'compare', help="compare two result files or git revisions")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help="percent slowdown counted as a regression")
+
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument('--iterations', type=int, default=20)
+        subparser.add_argument('--depths', type=int, nargs='+',
+                               help="stack depths for the depth scenarios")
+        subparser.add_argument('--only',
+                               help="run only scenarios whose name contains this")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
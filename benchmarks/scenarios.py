@@ -0,0 +1,242 @@
+"""
+scenarios.py - keystroke latency scenarios for the esc main loop
+
+Each scenario sets up a stack and registry, then feeds the same sequence of
+keys through the real user_loop some number of times on a headless screen.
+A sample is the time from reading the first key of an iteration until the
+loop has redrawn the screen and asks for the key after the last one.
+"""
+
+import decimal
+from decimal import Decimal
+import curses
+import random
+import statistics
+import string
+import time
+
+from esc import display
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc.commands import EscMenu, Operation, main_menu
+from esc.history import hs
+from esc.registers import Registry
+from esc.stack import StackItem, StackSlice, StackState
+from esc.units import UnitExpression
+
+REDO_KEY = 0x12  # ^R
+PALETTE_KEY = 0x10  # ^P
+ESCAPE_KEY = 27
+DEFAULT_DEPTHS = (10, 10**3, 10**5, 10**6)
+
+
+class TimingTerminal(headless.HeadlessTerminal):
+    "Headless terminal that records when each key is requested."
+    def __init__(self, height=24, width=80, keys=()):
+        super().__init__(height, width, keys)
+        self.stamps = []
+
+    def next_key(self):
+        self.stamps.append(time.perf_counter())
+        return super().next_key()
+
+
+def _prefilled(depth, unit=None):
+    "Return a StackState holding /depth/ numbered items."
+    ss = StackState()
+    ss.push([StackItem(decval=Decimal(i), unit=unit) for i in range(depth)])
+    return ss
+
+
+def _measure(iteration_keys, iterations, ss, registry, warmup=()):
+    """
+    Run /warmup/ keys untimed, then /iteration_keys/ /iterations/ times,
+    returning the elapsed seconds for each iteration.
+    """
+    iteration_keys = _expand(iteration_keys)
+    hs.clear()
+    terminal = TimingTerminal()
+    display.init(terminal, screen_class=headless.HeadlessScreen)
+    headless.run(warmup, ss, registry)
+
+    keys = []
+    for _ in range(iterations):
+        keys.extend(iteration_keys)
+    terminal.stamps.clear()
+    headless.run(keys, ss, registry)
+
+    per_iteration = len(iteration_keys)
+    stamps = terminal.stamps
+    return [stamps[i + per_iteration] - stamps[i]
+            for i in range(0, len(stamps) - per_iteration, per_iteration)]
+
+
+def _expand(keys):
+    "Flatten strings in a key sequence into individual key codes."
+    expanded = []
+    for key in keys:
+        if isinstance(key, str):
+            expanded.extend(ord(c) for c in key)
+        else:
+            expanded.append(key)
+    return expanded
+
+
+def _iterations_for(depth, requested):
+    "Fewer iterations on very deep stacks, where each one takes seconds."
+    return max(3, min(requested, 10**6 // max(depth, 1)))
+
+
+def _scenarios(iterations, depths):
+    """
+    Yield (name, keys, iterations, setup) for each scenario, where setup()
+    returns the (ss, registry, warmup_keys) to run it against. Setup is
+    deferred so skipped scenarios don't build their deep stacks.
+    """
+    yield ("digit entry", ["12345678 "], iterations,
+           lambda: (StackState(), Registry(), ()))
+
+    for depth in depths:
+        count = _iterations_for(depth, iterations)
+        yield (f"add, depth {depth}", ["+"], count,
+               lambda d=depth + count: (_prefilled(d), Registry(), ()))
+
+    for depth in depths:
+        yield (f"undo/redo, depth {depth}", ["u", REDO_KEY],
+               _iterations_for(depth, iterations),
+               lambda d=depth: (_prefilled(d), Registry(), ["d"]))
+
+    # F1, the command to get help on, then any key to dismiss the help.
+    yield ("help simulation, depth 1000", [curses.KEY_F1, "+", "q"], iterations,
+           lambda: (_prefilled(1000), Registry(), ()))
+
+    def full_registry():
+        registry = Registry()
+        for letter in string.ascii_letters:
+            registry[letter] = StackItem(decval=Decimal(ord(letter)))
+        return _prefilled(10), registry, ()
+    yield ("register store/recall, 52 registers", [">a\n<b\np"], iterations,
+           full_registry)
+
+    def stack_register(depth):
+        ss = _prefilled(depth)
+        registry = Registry()
+        registry['v'] = StackSlice(ss.s)
+        return ss, registry, ()
+    for depth in depths:
+        count = _iterations_for(depth, iterations)
+        yield (f"stack register capture, depth {depth}", ["}v\n"], count,
+               lambda d=depth: stack_register(d))
+        # Push the whole register back, then undo to keep the depth steady.
+        yield (f"stack register recall, depth {depth}", ["<v\n", "u"], count,
+               lambda d=depth: stack_register(d))
+
+    # Map square root over the whole stack, then undo to keep it steady.
+    square_meters = UnitExpression({"m": 2})
+    yield ("map sqrt, depth 10000", ["&s", "u"], _iterations_for(10000, iterations),
+           lambda: (_prefilled(10000, unit=square_meters), Registry(), ()))
+
+    # The same at a given precision, set while warming up.
+    for digits in (12, 50, 500):
+        yield (f"map sqrt, depth 1000, {digits} digits", ["&s", "u"],
+               _iterations_for(1000, iterations),
+               lambda d=digits: (_prefilled(1000), Registry(), [f"{d}nn"]))
+
+    # Batch work under each number backend, chosen while warming up.
+    for backend, key in (("decimal", "d"), ("float", "f"),
+                         ("rational", "r")):
+        for name, keys in (("map sqrt", ["&s", "u"]), ("reduce +", ["$+", "u"]),
+                           ("scan *", ["#*", "u"])):
+            yield (f"{name}, depth 10000, {backend} backend", keys,
+                   _iterations_for(10000, iterations),
+                   lambda k=key: (_prefilled(10000), Registry(), [f"n{k}"]))
+
+    meters = UnitExpression({"m": 1})
+    yield ("reduce +, depth 10000", ["$+", "u"], _iterations_for(10000, iterations),
+           lambda: (_prefilled(10000, unit=meters), Registry(), ()))
+
+    yield ("sort, depth 10000", ["oa", "u"], _iterations_for(10000, iterations),
+           lambda: (_prefilled(10000, unit=meters), Registry(), ()))
+
+    def range_bounds():
+        ss = StackState()
+        ss.push([Decimal(1), Decimal(10**6)])
+        return ss, Registry(), ()
+    # Generate 1..1000000 and sum it, then undo both to start over.
+    yield ("generate and sum 1..1000000", ["gr", "$+", "u", "u"], iterations,
+           range_bounds)
+
+    def many_operations():
+        _register_operations(5000)
+        return StackState(), Registry(), ()
+    # Open the palette, type a query a key at a time, then cancel.
+    yield ("command palette, 5000 operations",
+           [PALETTE_KEY, "sq mete", ESCAPE_KEY], iterations, many_operations)
+
+    yield ("unit-tagged arithmetic", ["3\\m\n4\\m\n+2\\s\n/"], iterations,
+           lambda: (_prefilled(10, unit=meters), Registry(), ()))
+
+
+def _register_operations(count):
+    """
+    Add /count/ operations with made-up descriptions and docstrings to the
+    menu tree, three menus deep under '`', as a large plugin set would.
+    """
+    if '`' in main_menu.children:
+        return
+    rng = random.Random(count)
+    vocabulary = ("add apply average bearing celsius compound convert cosine "
+                  "cube days degrees distance divide exponent factorial feet "
+                  "gallons grams hours interest kelvin length liters logarithm "
+                  "mass mean median meters miles minutes modulus negate ounces "
+                  "percent pounds power radians rate reciprocal round scale "
+                  "seconds sine speed square sum tangent time total volume "
+                  "weight yards").split()
+    top = EscMenu('`', "benchmark operations", doc="Operations for benchmarks.")
+    main_menu.register_child(top)
+    per_menu = 25
+    menu_keys = string.ascii_letters + string.digits
+    for n in range(count):
+        if n % per_menu == 0:
+            outer_key = menu_keys[n // (per_menu * len(menu_keys))]
+            if outer_key not in top.children:
+                top.register_child(EscMenu(outer_key, f"group {outer_key}",
+                                           doc="A group of menus."))
+            outer = top.children[outer_key]
+            inner_key = menu_keys[(n // per_menu) % len(menu_keys)]
+            inner = EscMenu(inner_key, f"menu {inner_key}", doc="A menu.")
+            outer.register_child(inner)
+        def identity(bos):
+            return bos
+        identity.__doc__ = f"Compute the {' '.join(rng.sample(vocabulary, 8))}."
+        Operation(key=menu_keys[n % per_menu], menu=inner, push=1,
+                  description=' '.join(rng.sample(vocabulary, 3)))(identity)
+
+
+def run_all(iterations=20, depths=DEFAULT_DEPTHS, only=None):
+    """
+    Run every scenario and return a dict mapping scenario names to summary
+    statistics in milliseconds. If /only/ is given, run only scenarios whose
+    name contains that string.
+    """
+    results = {}
+    for name, keys, count, setup in _scenarios(iterations, depths):
+        if only is not None and only not in name:
+            continue
+        ss, registry, warmup = setup()
+        with decimal.localcontext():  # keep precision changes to this scenario
+            samples = _measure(keys, count, ss, registry, warmup)
+        results[name] = _summarize(samples, len(_expand(keys)))
+    return results
+
+
+def _summarize(samples, keys):
+    millis = [s * 1000 for s in samples]
+    return {
+        'median_ms': statistics.median(millis),
+        'mean_ms': statistics.fmean(millis),
+        'min_ms': min(millis),
+        'max_ms': max(millis),
+        'samples': len(millis),
+        'keys_per_sample': keys,
+    }
@@ -0,0 +1,318 @@
+"""
+stats.py - esc plugin for summary statistics of the whole stack
+Copyright (c) 2026 Soren Bjornstad.
+
+This plugin is provided with the esc distribution:
+<https://github.com/sobjornstad/esc>
+
+Each operation reads the stack in one pass using constant extra memory,
+so it's practical to sanity-check a stack of hundreds of thousands of
+values, except for the median and percentiles, which need a copy of the
+values to select from (but not a full sort).
+"""
+
+from collections import namedtuple
+import decimal
+from decimal import Decimal
+from functools import reduce
+import random
+
+from esc.commands import Menu, Operation, main_menu
+from esc.oops import InsufficientItemsError
+from esc.units import additive_unit_handling
+
+
+stats_doc = """
+    Summarize the values on the stack: count, sum, mean, variance and
+    standard deviation, minimum and maximum, median and percentiles, and
+    histograms. All items must have the same unit, if any.
+"""
+stats_menu = Menu('v', 'statistics menu', parent=main_menu, doc=stats_doc)
+
+_additive = additive_unit_handling()
+
+
+def count_units(*units):
+    "additive (units must match); count is unitless"
+    if units:
+        _additive(*units)
+    return [None]
+
+
+def squared_units(*units):
+    "additive (units must match), squared"
+    unit, = _additive(*units)
+    return [unit ** 2]
+
+
+def percentile_units(*units):
+    "additive (units of the values must match)"
+    return _additive(*units[:-1])
+
+
+def histogram_units(*units, num_results):
+    "additive (units of the values must match); counts are unitless"
+    _additive(*units[:-1])
+    return [None] * num_results
+
+
+def summary_units(*units):
+    "additive (units must match); count is unitless"
+    unit, = _additive(*units)
+    return [None, unit, unit, unit, unit]
+
+
+# Adds without rounding, raising Inexact rather than losing a digit.
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, traps=[decimal.Inexact])
+
+Summary = namedtuple('Summary', 'count total mean squares minimum maximum')
+
+
+def summarize_values(values):
+    """
+    Return a Summary of /values/ in one pass: their count, sum, mean, sum of
+    squared deviations from the mean, minimum and maximum.
+
+    The sum is kept exactly and rounded once at the end, and the mean is
+    taken from it, so neither accumulates rounding error however many
+    values there are or however much they differ in size. The squared
+    deviations are updated as each value is read using a running mean
+    (Welford's algorithm), which unlike summing the values and their squares
+    doesn't lose precision when the values are large compared to their
+    spread.
+    """
+    count_ = 0
+    total_ = running_mean = squares = Decimal(0)
+    smallest = largest = None
+    for value in values:
+        count_ += 1
+        total_ = _EXACT.add(total_, value)
+        delta = value - running_mean
+        running_mean += delta / count_
+        squares += delta * (value - running_mean)
+        if smallest is None or value < smallest:
+            smallest = value
+        if largest is None or value > largest:
+            largest = value
+    mean_ = total_ / count_ if count_ else Decimal(0)
+    return Summary(count_, +total_, mean_, squares, smallest, largest)
+
+
+def exact_sum(values):
+    "Return the sum of /values/, added exactly and rounded once at the end."
+    return +reduce(_EXACT.add, values, Decimal(0))
+
+
+def select(values, k):
+    """
+    Return the /k/-th smallest of /values/, counting from 0, in linear time
+    on average (quickselect), without sorting them.
+    """
+    while True:
+        pivot = random.choice(values)
+        lower = [i for i in values if i < pivot]
+        if k < len(lower):
+            values = lower
+            continue
+        equal = sum(1 for i in values if i == pivot)
+        if k < len(lower) + equal:
+            return pivot
+        k -= len(lower) + equal
+        values = [i for i in values if i > pivot]
+
+
+def percentile_of(values, percent):
+    """
+    Return the /percent/-th percentile of /values/, interpolating linearly
+    between the two closest values if it falls between them.
+    """
+    if not 0 <= percent <= 100:
+        raise ValueError("Percentile must be between 0 and 100.")
+    position = Decimal(percent) / 100 * (len(values) - 1)
+    below = int(position)
+    low = select(values, below)
+    if position == below:
+        return low
+    high = select(values, below + 1)
+    return low + (high - low) * (position - below)
+
+
+def _need(stack, number_required):
+    if len(stack) < number_required:
+        raise InsufficientItemsError(number_required=number_required)
+
+
+@Operation('n', menu=stats_menu, push=1, description='count',
+           log_as=lambda args, retval: f"count of stack = {retval[0]}",
+           unit_handling=count_units)
+def count(*stack):
+    "Count the items on the stack."
+    return len(stack)
+
+count.ensure(before=[], after=[0])
+count.ensure(before=[5, 5, 5], after=[3])
+
+
+@Operation('s', menu=stats_menu, push=1, description='sum',
+           log_as=lambda args, retval: f"sum of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def total(*stack):
+    """
+    Sum every item on the stack. Every addition is exact and the total is
+    rounded only once, so it's as accurate as the precision allows even for
+    many values of very different sizes.
+    """
+    _need(stack, 1)
+    return exact_sum(stack)
+
+total.ensure(before=[], raises=InsufficientItemsError)
+total.ensure(before=[1, 2, 3.5], after=[6.5])
+total.ensure(before=[Decimal("1e30"), 1, Decimal("-1e30")], after=[1])
+
+
+@Operation('m', menu=stats_menu, push=1, description='mean',
+           log_as=lambda args, retval: f"mean of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def mean(*stack):
+    "Take the arithmetic mean of the items on the stack."
+    _need(stack, 1)
+    return exact_sum(stack) / len(stack)
+
+mean.ensure(before=[], raises=InsufficientItemsError)
+mean.ensure(before=[2, 4, 4, 4, 5, 5, 7, 9], after=[5])
+mean.ensure(before=[Decimal("1e20") + i for i in range(4)],
+            after=[Decimal("1e20") + Decimal("1.5")])
+
+
+@Operation('v', menu=stats_menu, push=1, description='variance',
+           log_as=lambda args, retval: f"variance of {len(args)} items = {retval[0]}",
+           unit_handling=squared_units)
+def variance(*stack):
+    """
+    Find the sample variance of the items on the stack (dividing by one
+    less than the number of items).
+    """
+    _need(stack, 2)
+    summary = summarize_values(stack)
+    return summary.squares / (summary.count - 1)
+
+variance.ensure(before=[1], raises=InsufficientItemsError)
+variance.ensure(before=[2, 4, 4, 4, 5, 5, 7, 9], after=[Decimal(32) / 7],
+                close=True)
+
+
+@Operation('d', menu=stats_menu, push=1, description='standard deviation',
+           log_as=lambda args, retval: f"std dev of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def standard_deviation(*stack):
+    "Find the sample standard deviation of the items on the stack."
+    _need(stack, 2)
+    summary = summarize_values(stack)
+    return (summary.squares / (summary.count - 1)).sqrt()
+
+standard_deviation.ensure(before=[1], raises=InsufficientItemsError)
+standard_deviation.ensure(before=[1, 3], after=[Decimal(2).sqrt()])
+
+
+@Operation('<', menu=stats_menu, push=1, description='minimum',
+           log_as=lambda args, retval: f"min of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def minimum(*stack):
+    "Find the smallest item on the stack."
+    _need(stack, 1)
+    return min(stack)
+
+minimum.ensure(before=[3, -1, 2], after=[-1])
+
+
+@Operation('>', menu=stats_menu, push=1, description='maximum',
+           log_as=lambda args, retval: f"max of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def maximum(*stack):
+    "Find the largest item on the stack."
+    _need(stack, 1)
+    return max(stack)
+
+maximum.ensure(before=[3, -1, 2], after=[3])
+
+
+@Operation('e', menu=stats_menu, push=1, description='median',
+           log_as=lambda args, retval: f"median of {len(args)} items = {retval[0]}",
+           unit_handling=additive_unit_handling())
+def median(*stack):
+    """
+    Find the median of the items on the stack: the middle value, or the
+    mean of the two middle values if there's an even number of items.
+    """
+    _need(stack, 1)
+    return percentile_of(list(stack), 50)
+
+median.ensure(before=[5, 1, 3], after=[3])
+median.ensure(before=[4, 1, 3, 2], after=[Decimal("2.5")])
+median.ensure(before=[7, 7, 7, 1], after=[7])
+
+
+@Operation('p', menu=stats_menu, push=1, description='percentile',
+           log_as=lambda args, retval: (f"{args[-1]}th percentile of "
+                                        f"{len(args) - 1} items = {retval[0]}"),
+           unit_handling=percentile_units)
+def percentile(*stack):
+    """
+    Find the bos-th percentile (from 0 to 100) of the other items on the
+    stack, interpolating between the two closest items if needed.
+    """
+    _need(stack, 2)
+    *values, percent = stack
+    return percentile_of(values, percent)
+
+percentile.ensure(before=[1, 2, 3, 4, 5, 25], after=[2])
+percentile.ensure(before=[10, 20, 90], after=[19])
+percentile.ensure(before=[1, 2, 101], raises=ValueError)
+
+
+@Operation('h', menu=stats_menu, push=-1, description='histogram',
+           log_as=lambda args, retval: (f"histogram of {len(args) - 1} items "
+                                        f"in {args[-1]} buckets"),
+           unit_handling=histogram_units)
+def histogram(*stack):
+    """
+    Count how many of the other items on the stack fall into each of bos
+    equal-width buckets spanning them, smallest first, replacing the stack
+    with the counts.
+    """
+    _need(stack, 2)
+    *values, buckets = stack
+    if buckets != buckets.to_integral_value() or not 1 <= buckets <= 1000:
+        raise ValueError("The number of buckets must be a whole number "
+                         "from 1 to 1000.")
+    buckets = int(buckets)
+    low, high = min(values), max(values)
+    counts = [0] * buckets
+    scale = buckets / (high - low) if high > low else Decimal(0)
+    for value in values:
+        counts[min(int((value - low) * scale), buckets - 1)] += 1
+    return counts
+
+histogram.ensure(before=[1, 2, 3, 4, 10, 2], after=[4, 1])
+histogram.ensure(before=[5, 5, 3], after=[2, 0, 0])
+histogram.ensure(before=[1, 2, Decimal("2.5")], raises=ValueError)
+
+
+@Operation('a', menu=stats_menu, push=5, description='summarize',
+           log_as=lambda args, retval: (f"{retval[0]} items: mean {retval[1]}, "
+                                        f"sd {retval[2]}, min {retval[3]}, "
+                                        f"max {retval[4]}"),
+           unit_handling=summary_units)
+def summarize(*stack):
+    """
+    Replace the stack with its count, mean, sample standard deviation,
+    minimum, and maximum, all worked out in a single pass.
+    """
+    _need(stack, 2)
+    summary = summarize_values(stack)
+    return (summary.count, summary.mean,
+            (summary.squares / (summary.count - 1)).sqrt(),
+            summary.minimum, summary.maximum)
+
+summarize.ensure(before=[2, 4, 4, 4, 5, 5, 7, 9],
+                 after=[8, 5, (Decimal(32) / 7).sqrt(), 2, 9], close=True)
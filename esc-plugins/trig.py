@@ -5,8 +5,9 @@ Copyright (c) 2019, 2026 Soren Bjornstad.
 This plugin is provided with the esc distribution:
 <https://github.com/sobjornstad/esc>
 """
-import math
+from decimal import Decimal
 
+from esc import decimalmath
 from esc import modes
 from esc.commands import Menu, Operation, Mode, ModeChange, UNOP, main_menu
 from esc.units import unspecified_unit_handling
@@ -32,7 +33,7 @@ def trig_wrapper(bos, func, arc=False):
     """
     Used anytime a trig Operation is called. Performs any conversions from
     degrees to radians and vice versa, as called for by modes.trigMode (all
-    Python math module functions use only radians).
+    esc.decimalmath functions use only radians).
 
     Takes the requested stack item, a Operation to be called on the value
     after/before the appropriate conversion, and a boolean indicating whether
@@ -44,71 +45,94 @@ def trig_wrapper(bos, func, arc=False):
     after possible conversion to degrees.
     """
     if modes.get(TRIG_MODE_NAME) == 'degrees' and not arc:
-        bos = math.radians(bos)
+        bos = decimalmath.radians(bos)
     ret = func(bos)
     if modes.get(TRIG_MODE_NAME) == 'degrees' and arc:
-        ret = math.degrees(ret)
+        ret = decimalmath.degrees(ret)
     return ret
 
 
 @Operation('s', menu=trig_menu, push=1, description='sine', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def sine(bos):
     """
     Take the sine of bos. Affected by the mode 'degrees' or 'radians'
     shown in the trig menu.
     """
-    return trig_wrapper(bos, math.sin)
+    return trig_wrapper(bos, decimalmath.sin)
+
+sine.ensure(before=[0], after=[0])
+sine.ensure(before=[Decimal("0.5")], after=[Decimal("0.4794255386042030002732879352")],
+            close=True)
 
 
 @Operation('c', menu=trig_menu, push=1, description='cosine', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def cosine(bos):
     """
     Take the cosine of bos. Affected by the mode 'degrees' or 'radians'
     shown in the trig menu.
     """
-    return trig_wrapper(bos, math.cos)
+    return trig_wrapper(bos, decimalmath.cos)
+
+cosine.ensure(before=[0], after=[1])
 
 
 @Operation('t', menu=trig_menu, push=1, description='tangent', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def tangent(bos):
     """
     Take the tangent of bos. Affected by the mode 'degrees' or 'radians'
     shown in the trig menu.
     """
-    return trig_wrapper(bos, math.tan)
+    return trig_wrapper(bos, decimalmath.tan)
+
+tangent.ensure(before=[1], after=[Decimal("1.557407724654902230506974807")],
+               close=True)
 
 
 @Operation('i', menu=trig_menu, push=1, description='arc sin', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def arc_sine(bos):
     """
     Take the arc sine (a.k.a., inverse sine) of bos. Affected by the mode
     'degrees' or 'radians' shown in the trig menu.
     """
-    return trig_wrapper(bos, math.sin)
+    return trig_wrapper(bos, decimalmath.asin, arc=True)
+
+arc_sine.ensure(before=[1], after=[decimalmath.pi() / 2], close=True)
+arc_sine.ensure(before=[2], raises=ValueError)
 
 
 @Operation('o', menu=trig_menu, push=1, description='arc cos', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def arc_cosine(bos):
     """
     Take the arc cosine (a.k.a., inverse cosine) of bos. Affected by the mode
     'degrees' or 'radians' shown in the trig menu.
     """
-    return trig_wrapper(bos, math.cos)
+    return trig_wrapper(bos, decimalmath.acos, arc=True)
+
+arc_cosine.ensure(before=[1], after=[0])
+arc_cosine.ensure(before=[-2], raises=ValueError)
 
 
 @Operation('a', menu=trig_menu, push=1, description='arc tan', log_as=UNOP,
-           unit_handling=unspecified_unit_handling())
+           unit_handling=unspecified_unit_handling(), pure=True,
+           any_backend=True)
 def arc_tangent(bos):
     """
-    Take the arc cosine (a.k.a., inverse cosine) of bos. Affected by the mode
-    'degrees' or 'radians' shown in the trig menu.
+    Take the arc tangent (a.k.a., inverse tangent) of bos. Affected by the
+    mode 'degrees' or 'radians' shown in the trig menu.
     """
-    return trig_wrapper(bos, math.tan)
+    return trig_wrapper(bos, decimalmath.atan, arc=True)
+
+arc_tangent.ensure(before=[1], after=[decimalmath.pi() / 4], close=True)
 
 
 Mode(name=TRIG_MODE_NAME,
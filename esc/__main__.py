@@ -3,30 +3,44 @@
 main.py - startup code and main loop for esc
 """
 
+from contextlib import contextmanager
 import curses
 import curses.ascii
 import datetime
 import decimal
+import os
 from pathlib import Path
 from traceback import format_exc
 import sys
 
-from .commands import main_menu
+from .commands import EscOperation, main_menu
 from .consts import (UNDO_CHARACTER, REDO_CHARACTER, STORE_REG_CHARACTER,
-                     RETRIEVE_REG_CHARACTER, DELETE_REG_CHARACTER, PRECISION,
-                     UNIT_ENTRY_CHARACTER)
+                     STORE_STACK_REG_CHARACTER, RETRIEVE_REG_CHARACTER,
+                     DELETE_REG_CHARACTER, PRECISION, UNIT_ENTRY_CHARACTER,
+                     SWITCH_STACK_CHARACTER, MOVE_TO_STACK_CHARACTER,
+                     PALETTE_CHARACTER, RECORD_MACRO_CHARACTER,
+                     REPLAY_MACRO_CHARACTER, MAP_CHARACTER, REDUCE_CHARACTER,
+                     SCAN_CHARACTER, QUIT_CHARACTER)
 from . import display
 from .display import screen, fetch_input
 from . import function_loader
 from .helpme import get_help
 from . import history
-from .oops import (FunctionExecutionError, InvalidNameError, NotInMenuError,
-                   RollbackTransaction, UnitError)
+from . import macros
+from . import mapreduce
+from . import palette
+from . import precision
+from .oops import (FunctionExecutionError, InvalidNameError, MacroError,
+                   NotInMenuError, RollbackTransaction, UnitError)
 from . import registers
 from . import stack
 from .status import status
 from .units import UnitExpression
 from . import util
+from . import workspaces
+
+#: How long the keyboard must be idle before changed registers are saved.
+REGISTER_SAVE_DELAY_MS = 250
 
 
 def try_add_to_number(c, ss):
@@ -75,11 +89,86 @@ def enter_new_number(ss):
     return r
 
 
-def _get_register_char():
-    "Retrieve a character representing a register."
-    status.expecting_register()
-    screen().refresh_status()
-    return chr(fetch_input(True))
+@contextmanager
+def _prompt_escdelay():
+    "Lower the escape delay so Esc cancels a prompt promptly (default ~1000ms)."
+    old_escdelay = curses.get_escdelay()
+    curses.set_escdelay(25)
+    try:
+        yield
+    finally:
+        curses.set_escdelay(old_escdelay)
+
+
+def _get_name(ss, registry, menu, expecting, completions, show_prefix=None):
+    """
+    Retrieve a name typed by the user and finished with Enter or space.
+    Tab completes as much of the name as the candidates from
+    /completions(prefix)/ allow.
+
+    /expecting(prefix)/ puts the status bar into the right state for the
+    name typed so far; if /show_prefix(prefix)/ is given it's also called
+    each time the name changes, and with an empty prefix once it's done.
+
+    Return None if the user cancelled with Esc (or by backspacing past the
+    start of the name).
+    """
+    buf = ""
+    try:
+        with _prompt_escdelay():
+            while True:
+                expecting(buf)
+                screen().refresh_status()
+                if show_prefix is not None:
+                    show_prefix(buf)
+                c = fetch_input(True)
+
+                if c == curses.KEY_RESIZE:
+                    _handle_resize(ss, registry, menu)
+                    continue
+                if c == 27:  # Escape
+                    return None
+                if (c in (curses.KEY_BACKSPACE, 127)
+                        or curses.ascii.unctrl(c) == '^H'):
+                    if not buf:
+                        return None
+                    buf = buf[:-1]
+                    continue
+                if c == ord('\t'):
+                    matches = completions(buf)
+                    if matches:
+                        buf = os.path.commonprefix(matches)
+                    continue
+                if c > 255:
+                    continue
+
+                char = chr(c)
+                if char in ('\n', ' '):
+                    if buf:
+                        return buf
+                elif char.isascii() and (char.isalnum() or char == '_'):
+                    buf += char
+    finally:
+        expecting("")
+        if show_prefix is not None and not screen().too_small:
+            show_prefix("")
+
+
+def _get_register_name(ss, registry, menu):
+    """
+    Retrieve the name of a register (see _get_name()). The registers window
+    is filtered to matching registers as the user types.
+    """
+    def show_prefix(prefix):
+        screen().update_registers(registry, prefix=prefix)
+    return _get_name(ss, registry, menu, status.expecting_register,
+                     registry.completions, show_prefix)
+
+
+def _get_stack_name(ss, registry, menu, stacks):
+    "Retrieve the name of a stack (see _get_name())."
+    return _get_name(ss, registry, menu, status.expecting_stack,
+                     stacks.completions)
 
 
 def _get_help_char(ss, registry, menu):
@@ -97,7 +186,7 @@ def _get_help_char(ss, registry, menu):
         return chr(c)
 
 
-def store_register(ss, registry):
+def store_register(ss, registry, menu=None):
     """
     Copy the bottom of the stack into a register of the user's choice.
     """
@@ -107,49 +196,205 @@ def store_register(ss, registry):
 
     with ss.transaction():
         ss.enter_number()
-        reg_char = _get_register_char()
+        reg_name = _get_register_name(ss, registry, menu)
+        if reg_name is None:
+            raise RollbackTransaction()
         try:
-            registry[reg_char] = ss.bos
+            registry[reg_name] = ss.bos
         except InvalidNameError as e:
             raise RollbackTransaction(str(e))
         screen().update_registers(registry)
         status.ready()
 
 
-def retrieve_register(ss, registry):
+def store_stack_register(ss, registry, menu=None):
+    """
+    Capture the entire stack into a register of the user's choice,
+    to be pushed back all at once by retrieve_register().
+    """
+    if ss.is_empty:
+        status.error("You must have an item on the stack to store to a register.")
+        return
+
+    with ss.transaction():
+        ss.enter_number()
+        reg_name = _get_register_name(ss, registry, menu)
+        if reg_name is None:
+            raise RollbackTransaction()
+        try:
+            registry[reg_name] = stack.StackSlice(ss.s)
+        except InvalidNameError as e:
+            raise RollbackTransaction(str(e))
+        screen().update_registers(registry)
+        status.ready()
+
+
+def retrieve_register(ss, registry, menu=None):
     """
     Copy a register of the user's choice to a new item at the bottom of the
-    stack.
+    stack, or to as many new items as it holds if it was stored from the
+    whole stack.
     """
     with ss.transaction():
         ss.enter_number()
-        reg_char = _get_register_char()
+        reg_name = _get_register_name(ss, registry, menu)
+        if reg_name is None:
+            raise RollbackTransaction()
         try:
-            stack_item = registry[reg_char]
+            value = registry[reg_name]
         except KeyError:
-            raise RollbackTransaction(f"Register '{reg_char}' does not exist.")
-        ss.push((stack_item,))
+            raise RollbackTransaction(f"Register '{reg_name}' does not exist.")
+        if isinstance(value, stack.StackSlice):
+            ss.push(value.items)
+        else:
+            ss.push((value,))
         screen().refresh_stack(ss)
         status.ready()
 
 
-def delete_register(ss, registry):
+def delete_register(ss, registry, menu=None):
     """
     Delete a register of the user's choice.
     """
     with ss.transaction():
         ss.enter_number()
-        reg_char = _get_register_char()
+        reg_name = _get_register_name(ss, registry, menu)
+        if reg_name is None:
+            raise RollbackTransaction()
         try:
-            del registry[reg_char]
+            del registry[reg_name]
         except KeyError:
-            raise RollbackTransaction(f"Register '{reg_char}' does not exist.")
+            raise RollbackTransaction(f"Register '{reg_name}' does not exist.")
         screen().update_registers(registry)
         status.ready()
 
 
+def switch_stack(ss, registry, menu, stacks):
+    """
+    Switch to a stack of the user's choice, creating it if it doesn't exist.
+    """
+    name = _get_stack_name(ss, registry, menu, stacks)
+    if name is None:
+        status.ready()
+        return
+    try:
+        stacks.switch(name)
+    except InvalidNameError as e:
+        status.error(str(e))
+        return
+    screen().show_stack_name(name)
+    screen().refresh_stack(ss)
+
+
+def move_bos_to_stack(ss, registry, menu, stacks):
+    """
+    Move the bottom of the stack onto another stack of the user's choice,
+    creating it if it doesn't exist.
+    """
+    if ss.is_empty:
+        status.error("You must have an item on the stack to move it.")
+        return
+
+    with ss.transaction():
+        name = _get_stack_name(ss, registry, menu, stacks)
+        if name is None:
+            raise RollbackTransaction()
+        try:
+            stacks.move_bos(name)
+        except (InvalidNameError, ValueError) as e:
+            raise RollbackTransaction(str(e))
+        screen().refresh_stack(ss)
+        status.ready()
+
+
 # Override tracking for unit errors
 _last_unit_error = None  # (menu_id, key, error_type) or None
+# The same for map, reduce and scan:
+# (verb, operation, count, error_type, stack version) or None
+_last_bulk_unit_error = None
+
+
+def _choose_operation(ss, registry, expecting):
+    """
+    Let the user choose an operation from the menus, optionally typing
+    a count first. /expecting(count)/ puts the status bar into the right
+    state for the count typed so far.
+
+    Return a (count, operation) tuple, where count is None if none was typed,
+    or None if the user cancelled with Esc, backspace, or by quitting the
+    main menu.
+    """
+    menu = main_menu
+    count = ""
+    try:
+        with _prompt_escdelay():
+            while True:
+                expecting(count)
+                screen().display_menu(menu)
+                screen().refresh_status()
+                c = fetch_input(True)
+
+                if c == curses.KEY_RESIZE:
+                    _handle_resize(ss, registry, menu)
+                    continue
+                if c == 27:  # Escape
+                    return None
+                if (c in (curses.KEY_BACKSPACE, 127)
+                        or curses.ascii.unctrl(c) == '^H'):
+                    if not count:
+                        return None
+                    count = count[:-1]
+                    continue
+                if c > 255:
+                    continue
+
+                char = chr(c)
+                if menu.is_main_menu and char.isdigit() and (count or char != '0'):
+                    count += char
+                elif char == QUIT_CHARACTER:
+                    if menu.is_main_menu:
+                        return None
+                    menu = menu.parent
+                elif char in menu.children:
+                    child = menu.child(char)
+                    if child.is_menu:
+                        menu = child
+                    elif isinstance(child, EscOperation):
+                        return (int(count) if count else None), child
+    finally:
+        expecting("")
+        if not screen().too_small:
+            screen().display_menu(main_menu)
+
+
+def run_over_stack(ss, registry, expecting, verb, run):
+    """
+    Choose an operation and run it over the stack (or the last N items, if
+    a count is typed first) with /run(operation, count, unit_override)/.
+    /expecting(count)/ sets the status bar while choosing, and /verb/
+    (e.g., "Map") is used in error messages.
+    """
+    global _last_bulk_unit_error  # pylint: disable=global-statement
+    choice = _choose_operation(ss, registry, expecting)
+    if choice is None:
+        status.ready()
+        return
+    count, operation = choice
+
+    unit_override = (_last_bulk_unit_error is not None
+                     and _last_bulk_unit_error[:3] == (verb, operation, count)
+                     and _last_bulk_unit_error[4] == ss.version)
+    _last_bulk_unit_error = None
+    try:
+        run(operation, count, unit_override)
+    except UnitError as e:
+        _last_bulk_unit_error = (verb, operation, count, type(e), ss.version)
+        status.error(str(e).replace("Press again", f"{verb} it again"))
+    except FunctionExecutionError as e:
+        status.error(str(e))
+    else:
+        status.ready()
+        screen().refresh_stack(ss)
 
 
 def _enter_unit_mode(ss, registry, menu):
@@ -236,7 +481,7 @@ def _enter_unit_mode(ss, registry, menu):
         if char in ('\n', ' '):
             stripped = buf.strip()
             if not stripped:
-                target_item.unit = None
+                ss.bos = target_item.with_unit(None)
                 break
             try:
                 unit = UnitExpression.parse(stripped)
@@ -244,7 +489,7 @@ def _enter_unit_mode(ss, registry, menu):
                 status.error(f"Invalid unit name: {e}")
                 screen().refresh_status()
                 continue
-            target_item.unit = unit
+            ss.bos = target_item.with_unit(unit)
             break
         elif char == '*':
             buf += " * "
@@ -268,7 +513,114 @@ def _enter_unit_mode(ss, registry, menu):
     status.ready()
 
 
-def try_special(c, ss, registry, menu):
+def toggle_macro_recording(ss):
+    """
+    Start recording a macro, or stop recording and keep what was recorded
+    as the macro to replay.
+    """
+    recorder = macros.recorder
+    if recorder.recording:
+        status.recording_macro = False
+        try:
+            macro = recorder.stop()
+        except MacroError as e:
+            status.error(f"Macro not recorded: {e}")
+        else:
+            steps = "step" if len(macro) == 1 else "steps"
+            status.advisory(f"Recorded a macro of {len(macro)} {steps}.")
+        return
+
+    if ss.editing_last_item:
+        try:
+            ss.enter_number()
+        except ValueError as e:
+            status.error(str(e))
+            return
+        screen().refresh_stack(ss)
+    recorder.start()
+    status.recording_macro = True
+    status.advisory(f"Recording a macro. Press {RECORD_MACRO_CHARACTER} to finish.")
+
+
+def _get_replay_count(ss, registry, menu):
+    """
+    Ask how many times to replay the macro. Return the count, '*' to replay
+    it over each item on the stack, or None if the user cancelled.
+    """
+    buf = ""
+    try:
+        with _prompt_escdelay():
+            while True:
+                status.expecting_replay_count(buf)
+                screen().refresh_status()
+                c = fetch_input(True)
+                if c == curses.KEY_RESIZE:
+                    _handle_resize(ss, registry, menu)
+                    continue
+                if c == 27:  # Escape
+                    return None
+                if (c in (curses.KEY_BACKSPACE, 127)
+                        or curses.ascii.unctrl(c) == '^H'):
+                    if not buf:
+                        return None
+                    buf = buf[:-1]
+                elif c == ord('*') and not buf:
+                    return '*'
+                elif c in (ord('\n'), ord(' ')):
+                    return int(buf) if buf else 1
+                elif ord('0') <= c <= ord('9') and (buf or c != ord('0')):
+                    buf += chr(c)
+    finally:
+        status.expecting_replay_count("")
+
+
+def replay_macro(ss, registry, menu):
+    """
+    Replay the last macro recorded, a number of times or over each item
+    on the stack.
+    """
+    recorder = macros.recorder
+    if recorder.recording:
+        status.error("A macro can't replay itself.")
+        return
+    if recorder.macro is None:
+        status.error(f"No macro recorded. (Press {RECORD_MACRO_CHARACTER} to record one.)")
+        return
+
+    count = _get_replay_count(ss, registry, menu)
+    if count is None:
+        status.ready()
+        return
+    try:
+        if count == '*':
+            recorder.macro.replay_over_items(ss, registry)
+        else:
+            recorder.macro.replay(ss, registry, count)
+    except (FunctionExecutionError, ValueError) as e:
+        status.error(f"Macro stopped: {e}")
+    else:
+        status.ready()
+    screen().refresh_stack(ss)
+    screen().update_registers(registry)
+
+
+def find_command(ss, registry, menu):
+    """
+    Let the user pick an operation from the command palette and run it.
+    """
+    entry = palette.pick("Find Command", palette.finder().search,
+                         status.finding_command,
+                         "Type part of an operation's name.", menu)
+    status.ready()
+    if entry is not None:
+        try:
+            entry.command.execute(None, ss, registry)
+        except (FunctionExecutionError, UnitError) as e:
+            status.error(str(e))
+    screen().refresh_all()
+
+
+def try_special(c, ss, registry, menu, stacks):
     """
     Handle special values that aren't digits to be entered or
     operations to be called, e.g., Enter, Backspace, and undo.
@@ -293,13 +645,39 @@ def try_special(c, ss, registry, menu):
         else:
             status.error("Nothing to redo.")
     elif chr(c) == STORE_REG_CHARACTER:
-        store_register(ss, registry)
+        store_register(ss, registry, menu)
+    elif chr(c) == STORE_STACK_REG_CHARACTER:
+        store_stack_register(ss, registry, menu)
     elif chr(c) == RETRIEVE_REG_CHARACTER:
-        retrieve_register(ss, registry)
+        retrieve_register(ss, registry, menu)
     elif chr(c) == DELETE_REG_CHARACTER:
-        delete_register(ss, registry)
+        delete_register(ss, registry, menu)
     elif chr(c) == UNIT_ENTRY_CHARACTER:
         _enter_unit_mode(ss, registry, menu)
+    elif chr(c) == SWITCH_STACK_CHARACTER:
+        switch_stack(ss, registry, menu, stacks)
+    elif chr(c) == MOVE_TO_STACK_CHARACTER:
+        move_bos_to_stack(ss, registry, menu, stacks)
+    elif chr(c) == MAP_CHARACTER:
+        run_over_stack(
+            ss, registry, status.mapping, "Map",
+            lambda op, count, override: mapreduce.map_over(
+                op, ss, registry, count, override))
+    elif chr(c) in (REDUCE_CHARACTER, SCAN_CHARACTER):
+        scan = chr(c) == SCAN_CHARACTER
+        run_over_stack(
+            ss, registry, status.scanning if scan else status.reducing,
+            "Scan" if scan else "Reduce",
+            lambda op, count, override: mapreduce.reduce_over(
+                op, ss, registry, count, scan, override))
+    elif chr(c) == RECORD_MACRO_CHARACTER:
+        toggle_macro_recording(ss)
+    elif chr(c) == REPLAY_MACRO_CHARACTER:
+        replay_macro(ss, registry, menu)
+    elif c in (curses.KEY_LEFT, curses.KEY_RIGHT):
+        screen().scroll_stack(-1 if c == curses.KEY_LEFT else 1)
+    elif curses.ascii.unctrl(c) == PALETTE_CHARACTER:
+        find_command(ss, registry, menu)
     elif c == curses.KEY_F1:
         with status.save_state():
             help_on = _get_help_char(ss, registry, menu)
@@ -312,11 +690,29 @@ def try_special(c, ss, registry, menu):
 
 def setup_decimal_context():
     """
-    Set up the Context for decimal arithmetic for this thread.
+    Set up the Context for decimal arithmetic for this session.
     """
-    context = decimal.getcontext()
-    context.prec = PRECISION
-    context.traps[decimal.Overflow] = 0  # return infinity
+    decimal.setcontext(precision.make_context(PRECISION))
+
+
+def _save_registers(ss, registry):
+    "Write changed registers to disk, reporting any failure on the status bar."
+    try:
+        registry.save()
+    except OSError as e:
+        status.error(f"Couldn't save registers: {e.strerror or e}")
+        screen().refresh_status()
+        screen().place_cursor(ss)
+
+
+def _report_unreadable_registers(registry):
+    "Warn on the status bar about registers that turned out to be unreadable."
+    names = registry.newly_unreadable()
+    if len(names) == 1:
+        status.error(f"Register '{names[0]}' couldn't be read and was set aside.")
+    elif names:
+        status.error(f"{len(names)} registers couldn't be read and were set "
+                     f"aside: {', '.join(names)}")
 
 
 def _handle_resize(ss, registry, menu):
@@ -329,12 +725,19 @@ def _handle_resize(ss, registry, menu):
             screen().display_menu(menu)
 
 
-def user_loop(ss, registry):
+def user_loop(ss, registry, stacks=None):
     """
     Main loop to retrieve user input and perform calculator operations.
+    /ss/ is the stack on screen; /stacks/ is the set of named stacks it
+    belongs to, or None to start a new set with /ss/ as its only member.
     """
+    if stacks is None:
+        stacks = workspaces.Workspaces(ss)
     global _last_unit_error
     menu = None
+    if not screen().too_small:
+        # Registers may have been loaded from disk.
+        screen().update_registers(registry)
     while True:
         # If the terminal is too small, wait for a resize event.
         if screen().too_small:
@@ -344,6 +747,7 @@ def user_loop(ss, registry):
             continue
 
         status.mark_seen()
+        _report_unreadable_registers(registry)
         screen().refresh_status()
         screen().update_history(ss)
 
@@ -353,12 +757,20 @@ def user_loop(ss, registry):
 
         # Update cursor posn and fetch one char of input.
         screen().place_cursor(ss)
+
+        # Changed registers are saved once the user pauses, so a burst of
+        # stores costs one write rather than one per keystroke.
+        if (registry.has_unsaved_changes
+                and not screen().input_pending(REGISTER_SAVE_DELAY_MS)):
+            _save_registers(ss, registry)
+
         if menu is main_menu:
             c = fetch_input(False)
 
             if c == curses.KEY_RESIZE:
                 _handle_resize(ss, registry, menu)
                 continue
+            macros.recorder.record(c)
 
             # Are we entering a number?
             r = try_add_to_number(c, ss)
@@ -367,7 +779,7 @@ def user_loop(ss, registry):
                 continue
 
             # Or a special value like backspace or undo?
-            r = try_special(c, ss, registry, menu)
+            r = try_special(c, ss, registry, menu, stacks)
             if r:
                 _last_unit_error = None
                 continue
@@ -379,6 +791,7 @@ def user_loop(ss, registry):
             if c == curses.KEY_RESIZE:
                 _handle_resize(ss, registry, menu)
                 continue
+            macros.recorder.record(c)
 
         # Check for unit error override: same menu, same key, same error type
         unit_override = False
@@ -422,10 +835,18 @@ def main():
     history.hs.clear()  # destroy undo history from tests
 
     ss = stack.StackState()
-    registry = registers.Registry()
+    registry = registers.Registry(
+        registers.RegisterStore(registers.default_store_path()))
 
     try:
         user_loop(ss, registry)
+    except SystemExit:
+        if registry.has_unsaved_changes:
+            try:
+                registry.save()
+            except OSError as e:
+                sys.stderr.write(f"Couldn't save registers: {e.strerror or e}\n")
+        raise
     except Exception:
         path = Path.home() / ".esc_dump.txt"
         with open(path, 'a') as f:
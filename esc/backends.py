@@ -0,0 +1,305 @@
+"""
+backends.py - what kind of number esc calculates with
+
+Normally esc calculates in decimal floating point, using
+:class:`decimal.Decimal`, to as many significant digits as the precision
+menu asks for. For high-volume batch work where 15 or so significant digits
+are plenty, the *float* backend calculates with Python's binary floats
+instead, which is considerably faster. And where every digit has to come
+out right -- in accounting, say, where a chain of divisions and
+multiplications mustn't leave 0.9999999 behind -- the *rational* backend
+calculates exactly with :class:`fractions.Fraction`.
+
+The backend is chosen per session, like the precision: it's kept in a
+context variable, so help simulations and tests each have their own, and
+it's recorded on the :class:`StackState <esc.stack.StackState>` whenever
+the stack changes, so undoing past a change of backend changes it back.
+
+A :class:`StackItem <esc.stack.StackItem>` keeps the number it was made
+with and displays it accordingly. When an operation reads an item made
+under another backend, its number is converted to the current backend's
+kind first, so operations only ever see one kind of number at a time.
+"""
+
+from contextlib import contextmanager
+import contextvars
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+import math
+
+from . import precision
+from . import util
+
+#: Significant digits shown for a float: as many as any float holds
+#: reliably.
+FLOAT_DIGITS = 15
+#: Fractions with numerators and denominators up to this long are shown
+#: by dividing one by the other directly.
+_SMALL_BITS = 4096
+
+
+class Backend:
+    """
+    A kind of number esc can calculate with. Subclasses say how to read
+    numbers of that kind, convert other values to it, and show it.
+    """
+    #: Name the backend is chosen by.
+    name = None
+    #: What the backend is called in menus and the history.
+    description = None
+    #: The type of the numbers it calculates with.
+    number_type = None
+
+    def __repr__(self):
+        return f"<Backend: {self.name}>"
+
+    def from_string(self, string):
+        """
+        Return the number typed in as /string/.
+
+        :raises ValueError: if /string/ isn't a number.
+        """
+        raise NotImplementedError
+
+    def to_numbers(self, values):
+        """
+        Return a list of the numbers an operation's function returned as
+        /values/, converted to this backend's kind.
+
+        :raises TypeError: if a value isn't a number.
+        :raises ValueError: if a value is a string that isn't a number.
+        :raises decimal.InvalidOperation: likewise.
+        """
+        raise NotImplementedError
+
+    def number_of(self, number):
+        """
+        Return /number/, which may have been made by any backend, as this
+        backend's kind of number.
+        """
+        raise NotImplementedError
+
+    def to_decimal(self, number):
+        "Return a Decimal to display for /number/ of this backend's kind."
+        raise NotImplementedError
+
+    def exact_string(self, number):
+        """
+        Return a string to display for /number/ of this backend's kind in
+        place of its Decimal, or ``None`` to display the Decimal.
+        """
+        return None
+
+
+class DecimalBackend(Backend):
+    "Decimal floating point, to the precision of the current context."
+    name = 'decimal'
+    description = 'decimal'
+    number_type = Decimal
+
+    def from_string(self, string):
+        try:
+            return Decimal(string)
+        except decimal.InvalidOperation as e:
+            raise ValueError(f"'{string}' is not a number") from e
+
+    def to_numbers(self, values):
+        return util.decimalize_iterable(values)
+
+    def number_of(self, number):
+        if isinstance(number, Decimal):
+            return number
+        if isinstance(number, float):
+            # The shortest string that reads back as the float, so that
+            # 0.1 becomes 0.1 rather than its exact binary expansion.
+            return Decimal(repr(number))
+        if isinstance(number, Fraction):
+            return RATIONAL.to_decimal(number)
+        return Decimal(number)
+
+    def to_decimal(self, number):
+        return number
+
+
+class FloatBackend(Backend):
+    "Binary floating point, to about 16 significant digits."
+    name = 'float'
+    description = 'fast float'
+    number_type = float
+
+    def from_string(self, string):
+        return float(string)
+
+    def to_numbers(self, values):
+        return [float(i) for i in values]
+
+    def number_of(self, number):
+        if isinstance(number, float):
+            return number
+        return float(number)
+
+    def to_decimal(self, number):
+        """
+        >>> FLOAT.to_decimal(0.1 + 0.2)
+        Decimal('0.3')
+        """
+        return Decimal(format(number, f'.{FLOAT_DIGITS}g'))
+
+
+class RationalBackend(Backend):
+    """
+    Exact fractions, of any size. Each result is reduced to lowest terms
+    as it's made, so a long chain of operations keeps its denominators as
+    small as they can be rather than multiplying them up.
+    """
+    name = 'rational'
+    description = 'exact rational'
+    number_type = Fraction
+
+    def from_string(self, string):
+        try:
+            return Fraction(string)
+        except ZeroDivisionError as e:
+            raise ValueError(f"'{string}' is not a number") from e
+
+    def to_numbers(self, values):
+        return [self.number_of(i) for i in values]
+
+    def number_of(self, number):
+        if isinstance(number, Fraction):
+            return number
+        if isinstance(number, float):
+            # As for Decimals: 0.1 is 1/10, not its exact binary expansion.
+            return Fraction(repr(number))
+        return Fraction(number)
+
+    def to_decimal(self, number):
+        """
+        >>> RATIONAL.to_decimal(Fraction(1, 8))
+        Decimal('0.125')
+        """
+        numerator, denominator = number.numerator, number.denominator
+        if max(numerator.bit_length(), denominator.bit_length()) <= _SMALL_BITS:
+            return Decimal(numerator) / denominator
+
+        # Converting a huge int to a Decimal takes time quadratic in its
+        # length, so first divide in integers, keeping only the digits the
+        # context has room for and a few more. A last digit of 1 stands in
+        # for any remainder, so the result still rounds the right way.
+        digits = decimal.getcontext().prec + 3
+        magnitude = abs(numerator)
+        shift = int((magnitude.bit_length() - denominator.bit_length())
+                    * math.log10(2)) - digits
+        if shift >= 0:
+            quotient, remainder = divmod(magnitude, denominator * 10 ** shift)
+        else:
+            quotient, remainder = divmod(magnitude * 10 ** -shift, denominator)
+        quotient = quotient * 10 + bool(remainder)
+        result = Decimal(quotient).scaleb(shift - 1)
+        return -result if numerator < 0 else result
+
+    def exact_string(self, number):
+        """
+        Fractions without an exact Decimal at the current precision are
+        shown as a fraction, if it's short enough to read at a glance.
+
+        >>> RATIONAL.exact_string(Fraction(2, 3))
+        '2/3'
+        >>> RATIONAL.exact_string(Fraction(3, 4)) is None
+        True
+        """
+        if number.denominator == 1:
+            return None
+        context = decimal.getcontext().copy()
+        context.clear_flags()
+        context.divide(Decimal(number.numerator), number.denominator)
+        if not context.flags[decimal.Inexact]:
+            return None
+        width = precision.entry_width()
+        bits = number.numerator.bit_length() + number.denominator.bit_length()
+        if bits * math.log10(2) > width:
+            return None  # too long, and maybe too long for str() too
+        string = f"{number.numerator}/{number.denominator}"
+        return string if len(string) <= width else None
+
+
+DECIMAL = DecimalBackend()
+FLOAT = FloatBackend()
+RATIONAL = RationalBackend()
+
+#: Every backend, by name.
+BACKENDS = {i.name: i for i in (DECIMAL, FLOAT, RATIONAL)}
+#: The backend that makes numbers of each type.
+_BY_TYPE = {i.number_type: i for i in BACKENDS.values()}
+#: Types of number a StackItem can hold.
+NUMBER_TYPES = tuple(_BY_TYPE)
+
+_current = contextvars.ContextVar('esc_backend', default=DECIMAL)
+
+
+def get_backend():
+    "The :class:`Backend` in effect in the current session."
+    return _current.get()
+
+
+def set_backend(name):
+    """
+    Calculate with the backend called /name/ from now on, in the current
+    session only.
+
+    :raises ValueError: if there's no backend called /name/.
+    """
+    try:
+        _current.set(BACKENDS[name])
+    except KeyError:
+        raise ValueError(f"There is no '{name}' number backend.") from None
+
+
+@contextmanager
+def local_backend():
+    """
+    Context manager undoing any change of backend made within it, as
+    :func:`decimal.localcontext` does for the precision.
+    """
+    token = _current.set(_current.get())
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def backend_of(number):
+    "Return the :class:`Backend` that makes numbers like /number/."
+    try:
+        return _BY_TYPE[type(number)]
+    except KeyError:
+        for backend in BACKENDS.values():
+            if isinstance(number, backend.number_type):
+                return backend
+        raise TypeError(f"{type(number).__name__} is not a kind of number "
+                        f"esc calculates with") from None
+
+
+def to_decimal(number):
+    """
+    Return a Decimal to display for /number/, which may have been made by
+    any backend.
+
+    >>> to_decimal(2.5)
+    Decimal('2.5')
+    """
+    if isinstance(number, Decimal):
+        return number
+    return backend_of(number).to_decimal(number)
+
+
+def cache_key(number):
+    """
+    Return a hashable key for /number/ telling it apart from every other
+    number, including equal numbers shown differently (2.0 and 2) or made
+    by another backend.
+    """
+    if isinstance(number, Decimal):
+        return number.as_tuple()
+    return (type(number), number)
@@ -8,7 +8,7 @@ from .commands import EscBuiltin
 class StoreRegister(EscBuiltin):
     """
     Copy the bottommost value on the stack into a register. Registers
-    store values under a single-letter name until you need them again.
+    store values under a name of your choice until you need them again.
     """
     key = ">"
     description = "store bos to reg"
@@ -22,11 +22,31 @@ class StoreRegister(EscBuiltin):
                     "one item on the stack to store.)")
 
 
+class StoreStackRegister(EscBuiltin):
+    """
+    Copy the entire stack into a register, which holds all of its items
+    together. Retrieving the register later pushes them all back in order.
+    """
+    key = "}"
+    description = "store stack to reg"
+
+    def simulated_result(self, ss, registry):
+        if ss.bos is not None:
+            count = len(ss.s)
+            items = "item" if count == 1 else "items"
+            return (f"All {count} {items} on the stack",
+                    "would be stored to a register of your choice.",)
+        else:
+            return ("An error would occur. (You must have at least",
+                    "one item on the stack to store.)")
+
+
 class RetrieveRegister(EscBuiltin):
     """
     Copy the value of a register you've previously stored to the bottom
-    of the stack. Registers store values under a single-letter name
-    until you need them again.
+    of the stack. Registers store values under a name of your choice
+    until you need them again. If the register holds a whole stack,
+    all of its items are pushed.
     """
     key = "<"
     description = "get bos from reg"
@@ -108,6 +128,146 @@ class AddUnitTag(EscBuiltin):
                     "one item on the stack.)")
 
 
+class SwitchStack(EscBuiltin):
+    """
+    Switch to another stack. Each stack has its own history and undo
+    history, so you can keep several independent calculations going.
+    Type the name of the stack and press Enter; a stack you haven't used
+    before is created empty. esc starts on the stack called "main".
+    """
+    key = "W"
+    description = "switch stack"
+
+    def simulated_result(self, ss, registry):
+        return ("The stack of your choice would replace this one",
+                "on screen. (This stack would be kept as it is.)")
+
+
+class MoveToStack(EscBuiltin):
+    """
+    Move bos onto the bottom of another stack, creating that stack if it
+    doesn't exist yet. You stay on the current stack.
+    """
+    key = "M"
+    description = "move bos to stack"
+
+    def simulated_result(self, ss, registry):
+        if ss.bos is not None:
+            return (f"The value {ss.bos} would be removed and",
+                    "pushed onto a stack of your choice.")
+        else:
+            return ("An error would occur. (You must have at least",
+                    "one item on the stack to move.)")
+
+
+class FindCommand(EscBuiltin):
+    """
+    Find an operation by typing part of its name, however deep in the menus
+    it is, and run it. The letters you type need only appear in order in the
+    operation's keys or description ("sqr" finds "square root"); longer
+    words also match words in its documentation. Use the arrow keys to
+    choose among the matches and press Enter to run the one selected.
+    """
+    key = "\x10"  # ^P
+    description = "find command"
+
+    def simulated_result(self, ss, registry):
+        return ("The operation of your choice would be run.",)
+
+
+class MapOperation(EscBuiltin):
+    """
+    Choose an operation that takes one item and returns one, such as square
+    root, and run it separately on every item on the stack, replacing each
+    item with its result. Type a number before choosing the operation to
+    map it over only that many items at the bottom of the stack.
+    The whole map can be undone in one step.
+    """
+    key = "&"
+    description = "map operation"
+
+    def simulated_result(self, ss, registry):
+        items = len(ss.s)
+        if items:
+            noun = "item" if items == 1 else "items"
+            return (f"The operation of your choice would be run on",
+                    f"each of the {items} {noun} on the stack.")
+        return ("An error would occur. (There are no items",
+                "on the stack to map over.)")
+
+
+class ReduceStack(EscBuiltin):
+    """
+    Choose an operation that takes two items and returns one, such as
+    addition, and fold it over the stack: it's run on the first two items,
+    then on that result and the third item, and so on, and the stack is
+    replaced with the final result. Reducing with ``*``, for instance,
+    multiplies together everything on the stack. Type a number before
+    choosing the operation to reduce only that many items at the bottom of
+    the stack. The whole reduction can be undone in one step.
+    """
+    key = "$"
+    description = "reduce stack"
+
+    def simulated_result(self, ss, registry):
+        items = len(ss.s)
+        if items >= 2:
+            return (f"The {items} items on the stack would be combined",
+                    "into one with the operation of your choice.")
+        return ("An error would occur. (At least 2 stack items are",
+                "needed to reduce.)")
+
+
+class ScanStack(EscBuiltin):
+    """
+    Like :class:`ReduceStack`, but each item is replaced with the running
+    result up to that point, rather than all of them with only the final
+    result. Scanning with ``+``, for instance, gives running totals.
+    """
+    key = "#"
+    description = "scan stack"
+
+    def simulated_result(self, ss, registry):
+        items = len(ss.s)
+        if items >= 2:
+            return (f"Each of the {items} items on the stack would be",
+                    "replaced by the running result of the operation",
+                    "of your choice.")
+        return ("An error would occur. (At least 2 stack items are",
+                "needed to scan.)")
+
+
+class RecordMacro(EscBuiltin):
+    """
+    Start recording a macro; press the key again to stop. The numbers you
+    enter and the operations you choose while recording are done as usual,
+    and are remembered so you can do them all again with
+    :class:`ReplayMacro`. A macro can't include other built-ins like undo
+    or storing to a register.
+    """
+    key = "["
+    description = "record macro"
+
+    def simulated_result(self, ss, registry):
+        return ("The keys you type next would be recorded",
+                "as a macro.")
+
+
+class ReplayMacro(EscBuiltin):
+    """
+    Replay the last macro recorded. Type how many times to replay it and
+    press Enter (just Enter replays it once), or type ``*`` to replay it
+    separately on each item on the stack, as if that item were alone,
+    replacing each item with whatever the macro leaves behind. However many
+    operations run, the replay can be undone in one step.
+    """
+    key = "@"
+    description = "replay macro"
+
+    def simulated_result(self, ss, registry):
+        return ("The last macro recorded would be replayed.",)
+
+
 class Quit(EscBuiltin):
     """
     Quit esc. If you're in a menu, this option changes to "cancel" and gets
@@ -16,12 +16,17 @@ the main menu.
 """
 
 from collections import OrderedDict
+from contextlib import contextmanager
 import decimal
-from functools import wraps
+from functools import lru_cache, partial, wraps
+import inspect
 import itertools
+from operator import attrgetter
 
+from . import backends
 from . import consts
 from .functest import TestCase
+from . import memo
 from . import modes
 from .oops import (FunctionExecutionError, InsufficientItemsError, NotInMenuError,
                    FunctionProgrammingError, ProgrammingError, UnitError)
@@ -56,6 +61,9 @@ class EscCommand:
         #: Mapping from keys to :class:`EscCommand`\ s on the current menu,
         #: if this is a menu. Add to this using :meth:`register_child()`, not directly.
         self.children = OrderedDict()
+        #: Incremented whenever :attr:`children` changes,
+        #: so anything cached about this menu can tell it is stale.
+        self.generation = 0
 
     @property
     def help_title(self):
@@ -101,6 +109,7 @@ class EscCommand:
 
         child.parent = self
         self.children[child.key] = child
+        self.generation += 1
 
     def simulated_result(self, ss, registry):  # pylint: disable=no-self-use, unused-argument
         """
@@ -113,6 +122,14 @@ class EscCommand:
         """
         return None
 
+    def remembered_simulated_result(self, ss, registry):
+        """
+        Return what :meth:`simulated_result` would, if it's available without
+        running anything slow; otherwise return ``None``. The help system
+        uses this to decide whether it needs to simulate in the background.
+        """
+        return self.simulated_result(ss, registry)
+
     def test(self):
         """
         Execute any self-tests associated with this :class:`EscCommand`.
@@ -227,7 +244,8 @@ class EscOperation(EscCommand):
     """
     # pylint: disable=too-many-arguments
     def __init__(self, key, func, pop, push, description, menu, retain=False,
-                 log_as=None, simulate=True, unit_handling=None):
+                 log_as=None, simulate=True, unit_handling=None, pure=False,
+                 fold_segment=None):
         super().__init__(key, description)
         self.parent = menu
         #: The function, decorated with :func:`@Operation <Operation>`,
@@ -246,8 +264,16 @@ class EscOperation(EscCommand):
         #: for details on allowable values).
         self.log_as = log_as
         #: Whether this function should be run when a simulation is requested for
-        #: help purposes. Turn off if the function is slow or has side effects.
+        #: help purposes. Turn off if the function has side effects.
         self.simulate_allowed = simulate
+        #: Whether the function's results depend only on its inputs,
+        #: so they can be remembered and reused (see :mod:`esc.memo`).
+        self.pure = pure
+        #: Optionally, a function giving the result of reducing this operation
+        #: over a :class:`StackSegment <esc.stack.StackSegment>` directly.
+        self.fold_segment = fold_segment
+        #: (key, description) of the last simulated_result().
+        self._simulation = None
 
         #: How this operation handles units. May be a UnitHandler instance
         #: or a callable (defaults to UNSPECIFIED behavior).
@@ -258,6 +284,11 @@ class EscOperation(EscCommand):
 
         self._unit_caller, _ = util.positional_caller(
             self.unit_handling, _bind_unit_parm, ('num_results', 'override'))
+        #: Whether the unit handler looks at the values of its inputs as well
+        #: as their units, so results for equal units can't be shared.
+        self._units_read_values = any(
+            i.endswith('_stackitem')
+            for i in inspect.signature(self.unit_handling).parameters)
 
     def __repr__(self):
         return f"<EscOperation '{self.key}': {self.description}"
@@ -306,6 +337,10 @@ class EscOperation(EscCommand):
         else:
             units = "    Units: not supported"
 
+        if self.pure:
+            hits, misses = memo.result_cache.stats(self)
+            cache = f"    Results: cached ({hits} hits, {misses} misses)"
+            return (type_, input_, output, units, cache)
         return (type_, input_, output, units)
 
     def _describe_operation(self, args, retvals, registry):
@@ -361,12 +396,13 @@ class EscOperation(EscCommand):
         :param override: if True, suppress unit errors and return unitless
         :return: list of UnitExpression or None for each result
         """
+        # Most stacks have no units at all; don't build an expression per item.
+        if args and all(a.unit is None or a.unit.is_unitless for a in args):
+            return [None] * max(num_results, 0)
         input_units = [
             (a.unit if a.unit is not None else UnitExpression())
             for a in args
         ]
-        if input_units and not any(not u.is_unitless for u in input_units):
-            return [None] * max(num_results, 0)
         try:
             items = list(zip(input_units, args))
             result = self._unit_caller(items, {
@@ -397,7 +433,7 @@ class EscOperation(EscCommand):
 
         if self.pop == -1:
             # Whole stack requested; will push the whole stack back later.
-            args = ss.s[:]
+            args = list(ss.s)
             if not self.retain:
                 ss.clear()
         else:
@@ -434,6 +470,58 @@ class EscOperation(EscCommand):
             description.append("    (none)")
         return description
 
+    def _decimalize_results(self, return_values):
+        """
+        Convert the values our function returned to Decimals (or whatever
+        kind of number the current backend calculates with).
+        """
+        backend = backends.get_backend()
+        try:
+            return backend.to_numbers(return_values)
+        except OverflowError:
+            # An infinite result, under a backend that has no infinity.
+            raise FunctionExecutionError("The result is too large to represent.")
+        except (decimal.InvalidOperation, TypeError, ValueError) as e:
+            raise FunctionProgrammingError(
+                operation=self,
+                problem=f"returned a value that cannot be converted "
+                        f"to a {backend.number_type.__name__}") from e
+
+    def _call_function(self, args, registry):
+        """
+        Call our function on the StackItems /args/, translating the
+        exceptions arithmetic can raise into FunctionExecutionErrors.
+        """
+        with self._arithmetic_errors():
+            if self.pure:
+                return memo.result_cache.call(self, args, registry)
+            return self.function(args, registry)
+
+    @contextmanager
+    def _arithmetic_errors(self):
+        """
+        Translate the exceptions arithmetic can raise within the block
+        into FunctionExecutionErrors.
+        """
+        try:
+            yield
+        except ValueError:
+            # illegal operation; restore original args to stack and return
+            raise FunctionExecutionError("Domain error! Stack unchanged.")
+        except ZeroDivisionError:
+            raise FunctionExecutionError(
+                "Sorry, division by zero is against the law.")
+        except OverflowError:
+            raise FunctionExecutionError("The result is too large to represent.")
+        except TypeError:
+            # e.g., a plugin doing Decimal-only arithmetic on another kind
+            raise FunctionExecutionError("Type error! Stack unchanged.")
+        except decimal.InvalidOperation:
+            raise FunctionExecutionError(
+                "That operation is not defined by the rules of arithmetic.")
+        except InsufficientItemsError as e:
+            raise self._insufficient_items_on_stack(e.number_required)
+
     def _store_results(self, ss, args, return_values, registry,
                         override=False):
         """
@@ -444,13 +532,26 @@ class EscOperation(EscCommand):
             if not hasattr(return_values, '__iter__'):
                 return_values = (return_values,)
 
-            try:
-                coerced_retvals = util.decimalize_iterable(return_values)
-            except (decimal.InvalidOperation, TypeError) as e:
-                raise FunctionProgrammingError(
-                    operation=self,
-                    problem="returned a value that cannot be converted "
-                            "to a Decimal") from e
+            from .stack import StackItem, StackSegment
+            if isinstance(return_values, StackSegment):
+                # A generated sequence stays virtual; all its items share
+                # the one unit.
+                unit, = self._compute_result_units(args, 1, override=override)
+                ss.push_segment(return_values.with_unit(unit),
+                                self._describe_operation(args, [return_values],
+                                                         registry))
+                return
+
+            return_values = list(return_values)
+            if return_values and all(isinstance(i, StackItem) and i.is_entered
+                                     for i in return_values):
+                # Items from the stack, rearranged: they go back as they are,
+                # keeping their display strings and units.
+                ss.push(return_values,
+                        self._describe_operation(args, return_values, registry))
+                return
+
+            coerced_retvals = self._decimalize_results(return_values)
 
             # Compute units for results
             num_results = len(coerced_retvals)
@@ -459,11 +560,11 @@ class EscOperation(EscCommand):
 
             # Create UnitDecimals for history logging
             unit_retvals = []
-            from .stack import StackItem
             stack_items = []
             for i, dec_val in enumerate(coerced_retvals):
                 unit = result_units[i] if i < len(result_units) else None
-                unit_retvals.append(UnitDecimal(dec_val, unit=unit))
+                unit_retvals.append(UnitDecimal(backends.to_decimal(dec_val),
+                                                unit=unit))
                 stack_items.append(StackItem(decval=dec_val, unit=unit))
 
             ss.push(stack_items,
@@ -493,19 +594,7 @@ class EscOperation(EscCommand):
         """
         with ss.transaction():
             args = self._retrieve_arguments(ss)
-            try:
-                retvals = self.function(args, registry)
-            except ValueError:
-                # illegal operation; restore original args to stack and return
-                raise FunctionExecutionError("Domain error! Stack unchanged.")
-            except ZeroDivisionError:
-                raise FunctionExecutionError(
-                    "Sorry, division by zero is against the law.")
-            except decimal.InvalidOperation:
-                raise FunctionExecutionError(
-                    "That operation is not defined by the rules of arithmetic.")
-            except InsufficientItemsError as e:
-                raise self._insufficient_items_on_stack(e.number_required)
+            retvals = self._call_function(args, registry)
             self._store_results(ss, args, retvals, registry,
                                 override=unit_override)
         return None  # back to main menu
@@ -515,10 +604,34 @@ class EscOperation(EscCommand):
         Execute the operation on the provided `StackState`,
         but don't actually change the state --
         instead, provide a description of what would happen.
+
+        The description is remembered until the stack, the registers,
+        the decimal precision, or a mode changes, so redrawing the help
+        window (say, on a resize) doesn't run the operation again.
         """
+        description = self.remembered_simulated_result(ss, registry)
+        if description is None:
+            key = self._simulation_key(ss, registry)
+            description = self._simulate(ss, registry)
+            self._simulation = (key, description)
+        return description
+
+    def remembered_simulated_result(self, ss, registry):
+        "Return the remembered simulation for this state, if there is one."
         if not self.simulate_allowed:
             return ("The author of this operation has disabled", "simulations.")
+        simulation = self._simulation
+        if simulation is not None and simulation[0] == self._simulation_key(ss, registry):
+            return simulation[1]
+        return None
+
+    @staticmethod
+    def _simulation_key(ss, registry):
+        return (ss.version, id(registry), registry.generation,
+                decimal.getcontext().prec, modes.snapshot())
 
+    def _simulate(self, ss, registry):
+        "Run the simulation for simulated_result()."
         used_args = ss.last_n_items(self.pop)
         checkpoint = ss.memento()
         try:
@@ -651,7 +764,12 @@ def Constant(value, key, description, menu, unit=None):  # pylint: disable=inval
     so this is merely syntactic sugar.
 
     :param value: The value of the constant,
-                  as a Decimal or a value that can be converted to one.
+                  as a Decimal or a value that can be converted to one,
+                  or a function taking no arguments that calculates it
+                  to the current precision.
+                  Wrap such a function in a
+                  :class:`PrecisionCache <esc.decimalmath.PrecisionCache>`
+                  so it runs only once at each precision.
     :param key: The key to press to select the constant from the menu.
     :param description: A brief description to show next to the *key*.
     :param menu: A :class:`Menu <EscMenu>` to place this function on.
@@ -662,28 +780,55 @@ def Constant(value, key, description, menu, unit=None):  # pylint: disable=inval
                log_as=f"insert constant {description}",
                unit_handling=uh)
     def func():
-        return value
+        return value() if callable(value) else value
     # You can't define a dynamic docstring from within the function.
-    func.__doc__ = f"Add the constant {description} = {value} to the stack."
+    if callable(value):
+        func.__doc__ = (f"Add the constant {description}, "
+                        f"to the current precision, to the stack.")
+    else:
+        func.__doc__ = f"Add the constant {description} = {value} to the stack."
+
+
+@lru_cache(maxsize=None)
+def _stack_parm_getter(name, any_backend):
+    """
+    Return a function getting the value a parameter named /name/ asks for,
+    for an operation taking numbers of /any_backend/ or only Decimals.
+    """
+    if name.endswith('_stackitem'):
+        return lambda stack_item: stack_item
+    if name.endswith('_str_with_units'):
+        return attrgetter('string_with_units')
+    if name.endswith('_str'):
+        return attrgetter('string')
+    return _item_number if any_backend else _item_decimal
+
 
+def _item_number(stack_item):
+    "Return the item's number as the kind the current backend calculates with."
+    return backends.get_backend().number_of(stack_item.decimal)
 
-def _bind_stack_parm(stack_item, parm):
+
+def _item_decimal(stack_item):
+    "Return the item's number as a Decimal, whichever backend made it."
+    return backends.DECIMAL.number_of(stack_item.decimal)
+
+
+def _bind_stack_parm(stack_item, parm, any_backend=False):
     "Convert a StackItem to the type requested by the parameter's name suffix."
+    return _stack_parm_getter(parm.name, any_backend)(stack_item)
+
+
+def _bind_stack_parms(stack_items, parm, any_backend=False):
+    "Convert a run of StackItems for a varargs parameter, all in one go."
     if parm.name.endswith('_stackitem'):
-        return stack_item
-    if parm.name.endswith('_str_with_units'):
-        return stack_item.string_with_units
-    if parm.name.endswith('_str'):
-        return stack_item.string
-    return stack_item.decimal
+        return stack_items
+    return map(_stack_parm_getter(parm.name, any_backend), stack_items)
 
 
 def _bind_unit_parm(item_pair, parm):
     "Convert a (UnitExpression, StackItem) pair for a unit handler parameter."
-    unit_expr, stack_item = item_pair
-    if parm.name.endswith('_stackitem'):
-        return stack_item
-    return unit_expr
+    return item_pair[1 if parm.name.endswith('_stackitem') else 0]
 
 
 def Operation(key,
@@ -693,7 +838,10 @@ def Operation(key,
               retain=False,
               log_as=None,
               simulate=True,
-              unit_handling=None):  # pylint: disable=invalid-name
+              unit_handling=None,
+              pure=False,
+              fold_segment=None,
+              any_backend=False):  # pylint: disable=invalid-name
     """
     Decorator to register a function on a menu
     and make it available for use as an esc operation.
@@ -769,8 +917,13 @@ def Operation(key,
         when the user looks at the help page for the function,
         so they can see what would happen to the stack
         if they actually chose the function.
+        Simulations run in the background against a copy of the stack,
+        so a slow function doesn't hold up the help page;
+        if one takes longer than
+        :data:`SIMULATION_TIME_LIMIT <esc.helpme.SIMULATION_TIME_LIMIT>`
+        seconds, it's abandoned.
         You should disable this option
-        if your function is extremely slow or has side effects
+        if your function has side effects
         (e.g., changing the system clipboard, editing registers).
 
     :param unit_handling:
@@ -795,6 +948,44 @@ def Operation(key,
         See :ref:`Unit Handling <Unit Handling>` for details
         on making your operation unit-aware.
 
+    :param pure:
+        If ``True``, promise that the function's results depend only on
+        the values (and units) of its inputs,
+        the current decimal precision, and the values of modes,
+        so esc may remember recent results and reuse them
+        instead of calling the function again with the same inputs.
+        This is worth turning on for slow functions
+        such as iterative solvers.
+        A pure function can't take the ``registry`` parameter.
+
+    :param fold_segment:
+        Optionally, a function taking a
+        :class:`StackSegment <esc.stack.StackSegment>`
+        (a generated sequence that's still on the stack unexpanded)
+        and returning the result of reducing this operation over its items
+        (see :func:`esc.mapreduce.reduce_over`), worked out directly --
+        for instance, the closed-form sum of an arithmetic sequence.
+        Reducing over a sequence of millions of items then takes no longer
+        than reducing over two.
+        The result's units are those of the operation
+        on the first and last items,
+        so this is only suitable for operations
+        whose results have the same units as their inputs.
+
+    :param any_backend:
+        If ``True``, promise that the function works
+        on whichever kind of number the current
+        :mod:`number backend <esc.backends>` calculates with --
+        floats under the float backend,
+        :class:`Fractions <fractions.Fraction>` under the rational backend --
+        and hand it those.
+        By default, the function always receives `Decimal`_ objects,
+        whatever the backend,
+        and its results are converted to the backend's kind afterwards.
+        Turn this on only if the function sticks to arithmetic
+        that works on every kind of number
+        and to the functions in :mod:`esc.decimalmath`.
+
     In addition to placing the function on the menu,
     the function is wrapped with the following magic.
 
@@ -832,6 +1023,20 @@ def Operation(key,
          The ``_str``, ``_str_with_units``, and ``_stackitem`` suffixes still work.
          Again, it can have any name; ``*stack`` is conventional for esc operations.
 
+       * If the function returns
+         :class:`StackItems <esc.stack.StackItem>` it received,
+         they go back on the stack exactly as they are,
+         units included, without being converted to and from `Decimal`_
+         or passed through the unit handler.
+         This makes operations that only rearrange the stack,
+         like sorting it, cheap even on very large stacks.
+
+       * If the function returns a single
+         :class:`StackSegment <esc.stack.StackSegment>`,
+         its items are pushed without being made
+         (they get made as they're shown or used),
+         all tagged with the one unit the unit handler returns.
+
        * The special parameter name ``registry``
          receives a :class:`Registry <esc.registers.Registry>` instance
          containing the current state of all registers.
@@ -862,7 +1067,13 @@ def Operation(key,
 
     def function_decorator(func):
         caller, pop = util.positional_caller(
-            func, _bind_stack_parm, ('registry', 'testing'))
+            func, partial(_bind_stack_parm, any_backend=any_backend),
+            ('registry', 'testing'),
+            partial(_bind_stack_parms, any_backend=any_backend))
+        if pure and 'registry' in inspect.signature(func).parameters:
+            raise ProgrammingError(
+                f"The function '{func.__name__}' (key '{key}') is marked pure "
+                f"but takes the registry, which can change its results.")
 
         @wraps(func)
         def wrapper(stack, registry):
@@ -889,7 +1100,9 @@ def Operation(key,
                           log_as=log_as,
                           retain=retain,
                           simulate=simulate,
-                          unit_handling=unit_handling)
+                          unit_handling=unit_handling,
+                          pure=pure,
+                          fold_segment=fold_segment)
         menu.register_child(op)
 
         # Return the wrapped function to functions.py to complete
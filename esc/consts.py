@@ -18,5 +18,15 @@ UNDO_CHARACTER = 'u'
 REDO_CHARACTER = '^R'
 CONSTANT_MENU_CHARACTER = 'i'
 STORE_REG_CHARACTER = '>'
+STORE_STACK_REG_CHARACTER = '}'
 RETRIEVE_REG_CHARACTER = '<'
 DELETE_REG_CHARACTER = 'X'
+SWITCH_STACK_CHARACTER = 'W'
+MOVE_TO_STACK_CHARACTER = 'M'
+PALETTE_CHARACTER = '^P'
+RECORD_MACRO_CHARACTER = '['
+REPLAY_MACRO_CHARACTER = '@'
+MAP_CHARACTER = '&'
+REDUCE_CHARACTER = '$'
+SCAN_CHARACTER = '#'
+HELP_SEARCH_CHARACTER = '?'
@@ -0,0 +1,359 @@
+"""
+decimalmath.py - square roots, trigonometry and constants in Decimal
+
+Python's :mod:`math` module works in binary floating point, so anything
+computed with it has only about 16 significant digits, however many the
+decimal context asks for. The functions here take and return Decimals and
+work at the precision of the current context, plus a few guard digits
+that are rounded away at the end, so they're as accurate as the rest of
+esc's arithmetic at any precision. Given a float, as they are under the
+float :mod:`backend <esc.backends>`, they use the :mod:`math` module's
+versions instead; given a Fraction, as under the rational backend, they
+work on its Decimal approximation.
+
+Each function converges quickly: arguments to the trigonometric functions
+are first reduced to a small range where their series need few terms, and
+:func:`pi` and :func:`e` are summed by binary splitting. Constants like
+these are kept in a :class:`PrecisionCache`, which works each one out once
+for each precision and then remembers it.
+"""
+
+from decimal import Decimal, localcontext, getcontext
+from fractions import Fraction
+import functools
+import math
+
+#: Digits carried beyond the context's precision while working.
+GUARD_DIGITS = 5
+
+
+def _working_precision(extra=0):
+    "A context manager raising the precision by the guard digits and /extra/."
+    context = getcontext().copy()
+    context.prec += GUARD_DIGITS + extra
+    return localcontext(context)
+
+
+class PrecisionCache:
+    """
+    A constant whose value is worked out by a function the first time it's
+    needed at each precision, and remembered from then on. Use it as a
+    decorator on a function that takes no arguments and returns the
+    constant to the precision of the current context.
+
+    Calling the PrecisionCache returns the constant to the current
+    precision. If it's already been calculated to that precision or a
+    higher one, the closest such value is rounded rather than running the
+    function again -- so once you've worked at 1000 digits, every lower
+    precision is nearly free.
+
+    >>> @PrecisionCache
+    ... def one_third():
+    ...     return Decimal(1) / 3
+    >>> with localcontext() as ctx:
+    ...     ctx.prec = 20
+    ...     one_third()
+    Decimal('0.33333333333333333333')
+    >>> with localcontext() as ctx:
+    ...     ctx.prec = 5
+    ...     one_third()
+    Decimal('0.33333')
+    >>> one_third.precisions
+    [5, 20]
+    """
+    def __init__(self, func):
+        self.func = func
+        self._values = {}
+        functools.update_wrapper(self, func)
+
+    def __call__(self):
+        digits = getcontext().prec
+        try:
+            return self._values[digits]
+        except KeyError:
+            pass
+
+        higher = [i for i in self._values if i > digits]
+        if higher:
+            value = +self._values[min(higher)]
+        else:
+            value = +self.func()
+        self._values[digits] = value
+        return value
+
+    @property
+    def precisions(self):
+        "The precisions the constant is remembered at, lowest first."
+        return sorted(self._values)
+
+    def clear(self):
+        "Forget every value calculated so far."
+        self._values.clear()
+
+
+@PrecisionCache
+def pi():
+    """
+    Pi to the current precision, using the Chudnovsky series (14 digits a
+    term) summed in integers by binary splitting.
+
+    >>> with localcontext() as ctx:
+    ...     ctx.prec = 30
+    ...     pi()
+    Decimal('3.14159265358979323846264338328')
+    """
+    c3_over_24 = 640320 ** 3 // 24
+
+    def split(a, b):
+        if b - a == 1:
+            if a == 0:
+                p = q = 1
+            else:
+                p = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+                q = a * a * a * c3_over_24
+            t = p * (13591409 + 545140134 * a)
+            return p, q, -t if a & 1 else t
+        middle = (a + b) // 2
+        p_am, q_am, t_am = split(a, middle)
+        p_mb, q_mb, t_mb = split(middle, b)
+        return p_am * p_mb, q_am * q_mb, q_mb * t_am + p_am * t_mb
+
+    with _working_precision():
+        _, q, t = split(0, getcontext().prec // 14 + 2)
+        result = Decimal(426880) * Decimal(10005).sqrt() * q / t
+    return +result
+
+
+@PrecisionCache
+def e():
+    """
+    The base of the natural logarithm to the current precision, summing
+    1/k! by binary splitting.
+
+    >>> with localcontext() as ctx:
+    ...     ctx.prec = 30
+    ...     e()
+    Decimal('2.71828182845904523536028747135')
+    """
+    def split(a, b):
+        # p/q = 1/(a+1) + 1/((a+1)(a+2)) + ... + 1/((a+1)...b)
+        if b - a == 1:
+            return 1, b
+        middle = (a + b) // 2
+        p_am, q_am = split(a, middle)
+        p_mb, q_mb = split(middle, b)
+        return p_am * q_mb + p_mb, q_am * q_mb
+
+    with _working_precision():
+        # Enough terms that the first one left out is below the last digit.
+        terms, factorial_digits = 1, 0.0
+        while factorial_digits < getcontext().prec + 1:
+            terms += 1
+            factorial_digits += math.log10(terms)
+        p, q = split(0, terms)
+        result = 1 + Decimal(p) / q
+    return +result
+
+
+def _float_version(float_function):
+    """
+    Decorator using /float_function/ instead when given a float, and the
+    Decimal nearest a Fraction when given one.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(x):
+            if isinstance(x, float):
+                return float_function(x)
+            if isinstance(x, Fraction):
+                x = Decimal(x.numerator) / x.denominator
+            return func(x)
+        return wrapper
+    return decorator
+
+
+@_float_version(math.sqrt)
+def sqrt(x):
+    """
+    The square root of /x/.
+
+    :raises ValueError: if /x/ is negative.
+    """
+    if x < 0:
+        raise ValueError("math domain error")
+    return x.sqrt()
+
+
+def _reduce_quadrant(x):
+    """
+    Return (q, r) with x = q * pi/2 + r and |r| <= pi/4, computed in the
+    current (working) context. Enough extra digits are carried for the
+    integer part of /x/ that r is still accurate.
+    """
+    with _working_precision(max(x.adjusted(), 0)):
+        half_pi = pi() / 2
+        quadrants = (x / half_pi).to_integral_value()
+        remainder = x - quadrants * half_pi
+    return int(quadrants) % 4, +remainder
+
+
+def _sin_series(x):
+    "sin(x) by its Taylor series, for small x."
+    x_squared = x * x
+    total = term = x
+    n = 1
+    while True:
+        term = -term * x_squared / ((n + 1) * (n + 2))
+        n += 2
+        new_total = total + term
+        if new_total == total:
+            return total
+        total = new_total
+
+
+def _cos_series(x):
+    "cos(x) by its Taylor series, for small x."
+    x_squared = x * x
+    total = term = Decimal(1)
+    n = 0
+    while True:
+        term = -term * x_squared / ((n + 1) * (n + 2))
+        n += 2
+        new_total = total + term
+        if new_total == total:
+            return total
+        total = new_total
+
+
+def _sin_cos(x):
+    "Return (sin x, cos x) at the working precision."
+    quadrant, r = _reduce_quadrant(x)
+    sin_r, cos_r = _sin_series(r), _cos_series(r)
+    return {0: (sin_r, cos_r),
+            1: (cos_r, -sin_r),
+            2: (-sin_r, -cos_r),
+            3: (-cos_r, sin_r)}[quadrant]
+
+
+@_float_version(math.sin)
+def sin(x):
+    """
+    The sine of /x/ radians.
+
+    >>> sin(Decimal(0))
+    Decimal('0')
+    """
+    if not x:
+        return +x
+    with _working_precision():
+        result = _sin_cos(x)[0]
+    return +result
+
+
+@_float_version(math.cos)
+def cos(x):
+    "The cosine of /x/ radians."
+    with _working_precision():
+        result = _sin_cos(x)[1]
+    return +result
+
+
+@_float_version(math.tan)
+def tan(x):
+    "The tangent of /x/ radians."
+    if not x:
+        return +x
+    with _working_precision():
+        sin_x, cos_x = _sin_cos(x)
+        result = sin_x / cos_x
+    return +result
+
+
+@_float_version(math.atan)
+def atan(x):
+    """
+    The arc tangent of /x/, in radians from -pi/2 to pi/2.
+
+    >>> atan(Decimal(1)) == pi() / 4
+    True
+    """
+    if not x:
+        return +x
+    with _working_precision():
+        if abs(x) > 1:
+            # atan(x) = +-pi/2 - atan(1/x)
+            half_pi = pi() / 2
+            result = half_pi.copy_sign(x) - _atan_small(1 / x)
+        else:
+            result = _atan_small(x)
+    return +result
+
+
+def _atan_small(x):
+    "atan(x) for |x| <= 1, at the working precision."
+    # Halve the angle until the series converges quickly:
+    # atan(x) = 2 atan(x / (1 + sqrt(1 + x^2))).
+    doublings = 0
+    while abs(x) > Decimal("0.1"):
+        x = x / (1 + (1 + x * x).sqrt())
+        doublings += 1
+    x_squared = x * x
+    total = term = x
+    n = 1
+    while True:
+        term = -term * x_squared
+        n += 2
+        new_total = total + term / n
+        if new_total == total:
+            break
+        total = new_total
+    return total * 2 ** doublings
+
+
+@_float_version(math.asin)
+def asin(x):
+    """
+    The arc sine of /x/, in radians from -pi/2 to pi/2.
+
+    :raises ValueError: if /x/ is not between -1 and 1.
+    """
+    if abs(x) > 1:
+        raise ValueError("math domain error")
+    with _working_precision():
+        if abs(x) == 1:
+            result = (pi() / 2).copy_sign(x)
+        else:
+            result = atan(x / (1 - x * x).sqrt())
+    return +result
+
+
+@_float_version(math.acos)
+def acos(x):
+    """
+    The arc cosine of /x/, in radians from 0 to pi.
+
+    :raises ValueError: if /x/ is not between -1 and 1.
+    """
+    if abs(x) > 1:
+        raise ValueError("math domain error")
+    if x == 1:
+        return Decimal(0)
+    with _working_precision():
+        result = pi() / 2 - asin(x)
+    return +result
+
+
+@_float_version(math.radians)
+def radians(x):
+    "Convert /x/ degrees to radians."
+    with _working_precision():
+        result = x * pi() / 180
+    return +result
+
+
+@_float_version(math.degrees)
+def degrees(x):
+    "Convert /x/ radians to degrees."
+    with _working_precision():
+        result = x * 180 / pi()
+    return +result
@@ -6,21 +6,28 @@ to update the screen.
 """
 
 import curses
-import itertools
 import math
-import textwrap
-from typing import Sequence
+from typing import Sequence, Tuple
 
 from .consts import (PROGRAM_NAME,
                      QUIT_CHARACTER, UNDO_CHARACTER, REDO_CHARACTER,
                      RETRIEVE_REG_CHARACTER, STORE_REG_CHARACTER,
-                     DELETE_REG_CHARACTER, UNIT_ENTRY_CHARACTER)
+                     STORE_STACK_REG_CHARACTER,
+                     DELETE_REG_CHARACTER, UNIT_ENTRY_CHARACTER,
+                     SWITCH_STACK_CHARACTER, MOVE_TO_STACK_CHARACTER,
+                     PALETTE_CHARACTER, RECORD_MACRO_CHARACTER,
+                     REPLAY_MACRO_CHARACTER, MAP_CHARACTER,
+                     REDUCE_CHARACTER, SCAN_CHARACTER)
 from .layout import compute_layout, MIN_TERM_WIDTH, MIN_TERM_HEIGHT
+from . import modes
 from .status import status
 from .util import truncate, centered_position
 
 _SCREEN = None
 
+#: How long to wait for further resize events before reflowing the windows.
+RESIZE_DEBOUNCE_MS = 30
+
 
 class Window:
     "One of the curses windows making up esc's interface."
@@ -32,9 +39,24 @@ class Window:
         self.height = height
         self.start_x = start_x
         self.start_y = start_y
-        self.window = curses.newwin(height, width, start_y, start_x)
+        self.window = scr.new_window(height, width, start_y, start_x)
         self.window.keypad(True)
 
+    def reflow(self, spec):
+        """
+        Move and resize this window in place to match the WindowSpec /spec/.
+        The caller is responsible for refreshing the window afterwards.
+        """
+        if (spec.width, spec.height) != (self.width, self.height):
+            self.window.resize(spec.height, spec.width)
+        if (spec.x, spec.y) != (self.start_x, self.start_y):
+            self.window.mvwin(spec.y, spec.x)
+        self.window.touchwin()
+        self.width = spec.width
+        self.height = spec.height
+        self.start_x = spec.x
+        self.start_y = spec.y
+
     def _display_heading(self):
         if self.heading is not None:
             x_posn = centered_position(self.heading, self.width)
@@ -65,22 +87,33 @@ class StatusWindow(Window):
 
     def __init__(self, scr, spec):
         super().__init__(scr, spec.width, spec.height, spec.x, spec.y)
-        self.max_width = self.width - 1
         self.status_start = len(f"[ ] {PROGRAM_NAME} | ")
 
         self.status_char = ' '
         self._status_msg = ''
 
+        self._draw_frame()
+        self.refresh()
+
+    def _draw_frame(self):
+        "Draw the parts of the status bar that never change."
         try:
             self.window.addstr(
-                0, 0, (' ' * self.max_width), curses.color_pair(1))
+                0, 0, (' ' * self.max_width), self.scr.color_pair(1))
             self.window.addstr(
                 0, 0, f"[{self.status_char}] {PROGRAM_NAME} |",
-                curses.color_pair(1))
+                self.scr.color_pair(1))
             self.window.move(0, 1)
         except curses.error:
             pass
-        self.refresh()
+
+    def reflow(self, spec):
+        super().reflow(spec)
+        self._draw_frame()
+
+    @property
+    def max_width(self):
+        return self.width - 1
 
     @property
     def status_msg(self):
@@ -92,13 +125,13 @@ class StatusWindow(Window):
 
     def refresh(self):
         try:
-            self.window.addstr(0, 1, self.status_char, curses.color_pair(1))
+            self.window.addstr(0, 1, self.status_char, self.scr.color_pair(1))
             self.window.addstr(0,
                                self.status_start,
                                ' ' * (self.max_width - self.status_start),
-                               curses.color_pair(1))
+                               self.scr.color_pair(1))
             self.window.addstr(0, self.status_start, self.status_msg,
-                               curses.color_pair(1))
+                               self.scr.color_pair(1))
         except curses.error:
             pass
         super().refresh()
@@ -114,13 +147,24 @@ class StatusWindow(Window):
 
 class StackWindow(Window):
     "Window for the stack, where the numbers go."
-    heading = "Stack"
+
+    @property
+    def heading(self):
+        "Include the name of the stack once the user has switched stacks."
+        if self.scr.stack_name is None:
+            return "Stack"
+        return truncate(f"Stack: {self.scr.stack_name}", self.width - 2)
 
     def __init__(self, scr, spec):
         super().__init__(scr, spec.width, spec.height, spec.x, spec.y)
         self.ss = None
         self._scroll_offset = 0
         self.partial_unit = None  # None = not in unit mode; "" = unit mode, empty buffer
+        #: How far numbers too long for the window are scrolled across.
+        self.column_offset = 0
+        # Stack version column_offset was set for; it resets when this changes.
+        self._column_version = None
+        self._visible_items = []
 
         self.window.border()
         self.refresh()
@@ -131,13 +175,19 @@ class StackWindow(Window):
             self.window.border()
             if self.ss:
                 visible_slots = self.height - 3
-                items = list(self.ss)
-                visible_items = items[-visible_slots:]
-                self._scroll_offset = max(0, len(items) - visible_slots)
+                # Only the visible items are looked at, so a generated
+                # sequence isn't expanded just to show its last few values.
+                self._scroll_offset = max(0, len(self.ss.s) - visible_slots)
+                visible_items = self.ss.s[self._scroll_offset:]
+                self._visible_items = visible_items
+                if self.ss.version != self._column_version:
+                    self.column_offset = 0
                 max_text_width = self.width - 2
                 last_index = len(visible_items) - 1
                 for index, stack_item in enumerate(visible_items):
-                    num_str = truncate(stack_item.string, max_text_width)
+                    editing = index == last_index and self.ss.editing_last_item
+                    num_str = self._shown_number(stack_item.string, editing,
+                                                 max_text_width)
                     self.window.addstr(1 + index, 1, num_str)
 
                     # For bos during unit entry, show partial_unit
@@ -151,7 +201,7 @@ class StackWindow(Window):
                             ) if len(unit_str) > remaining else unit_str
                             self.window.addstr(
                                 1 + index, col, unit_str,
-                                curses.color_pair(3))
+                                self.scr.color_pair(3))
                     elif (stack_item.unit is not None
                             and not stack_item.unit.is_unitless):
                         unit_str = " " + stack_item.unit.display()
@@ -163,11 +213,60 @@ class StackWindow(Window):
                             ) if len(unit_str) > remaining else unit_str
                             self.window.addstr(
                                 1 + index, col, unit_str,
-                                curses.color_pair(3))
+                                self.scr.color_pair(3))
         except curses.error:
             pass
         super().refresh()
 
+    def _shown_number(self, string, editing, max_text_width):
+        """
+        The part of the number /string/ to show in /max_text_width/ columns.
+        A number being typed in shows its end, so the cursor stays in view;
+        other numbers too long to fit show from :attr:`column_offset` on.
+        """
+        if editing:
+            if len(string) < max_text_width:
+                return string
+            return '...' + string[-(max_text_width - 4):]
+        if len(string) <= max_text_width:
+            return string
+        start = min(self.column_offset, len(string) - (max_text_width - 3))
+        if start > 0:
+            string = '...' + string[start:]
+        return truncate(string, max_text_width)
+
+    def scroll_across(self, direction):
+        """
+        Scroll numbers too long for the window half a window's width to the
+        right (if /direction/ is positive) or the left. Scrolling is undone
+        as soon as the stack changes.
+
+        :return: False if they can't be scrolled any further that way.
+        """
+        max_text_width = self.width - 2
+        longest = max((len(i.string) for i in self._visible_items), default=0)
+        limit = max(0, longest - (max_text_width - 3))
+        offset = self.column_offset + direction * (max_text_width // 2)
+        offset = min(max(offset, 0), limit)
+        if offset == self.column_offset:
+            return False
+        self.column_offset = offset
+        self._column_version = self.ss.version if self.ss else None
+        self.refresh()
+        return True
+
+    def _cursor_column(self):
+        "Column just after the number being typed in, as it's shown."
+        return 1 + min(self.ss.cursor_posn, self.width - 3)
+
+    def putch(self, c):
+        "Echo a character typed into bos, redrawing it if it no longer fits."
+        if self.ss is not None and self.ss.cursor_posn >= self.width - 2:
+            self.refresh()
+            self.set_cursor_posn()
+        else:
+            super().putch(c)
+
     def _display_row(self, stack_posn):
         """
         Map an absolute stack position to a display row in the window,
@@ -193,7 +292,7 @@ class StackWindow(Window):
             elif self.ss.editing_last_item:
                 row = self._display_row(self.ss.stack_posn)
                 row = max(1, min(row, self.height - 2))
-                self.window.move(row, self.ss.cursor_posn + 1)
+                self.window.move(row, self._cursor_column())
             else:
                 # when not editing a number, cursor goes on *next line*
                 row = self._display_row(self.ss.stack_posn) + 1
@@ -207,6 +306,11 @@ class StackWindow(Window):
         Update the screen to show that a character was backspaced off the
         stack line being edited.
         """
+        if bs_status == 0 and self.ss.cursor_posn >= self.width - 3:
+            # The number didn't fit; show more of it.
+            self.refresh()
+            self.set_cursor_posn()
+            return
         try:
             if bs_status == 0:  # character backspaced
                 row = self._display_row(self.ss.stack_posn)
@@ -252,265 +356,278 @@ class HistoryWindow(Window):
 
 
 class CommandsWindow(Window):
-    "Window displaying available commands/actions."
+    """
+    Window displaying available commands/actions.
+
+    Laying out a menu means walking its children and doing the truncation
+    math for the window size, but the menu rarely changes between keys, so
+    the result is kept as a draw list of (y, x, text, color pair) entries.
+    The cache is shared by all instances so it survives the window being
+    recreated; entries are keyed on the menu and window size and are stale
+    once the menu gains children or a mode changes.
+    """
     heading = "Commands"
 
     border_width = 2  #: columns consumed by the window border
     key_width = 2     #: columns consumed by the menu char and space
 
+    _layout_cache = {}
+    _layout_cache_size = 64
+
     def __init__(self, scr, spec):
         super().__init__(scr, spec.width, spec.height, spec.x, spec.y)
-        self.max_display_width = self.width - self.border_width - self.key_width
         self.menu = None
         self.refresh()
 
+    @property
+    def max_display_width(self):
+        return self.width - self.border_width - self.key_width
+
+    @classmethod
+    def invalidate_layouts(cls):
+        "Forget all cached menu layouts."
+        cls._layout_cache.clear()
+
+    def _draw_list(self):
+        "Return the (possibly cached) draw list for the current menu."
+        key = (self.menu, self.width, self.height)
+        # The mode display can show anything (the precision, the backend...),
+        # so it's compared as drawn.
+        mode_display = self.menu.mode_display() if self.menu.mode_display else None
+        generation = (self.menu.generation, modes.generation(), mode_display)
+        try:
+            cached_generation, draw_list = self._layout_cache[key]
+        except KeyError:
+            pass
+        else:
+            if cached_generation == generation:
+                return draw_list
+
+        draw_list = self._compute_layout()
+        if len(self._layout_cache) >= self._layout_cache_size:
+            self._layout_cache.clear()
+        self._layout_cache[key] = (generation, draw_list)
+        return draw_list
+
     def refresh(self):
         try:
             self.window.clear()
             self.window.border()
-
             if self.menu is not None:
-                min_xposn = 1
-                max_xposn = self.width - 2
-                xposn = min_xposn
-                yposn = 1
-                truncated = False
-
-                # Print menu title.
-                if not self.menu.is_main_menu:
-                    self._add_menu(self.menu.description, yposn)
-                    if self.menu.mode_display:
-                        self._add_mode_display(
-                            self.menu.mode_display(), yposn+1)
-                    yposn += 2
-
-                # Print anonymous operations to the screen.
-                for i in self.menu.anonymous_children:
-                    if yposn >= self.height - 1:
-                        truncated = True
-                        break
-                    self._add_command(i.key, None, yposn, xposn)
-                    xposn += 2
-                    if xposn >= max_xposn - 2:
-                        yposn += 1
-                        xposn = min_xposn
-
-                # Now normal operations and menus.
-                yposn += 1
-                xposn = min_xposn
-                for i in self.menu.named_children:
-                    if yposn >= self.height - 1:
-                        truncated = True
-                        break
-                    self._add_command(i.key, i.description, yposn, xposn)
-                    yposn += 1
-
-                # then the special options, if on the main menu
-                if self.menu.is_main_menu:
-                    if yposn < self.height - 1:
-                        self._add_command(STORE_REG_CHARACTER,
-                                          'store bos to reg', yposn, xposn)
-                    else:
-                        truncated = True
-                    if yposn + 1 < self.height - 1:
-                        self._add_command(RETRIEVE_REG_CHARACTER,
-                                          'get bos from reg', yposn+1, xposn)
-                    else:
-                        truncated = True
-                    if yposn + 2 < self.height - 1:
-                        self._add_command(DELETE_REG_CHARACTER,
-                                          'delete register', yposn+2, xposn)
-                    else:
-                        truncated = True
-                    if yposn + 3 < self.height - 1:
-                        self._add_command(UNDO_CHARACTER,
-                                          'undo (', yposn+3, xposn)
-                        redo_x = min(xposn + 8, max_xposn - 6)
-                        self._add_command(REDO_CHARACTER.lower(),
-                                          'redo)', yposn+3, redo_x)
+                for yposn, xposn, text, pair in self._draw_list():
+                    if pair:
+                        self.window.addstr(yposn, xposn, text,
+                                           self.scr.color_pair(pair))
                     else:
-                        truncated = True
-                    if yposn + 4 < self.height - 1:
-                        self._add_command(UNIT_ENTRY_CHARACTER,
-                                          'add unit tag', yposn+4, xposn)
-                    else:
-                        truncated = True
-                    yposn += 5
-
-                # then the quit option, which is always there but not an op
-                if yposn < self.height - 1:
-                    quit_name = ('quit' if self.menu.is_main_menu
-                                 else 'cancel')
-                    self._add_command(
-                        QUIT_CHARACTER, quit_name, yposn, xposn)
-                else:
-                    truncated = True
-
-                if truncated:
-                    fill = " " * max(0, self.width - 5)
-                    self.window.addstr(self.height - 2, 1, "..." + fill)
+                        self.window.addstr(yposn, xposn, text)
         except curses.error:
             pass
 
         # finally, make curses figure out how it's supposed to draw this
         super().refresh()
 
-    def _add_menu(self, text, yposn):
+    def _compute_layout(self):
+        "Lay out the current menu as a list of (y, x, text, color pair) entries."
+        draw_list = []
+        min_xposn = 1
+        max_xposn = self.width - 2
+        xposn = min_xposn
+        yposn = 1
+        truncated = False
+        # The bottom row is kept for quit/cancel, so it's always shown.
+        quit_yposn = self.height - 2
+
+        # Print menu title.
+        if not self.menu.is_main_menu:
+            self._add_menu(draw_list, self.menu.description, yposn)
+            if self.menu.mode_display:
+                self._add_mode_display(
+                    draw_list, self.menu.mode_display(), yposn+1)
+            yposn += 2
+
+        # Print anonymous operations to the screen.
+        for i in self.menu.anonymous_children:
+            if yposn >= quit_yposn:
+                truncated = True
+                break
+            self._add_command(draw_list, i.key, None, yposn, xposn)
+            xposn += 2
+            if xposn >= max_xposn - 2:
+                yposn += 1
+                xposn = min_xposn
+
+        # Now normal operations and menus.
+        yposn += 1
+        xposn = min_xposn
+        for i in self.menu.named_children:
+            if yposn >= quit_yposn:
+                truncated = True
+                break
+            self._add_command(draw_list, i.key, i.description, yposn, xposn)
+            yposn += 1
+
+        # then the special options, if on the main menu; related keys share
+        # a row, and the prefix keys are left to the help to explain
+        if self.menu.is_main_menu:
+            specials = (
+                ((STORE_REG_CHARACTER, 'store bos to reg'),),
+                ((STORE_STACK_REG_CHARACTER, 'store stack to reg'),),
+                ((RETRIEVE_REG_CHARACTER, 'get bos from reg'),),
+                ((DELETE_REG_CHARACTER, 'delete register'),),
+                ((UNDO_CHARACTER, 'undo ('),
+                 (REDO_CHARACTER.lower(), 'redo)')),
+                ((UNIT_ENTRY_CHARACTER, 'add unit tag'),),
+                ((SWITCH_STACK_CHARACTER, 'switch, '),
+                 (MOVE_TO_STACK_CHARACTER, 'move stack')),
+                ((PALETTE_CHARACTER.lower(), 'find command'),),
+                ((' '.join((RECORD_MACRO_CHARACTER, REPLAY_MACRO_CHARACTER,
+                            MAP_CHARACTER, REDUCE_CHARACTER,
+                            SCAN_CHARACTER)), 'prefixes'),),
+            )
+            for row in specials:
+                if yposn >= quit_yposn:
+                    truncated = True
+                    break
+                row_xposn = xposn
+                for key, description in row:
+                    self._add_command(draw_list, key, description,
+                                      yposn, min(row_xposn, max_xposn - 6))
+                    row_xposn += len(key) + len(description) + 1
+                yposn += 1
+
+        if truncated:
+            fill = " " * max(0, self.width - 5)
+            draw_list.append((quit_yposn - 1, 1, "..." + fill, None))
+
+        # then the quit option, which is always there but not an op
+        quit_name = 'quit' if self.menu.is_main_menu else 'cancel'
+        self._add_command(draw_list, QUIT_CHARACTER, quit_name,
+                          min(yposn, quit_yposn), xposn)
+        return draw_list
+
+    def _add_menu(self, draw_list, text, yposn):
         text = "(%s)" % text
         self._add_command(
-            '', text, yposn, centered_position(text, self.width - 2))
+            draw_list, '', text, yposn, centered_position(text, self.width - 2))
 
-    def _add_mode_display(self, text, yposn):
+    def _add_mode_display(self, draw_list, text, yposn):
         self._add_command(
-            '', text, yposn, centered_position(text, self.width - 2))
+            draw_list, '', text, yposn, centered_position(text, self.width - 2))
 
-    def _add_command(self, char, descr, yposn, xposn):
-        self.window.addstr(yposn, xposn, char, curses.color_pair(2))
+    def _add_command(self, draw_list, char, descr, yposn, xposn):
+        # pylint: disable=too-many-arguments
+        draw_list.append((yposn, xposn, char, 2))
         if descr:
-            self.window.addstr(yposn,
-                               xposn + 1 + len(char),
-                               truncate(descr, self.max_display_width))
+            draw_list.append((yposn,
+                              xposn + 1 + len(char),
+                              truncate(descr, self.max_display_width),
+                              None))
 
 
 class RegistersWindow(Window):
-    "Window displaying registers/variables currently defined."
+    """
+    Window displaying registers/variables currently defined.
+
+    There may be far more registers than fit in the window, so only the
+    slice that will actually be shown is fetched from the registry on each
+    refresh. While a register name is being typed, the list is filtered to
+    names starting with what has been typed so far.
+    """
     heading = "Registers"
+    min_col_width = 8  #: narrowest column worth splitting into
 
     def __init__(self, scr, spec):
         super().__init__(scr, spec.width, spec.height, spec.x, spec.y)
-        self.register_pairs = []
+        self.registry = None
+        self.prefix = ''
+        self._registry_generation = None
         self.refresh()
 
     def refresh(self):
         try:
             self.window.clear()
             self.window.border()
-
-            pairs = list(self.register_pairs)
-            rows_available = self.height - 2
-            min_col_width = 8
-
-            if len(pairs) <= rows_available:
-                num_cols = 1
-            else:
-                num_cols = math.ceil(len(pairs) / rows_available)
-                max_cols = max(1, (self.width - 2) // min_col_width)
-                num_cols = min(num_cols, max_cols)
-
-            col_width = (self.width - 2) // num_cols
-            total_slots = num_cols * rows_available
-            truncated = len(pairs) > total_slots
-
-            for idx, (register, stack_item) in enumerate(pairs):
-                if idx >= total_slots:
-                    break
-                col = idx // rows_available
-                row = idx % rows_available
-                x_offset = col * col_width + 1
-                assert len(register) == 1
-                self.window.addstr(row + 1, x_offset,
-                                   register, curses.color_pair(2))
-                value_width = col_width - 3
-                if value_width > 3:
-                    num_str = truncate(stack_item.string, value_width)
-                    self.window.addstr(row + 1, x_offset + 2, num_str)
-                    # Show unit in contrasting color
-                    if (stack_item.unit is not None
-                            and not stack_item.unit.is_unitless):
-                        unit_str = " " + stack_item.unit.display()
-                        ucol = x_offset + 2 + len(num_str)
-                        remaining = value_width - len(num_str)
-                        if remaining > 1:
-                            unit_str = truncate(
-                                unit_str, remaining
-                            ) if len(unit_str) > remaining else unit_str
-                            self.window.addstr(
-                                row + 1, ucol, unit_str,
-                                curses.color_pair(3))
-
-            if truncated and rows_available >= 2:
-                last_col_x = (num_cols - 1) * col_width + 1
-                self.window.addstr(self.height - 2, last_col_x, "...")
+            if self.registry is not None:
+                self._draw_registers()
         except curses.error:
             pass
 
         super().refresh()
 
-    def update_registry(self, registry):
-        """
-        Store the new register pairs to be used on a refresh().
-        """
-        self.register_pairs = registry.items()
+    def _draw_registers(self):
+        rows_available = self.height - 2
+        num_matching = self.registry.count(self.prefix)
 
+        if num_matching <= rows_available:
+            num_cols = 1
+        else:
+            num_cols = math.ceil(num_matching / rows_available)
+            max_cols = max(1, (self.width - 2) // self.min_col_width)
+            num_cols = min(num_cols, max_cols)
+
+        col_width = (self.width - 2) // num_cols
+        total_slots = num_cols * rows_available
+        truncated = num_matching > total_slots
+        pairs = self.registry.items(self.prefix, limit=total_slots)
+
+        for col in range(num_cols):
+            column = pairs[col * rows_available:(col + 1) * rows_available]
+            if not column:
+                break
+            name_width = min(max(len(register) for register, _ in column),
+                             max(1, col_width // 2 - 1))
+            x_offset = col * col_width + 1
+            for row, (register, stack_item) in enumerate(column, 1):
+                self.window.addstr(row, x_offset,
+                                   _fit(register, name_width),
+                                   self.scr.color_pair(2))
+                value_width = col_width - name_width - 2
+                if value_width > 3:
+                    self._draw_value(stack_item, row,
+                                     x_offset + name_width + 1, value_width)
+
+        if truncated and rows_available >= 2:
+            last_col_x = (num_cols - 1) * col_width + 1
+            self.window.addstr(self.height - 2, last_col_x, "...")
+
+    def _draw_value(self, stack_item, row, xposn, value_width):
+        num_str = truncate(stack_item.string, value_width)
+        self.window.addstr(row, xposn, num_str)
+        # Show unit in contrasting color
+        if (stack_item.unit is not None
+                and not stack_item.unit.is_unitless):
+            unit_str = " " + stack_item.unit.display()
+            ucol = xposn + len(num_str)
+            remaining = value_width - len(num_str)
+            if remaining > 1:
+                unit_str = truncate(
+                    unit_str, remaining
+                ) if len(unit_str) > remaining else unit_str
+                self.window.addstr(
+                    row, ucol, unit_str,
+                    self.scr.color_pair(3))
 
-class HelpWindow(Window):  # pylint: disable=too-many-instance-attributes
-    "Temporary window displaying help messages."
-    heading = "Help"
+    def update_registry(self, registry, prefix=''):
+        """
+        Note the registry (and the name prefix to filter it by)
+        to be used on a refresh().
+        Return False if nothing has changed since the last call.
+        """
+        if (registry is self.registry
+                and registry.generation == self._registry_generation
+                and prefix == self.prefix):
+            return False
+        self.registry = registry
+        self.prefix = prefix
+        self._registry_generation = registry.generation
+        return True
 
-    # pylint: disable=too-many-arguments
-    def __init__(self, scr, is_menu, help_title, signature_info, docstring,
-                 results_info):
-        layout = scr._layout
-        if is_menu:
-            w = layout.stack.width + layout.history.width
-            x = layout.stack.x
-            y = layout.stack.y
-        else:
-            w = layout.history.width + layout.commands.width
-            x = layout.history.x
-            y = layout.history.y
-        h = layout.commands.height
-
-        super().__init__(scr, w, h, x, y)
-        self.help_title = help_title
-        self.signature_info = signature_info
-        self.docstring = docstring
-        self.results_info = results_info
-        self.refresh()
 
-    def refresh(self):
-        self.scr.hide_registers_window()
-        try:
-            self.window.clear()
-            self.window.border()
-            max_content_width = self.width - 2
-            self.window.addstr(
-                1,
-                centered_position(self.help_title, self.width),
-                self.help_title,
-                curses.color_pair(2))
-
-            indent = "    "
-            docstring_lines = (indent + i for i in
-                               textwrap.wrap(
-                                   textwrap.dedent(self.docstring).strip(),
-                                   max_content_width - len(indent)))
-
-            if self.results_info is not None:
-                rest = (
-                    "",
-                    "If you executed this command now...",
-                    *(f"    {i}" for i in self.results_info))
-            else:
-                rest = (())
-            display_iterable = itertools.chain(
-                ("Description:",),
-                docstring_lines,
-                ("", "Signature:"),
-                self.signature_info,
-                rest
-            )
-            last_content_row = self.height - 2
-            for yposn, text in enumerate(display_iterable, 2):
-                if yposn >= last_content_row:
-                    self.window.addstr(last_content_row, 1, "...")
-                    break
-                if max_content_width > 3:
-                    text = truncate(text, max_content_width)
-                self.window.addstr(yposn, 1, text)
-        except curses.error:
-            pass
-        super().refresh()
+def _fit(text, width):
+    "Cut /text/ down to /width/ columns, marking the cut with '~'."
+    if len(text) <= width:
+        return text
+    return text[:width - 1] + '~'
 
 
 class EscScreen:
@@ -525,9 +642,12 @@ class EscScreen:
         self.commandsw = None
         self.registersw = None
         self.helpw = None
+        self.searchw = None
         self._layout = None
         self._too_small = False
         self._units_active = False
+        #: Name of the stack on screen, or None if it needn't be shown.
+        self.stack_name = None
         self._setup()
 
     def _setup(self):
@@ -547,9 +667,7 @@ class EscScreen:
                                       units_active=self._units_active)
         layout = self._layout
 
-        curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_GREEN)
-        curses.init_pair(2, curses.COLOR_BLUE, curses.COLOR_BLACK)
-        curses.init_pair(3, curses.COLOR_CYAN, curses.COLOR_BLACK)
+        self._init_colors()
 
         self.statusw = StatusWindow(self, layout.status)
         self.stackw = StackWindow(self, layout.stack)
@@ -560,6 +678,23 @@ class EscScreen:
         else:
             self.registersw = _NullWindow()
 
+    @staticmethod
+    def _init_colors():
+        "Define the color pairs used by the windows."
+        curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_GREEN)
+        curses.init_pair(2, curses.COLOR_BLUE, curses.COLOR_BLACK)
+        curses.init_pair(3, curses.COLOR_CYAN, curses.COLOR_BLACK)
+
+    @staticmethod
+    def new_window(height, width, start_y, start_x):
+        "Create the underlying window object for a :class:`Window`."
+        return curses.newwin(height, width, start_y, start_x)
+
+    @staticmethod
+    def color_pair(number):
+        "Return the display attribute for the color pair /number/."
+        return curses.color_pair(number)
+
     def _show_too_small_message(self, max_y, max_x):
         "Display a centered 'terminal too small' message on stdscr."
         self.stdscr.clear()
@@ -578,17 +713,93 @@ class EscScreen:
         return self._too_small
 
     def handle_resize(self):
-        "Recreate all windows after a terminal resize."
+        """
+        Respond to a terminal resize. Any further resize events that arrive
+        within RESIZE_DEBOUNCE_MS are absorbed first, so dragging a terminal
+        edge reflows the windows once rather than once per event.
+        """
         curses.update_lines_cols()
-        self.stdscr.clear()
-        self.stdscr.refresh()
-        self._setup()
+        self._absorb_pending_resizes()
+        self.searchw = None
+        self._reflow()
+
+    def _absorb_pending_resizes(self):
+        "Consume queued KEY_RESIZE events, putting back any other key."
+        self.stdscr.timeout(RESIZE_DEBOUNCE_MS)
+        try:
+            while True:
+                c = self.stdscr.getch()
+                if c != curses.KEY_RESIZE:
+                    if c != -1:
+                        self.ungetch(c)
+                    break
+        finally:
+            self.stdscr.timeout(-1)
+
+    @staticmethod
+    def ungetch(c):
+        "Push the key /c/ back so the next read returns it."
+        curses.ungetch(c)
+
+    def input_pending(self, wait_ms):
+        """
+        Wait up to /wait_ms/ milliseconds for a key, returning True if one
+        arrives. The key is pushed back to be read as usual.
+        """
+        self.stdscr.timeout(wait_ms)
+        try:
+            c = self.stdscr.getch()
+        finally:
+            self.stdscr.timeout(-1)
+        if c == -1:
+            return False
+        self.ungetch(c)
+        return True
+
+    def _reflow(self):
+        """
+        Move and resize the existing windows to fit the current terminal size.
+        Windows are only created from scratch the first time we have room
+        for them or if curses refuses to move one.
+        """
+        max_y, max_x = self.stdscr.getmaxyx()
+        if (self._too_small or self.statusw is None
+                or max_y < MIN_TERM_HEIGHT or max_x < MIN_TERM_WIDTH):
+            self.stdscr.clear()
+            self.stdscr.refresh()
+            self._setup()
+            return
+
+        self._layout = compute_layout(max_y, max_x,
+                                      units_active=self._units_active)
+        layout = self._layout
+        try:
+            for window, spec in ((self.statusw, layout.status),
+                                 (self.stackw, layout.stack),
+                                 (self.historyw, layout.history),
+                                 (self.commandsw, layout.commands)):
+                window.reflow(spec)
+        except curses.error:
+            self._setup()
+            return
+
+        if layout.registers is None:
+            self.registersw = _NullWindow()
+        elif isinstance(self.registersw, _NullWindow):
+            self.registersw = RegistersWindow(self, layout.registers)
+        else:
+            try:
+                self.registersw.reflow(layout.registers)
+            except curses.error:
+                self._setup()
+                return
+        self.refresh_all()
 
     def activate_units(self):
         """One-time transition to wider stack column for unit display."""
         if not self._units_active:
             self._units_active = True
-            self.handle_resize()
+            self._reflow()
 
     def refresh_all(self):
         self.refresh_status()
@@ -614,6 +825,10 @@ class EscScreen:
         self.stackw.ss = ss
         self.stackw.refresh()
 
+    def show_stack_name(self, name):
+        "Label the stack window with the name of the stack it's showing."
+        self.stack_name = name
+
     def place_cursor(self, ss):
         self.stackw.ss = ss
         self.stackw.set_cursor_posn()
@@ -628,6 +843,10 @@ class EscScreen:
     def putch_stack(self, c):
         self.stackw.putch(c)
 
+    def scroll_stack(self, direction):
+        "Scroll long numbers on the stack across; see StackWindow.scroll_across."
+        return self.stackw.scroll_across(direction)
+
 
     ### Commands ###
     def display_menu(self, menu):
@@ -636,9 +855,13 @@ class EscScreen:
 
 
     ### Registers ###
-    def update_registers(self, registry):
-        self.registersw.update_registry(registry)
-        self.registersw.refresh()
+    def update_registers(self, registry, prefix=''):
+        """
+        Redraw the registers window if any registers have changed,
+        or if *prefix* (filtering the registers shown by name) has.
+        """
+        if self.registersw.update_registry(registry, prefix):
+            self.registersw.refresh()
 
     def hide_registers_window(self):
         self.registersw.clear()
@@ -656,22 +879,45 @@ class EscScreen:
                          signature_info: Sequence[str], docstring: str,
                          results_info: Sequence[str]) -> None:
         "Display a help window for the command we requested."
+        from .popups import HelpWindow
         self.helpw = HelpWindow(self, is_menu, help_title, signature_info,
                                 docstring, results_info)
 
+    def show_search_window(self, heading: str,
+                           rows: Sequence[Tuple[str, str]], selected: int,
+                           empty_message: str = "") -> None:
+        """
+        Display (or update) a list of (key path, description) /rows/,
+        highlighting the one at index /selected/.
+        """
+        from .popups import SearchWindow
+        if self.searchw is None or self.searchw.heading != heading:
+            self.searchw = SearchWindow(self, heading)
+        self.searchw.rows = rows
+        self.searchw.selected = selected
+        self.searchw.empty_message = empty_message
+        self.searchw.refresh()
+
+    def hide_search_window(self):
+        "Forget the search window; the caller redraws what was under it."
+        self.searchw = None
+
 
 class _NullWindow:
     """Stand-in for a window that isn't displayed (e.g. registers when
     the terminal is too short)."""
 
+    def reflow(self, spec):
+        pass
+
     def refresh(self):
         pass
 
     def clear(self):
         pass
 
-    def update_registry(self, registry):
-        pass
+    def update_registry(self, registry, prefix=''):
+        return False
 
 
 def screen():
@@ -696,7 +942,12 @@ def fetch_input(in_menu) -> int:
         return screen().getch_stack()
 
 
-def init(stdscr):
-    "Initialize the screen() from curses' stdscr."
+def init(stdscr, screen_class=None):
+    """
+    Initialize the screen() from curses' stdscr. A /screen_class/ other than
+    EscScreen may be provided to drive a different backend, such as the
+    in-memory one in esc.headless.
+    """
     global _SCREEN
-    _SCREEN = EscScreen(stdscr)
+    _SCREEN = (screen_class or EscScreen)(stdscr)
+    return _SCREEN
@@ -5,6 +5,7 @@ functest.py - rudimentary built-in unit testing for functions
 import decimal
 import math
 
+from . import backends
 from .oops import FunctionProgrammingError
 from .stack import StackItem, StackState
 from .registers import Registry
@@ -148,7 +149,10 @@ class TestCase:
         registry = Registry()
         ss.push(start_items)
         try:
-            operation.execute(access_key=None, ss=ss, registry=registry)
+            # Whatever the operation does to the precision or backend stays
+            # in the test.
+            with decimal.localcontext(), backends.local_backend():
+                operation.execute(access_key=None, ss=ss, registry=registry)
         except Exception as e:
             if self.raises is None or not _recursive_exception_instance(e, self.raises):
                 raise self._oops_it(
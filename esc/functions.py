@@ -5,13 +5,20 @@ functions.py -- default calculator functions
 # pylint: disable=invalid-name
 
 from decimal import Decimal, InvalidOperation
+from fractions import Fraction
 import math
+from operator import attrgetter
 import platform
 from subprocess import Popen, PIPE
 
+from . import decimalmath
 from .commands import BINOP, Constant, Operation, Menu, main_menu
-from .consts import CONSTANT_MENU_CHARACTER
+from .consts import CONSTANT_MENU_CHARACTER, PRECISION
 from .oops import InsufficientItemsError
+from .backends import (DECIMAL, FLOAT, RATIONAL, get_backend, set_backend,
+                       to_decimal)
+from .precision import get_precision, set_precision
+from .stack import StackSegment
 from .status import status
 from .oops import (IncommensurableUnitsError, UnitExponentError,
                    UnitlessOperandError, UnitRootError)
@@ -27,7 +34,9 @@ from .units import (UnitDecimal as UD, UnitExpression as U,
 ####################
 
 @Operation('+', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=additive_unit_handling())
+           unit_handling=additive_unit_handling(),
+           fold_segment=StackSegment.total,
+           any_backend=True)
 def add(sos, bos):
     "Add sos and bos."
     return sos + bos
@@ -46,7 +55,8 @@ add.ensure(
 
 
 @Operation('-', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=additive_unit_handling())
+           unit_handling=additive_unit_handling(),
+           any_backend=True)
 def subtract(sos, bos):
     "Subtract bos from sos."
     return sos - bos
@@ -63,7 +73,8 @@ subtract.ensure(
 
 
 @Operation('*', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=multiplicative_unit_handling())
+           unit_handling=multiplicative_unit_handling(),
+           any_backend=True)
 def multiply(sos, bos):
     "Multiply sos and bos."
     return sos * bos
@@ -84,7 +95,8 @@ multiply.ensure(
 
 
 @Operation('/', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=divisive_unit_handling())
+           unit_handling=divisive_unit_handling(),
+           any_backend=True)
 def divide(sos, bos):
     "Divide sos by bos."
     return sos / bos
@@ -106,10 +118,26 @@ divide.ensure(
     raises=UnitlessOperandError)
 
 
+#: Largest result, in bits, the rational backend works out a power exactly.
+MAX_EXACT_POWER_BITS = 100000
+
+
 @Operation('^', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=power_unit_handling())
+           unit_handling=power_unit_handling(),
+           any_backend=True)
 def exponentiate(sos, bos):
     "Take sos to the power of bos."
+    if isinstance(sos, float):
+        # A negative float to a fractional power would be a complex number;
+        # math.pow raises ValueError instead.
+        return math.pow(sos, bos)
+    if isinstance(sos, Fraction):
+        size = max(sos.numerator.bit_length(), sos.denominator.bit_length())
+        if bos.denominator == 1 and abs(bos) * size <= MAX_EXACT_POWER_BITS:
+            return sos**bos
+        # Fractional powers are rarely rational, and huge ones would take
+        # ages to work out exactly: calculate these in Decimal.
+        return Fraction(to_decimal(sos) ** to_decimal(bos))
     return sos**bos
 
 exponentiate.ensure(before=[3, 3], after=[27])
@@ -132,9 +160,16 @@ exponentiate.ensure(
 
 
 @Operation('%', menu=main_menu, push=1, log_as=BINOP,
-           unit_handling=additive_unit_handling())
+           unit_handling=additive_unit_handling(),
+           any_backend=True)
 def modulus(sos, bos):
     "Take the remainder of sos divided by bos (a.k.a., sos mod bos)."
+    if isinstance(sos, float):
+        # Same sign as sos, as with Decimals; % on floats follows bos.
+        return math.fmod(sos, bos)
+    if isinstance(sos, Fraction):
+        # Likewise for Fractions, whose % works like that on floats.
+        return sos - bos * int(sos / bos)
     return sos % bos
 
 modulus.ensure(before=[6, 2], after=[0])
@@ -152,10 +187,11 @@ modulus.ensure(
 
 
 @Operation('s', menu=main_menu, push=1, log_as="sqrt {0} = {1}",
-           unit_handling=root_unit_handling(2))
+           unit_handling=root_unit_handling(2),
+           any_backend=True)
 def sqrt(bos):
     "Take the square root of bos."
-    return math.sqrt(bos)
+    return decimalmath.sqrt(bos)
 
 sqrt.ensure(before=[25], after=[5])
 sqrt.ensure(before=[0], after=[0])
@@ -177,7 +213,8 @@ sqrt.ensure(
 @Operation('d', menu=main_menu, push=2,
            description='duplicate bos',
            log_as="duplicate {0}",
-           unit_handling=preserve_unit_handling())
+           unit_handling=preserve_unit_handling(),
+           any_backend=True)
 def duplicate(bos):
     """
     Duplicate bos into a new stack entry. Useful if you want to hang onto the
@@ -195,7 +232,8 @@ duplicate.ensure(
 @Operation('x', menu=main_menu, push=2,
            description='exchange bos, sos',
            log_as="{1} <=> {0}",
-           unit_handling=lambda sos, bos: [bos, sos])
+           unit_handling=lambda sos, bos: [bos, sos],
+           any_backend=True)
 def exchange(sos, bos):
     """
     Swap bos and sos. Useful if you enter numbers in the wrong order or when
@@ -211,7 +249,8 @@ exchange.ensure(
 
 
 @Operation('p', menu=main_menu, push=0, description='pop off bos', log_as="pop bos {0}",
-           unit_handling=no_output_unit_handling())
+           unit_handling=no_output_unit_handling(),
+           any_backend=True)
 def pop(_):
     "Remove and discard the bottom item from the stack."
     return None
@@ -226,7 +265,8 @@ pop.ensure(before=[UD(5, unit=U({"m": 1}))], after=[])
 @Operation('r', menu=main_menu, push=-1,
            description='roll up',
            log_as="roll tos {0} to bos",
-           unit_handling=lambda *units: [*units[1:], units[0]])
+           unit_handling=lambda *units: [*units[1:], units[0]],
+           any_backend=True)
 def roll(*stack):
     "Move the top item on the stack to the bottom."
     if len(stack) < 2:
@@ -246,7 +286,8 @@ roll.ensure(
 
 
 @Operation('c', menu=main_menu, push=0, description='clear stack',
-           unit_handling=no_output_unit_handling())
+           unit_handling=no_output_unit_handling(),
+           any_backend=True)
 def clear(*stack):  #pylint: disable=useless-return
     """
     Clear all items from the stack, giving you a clean slate but maintaining
@@ -265,6 +306,271 @@ clear.ensure(
     after=[])
 
 
+order_doc = """
+    Rearrange the items on the stack: sort them, reverse them, or remove
+    duplicates. Units travel with their values.
+"""
+order_menu = Menu('o', 'order stack', main_menu, doc=order_doc)
+
+
+@Operation('a', menu=order_menu, push=-1,
+           description='sort ascending',
+           log_as=lambda args: f"sort {len(args)} items ascending")
+def sort_ascending(*stack_stackitem):
+    """
+    Sort the stack so the smallest value is on top and the largest on the
+    bottom. Equal values stay in the order they were in.
+    """
+    if len(stack_stackitem) < 2:
+        raise InsufficientItemsError(number_required=2)
+    return sorted(stack_stackitem, key=attrgetter('decimal'))
+
+sort_ascending.ensure(before=[3, 1, 2], after=[1, 2, 3])
+sort_ascending.ensure(before=[1], raises=InsufficientItemsError)
+# Units travel with their values, and ties keep their order
+sort_ascending.ensure(
+    before=[UD(2, unit=U({"m": 1})), UD(1, unit=U({"s": 1})), UD(2, unit=U({"kg": 1}))],
+    after=[UD(1, unit=U({"s": 1})), UD(2, unit=U({"m": 1})), UD(2, unit=U({"kg": 1}))])
+
+
+@Operation('d', menu=order_menu, push=-1,
+           description='sort descending',
+           log_as=lambda args: f"sort {len(args)} items descending")
+def sort_descending(*stack_stackitem):
+    """
+    Sort the stack so the largest value is on top and the smallest on the
+    bottom. Equal values stay in the order they were in.
+    """
+    if len(stack_stackitem) < 2:
+        raise InsufficientItemsError(number_required=2)
+    return sorted(stack_stackitem, key=attrgetter('decimal'), reverse=True)
+
+sort_descending.ensure(before=[1, 3, 2], after=[3, 2, 1])
+sort_descending.ensure(
+    before=[UD(2, unit=U({"m": 1})), UD(3), UD(2, unit=U({"kg": 1}))],
+    after=[UD(3), UD(2, unit=U({"m": 1})), UD(2, unit=U({"kg": 1}))])
+
+
+@Operation('u', menu=order_menu, push=-1,
+           description='remove duplicates',
+           log_as=lambda args, retval: (f"remove {len(args) - len(retval)} "
+                                        f"duplicates of {len(args)} items"))
+def unique(*stack_stackitem):
+    """
+    Remove every item that has the same value and unit as an item higher
+    on the stack, keeping the rest in order.
+    """
+    if not stack_stackitem:
+        raise InsufficientItemsError(number_required=1)
+    seen = set()
+    kept = []
+    for item in stack_stackitem:
+        unitless = item.unit is None or item.unit.is_unitless
+        key = (item.decimal, None if unitless else item.unit)
+        if key not in seen:
+            seen.add(key)
+            kept.append(item)
+    return kept
+
+unique.ensure(before=[1, 2, 1, 3, 2], after=[1, 2, 3])
+unique.ensure(before=[Decimal("2.0"), 2], after=[Decimal("2.0")])
+unique.ensure(
+    before=[UD(2, unit=U({"meter": 1})), UD(2), UD(2, unit=U({"meters": 1}))],
+    after=[UD(2, unit=U({"meter": 1})), UD(2)])
+
+
+@Operation('r', menu=order_menu, push=-1,
+           description='reverse',
+           log_as=lambda args: f"reverse {len(args)} items")
+def reverse(*stack_stackitem):
+    "Reverse the order of the items on the stack."
+    if len(stack_stackitem) < 2:
+        raise InsufficientItemsError(number_required=2)
+    return stack_stackitem[::-1]
+
+reverse.ensure(before=[1, 2, 3], after=[3, 2, 1])
+reverse.ensure(
+    before=[UD(1, unit=U({"m": 1})), UD(2)],
+    after=[UD(2), UD(1, unit=U({"m": 1}))])
+
+sequence_doc = """
+    Generate an arithmetic or geometric sequence onto the stack. However
+    long it is, the sequence takes next to no memory until its items are
+    shown or used, and summing it by reducing with + adds up all the items
+    at once without making them.
+"""
+sequence_menu = Menu('g', 'generate sequence', main_menu, doc=sequence_doc)
+
+#: Most items a generated sequence can have.
+MAX_SEQUENCE_LENGTH = 10**9
+
+
+def _sequence_length(count):
+    "Check that /count/ is a sensible number of items and return it as an int."
+    if not 1 <= count <= MAX_SEQUENCE_LENGTH or count != int(count):
+        raise ValueError(f"A sequence needs a whole number of items "
+                         f"from 1 to {MAX_SEQUENCE_LENGTH}.")
+    return int(count)
+
+
+def arithmetic_sequence_units(start, step, count):  # pylint: disable=unused-argument
+    "additive (first term and step must match)"
+    return additive_unit_handling()(start, step)
+
+
+def geometric_sequence_units(start, ratio, count):  # pylint: disable=unused-argument
+    "first term's units (ratio must be unitless)"
+    if not ratio.is_unitless:
+        raise IncommensurableUnitsError(ratio, U())
+    return [start]
+
+
+@Operation('r', menu=sequence_menu, push=-1,
+           description='range from sos to bos',
+           log_as=lambda retval: f"sequence {retval[0]}",
+           unit_handling=additive_unit_handling(),
+           any_backend=True)
+def range_(first, last):
+    """
+    Generate the numbers from sos to bos, counting up (or down) by one:
+    for instance, 1 and 5 generate 1, 2, 3, 4, 5.
+    """
+    step = 1 if last >= first else -1
+    return StackSegment(first, step, _sequence_length(abs(last - first) // 1 + 1))
+
+range_.ensure(before=[1, 5], after=[1, 2, 3, 4, 5])
+range_.ensure(before=[3, 1], after=[3, 2, 1])
+range_.ensure(before=[Decimal("0.5"), 3], after=[0.5, 1.5, 2.5])
+range_.ensure(
+    before=[UD(1, unit=U({"m": 1})), UD(2, unit=U({"m": 1}))],
+    after=[UD(1, unit=U({"m": 1})), UD(2, unit=U({"m": 1}))])
+
+
+@Operation('a', menu=sequence_menu, push=-1,
+           description='arithmetic sequence',
+           log_as=lambda retval: f"sequence {retval[0]}",
+           unit_handling=arithmetic_sequence_units,
+           any_backend=True)
+def arithmetic_sequence(start, step, count):
+    """
+    Generate bos numbers starting at the third item on the stack and
+    going up by sos each time.
+    """
+    return StackSegment(start, step, _sequence_length(count))
+
+arithmetic_sequence.ensure(before=[0, Decimal("0.5"), 4], after=[0, 0.5, 1, 1.5])
+arithmetic_sequence.ensure(before=[10, -3, 3], after=[10, 7, 4])
+arithmetic_sequence.ensure(before=[1, 1, Decimal("2.5")], raises=ValueError)
+arithmetic_sequence.ensure(before=[1, 1, 0], raises=ValueError)
+arithmetic_sequence.ensure(
+    before=[UD(1, unit=U({"m": 1})), UD(1, unit=U({"s": 1})), UD(2)],
+    raises=IncommensurableUnitsError)
+
+
+@Operation('g', menu=sequence_menu, push=-1,
+           description='geometric sequence',
+           log_as=lambda retval: f"sequence {retval[0]}",
+           unit_handling=geometric_sequence_units,
+           any_backend=True)
+def geometric_sequence(start, ratio, count):
+    """
+    Generate bos numbers starting at the third item on the stack and
+    multiplying by sos each time.
+    """
+    segment = StackSegment(start, ratio, _sequence_length(count), geometric=True)
+    # The terms grow (or shrink) steadily, so if the last one fits, all do.
+    last = segment.value(segment.count - 1)
+    if isinstance(last, Decimal) and not last.is_finite() \
+            or isinstance(last, float) and not math.isfinite(last):
+        raise ValueError("The sequence's last term is too large to represent.")
+    return segment
+
+geometric_sequence.ensure(before=[3, 2, 4], after=[3, 6, 12, 24])
+geometric_sequence.ensure(
+    before=[UD(5, unit=U({"m": 1})), UD(10), UD(2)],
+    after=[UD(5, unit=U({"m": 1})), UD(50, unit=U({"m": 1}))])
+
+
+#############
+# PRECISION #
+#############
+
+precision_doc = """
+    Change how many significant digits esc calculates with, switch to
+    fast binary floating point (about 16 digits) for big batches of work,
+    or switch to exact rational arithmetic, where 1 3 / 3 * is exactly 1.
+    The change applies only to this session, and undoing past it changes
+    it back. Results too long to fit in the stack window can be
+    scrolled with the left and right arrow keys.
+"""
+
+
+def precision_mode_display():
+    if get_backend() is DECIMAL:
+        return f"[{get_precision()} digits]"
+    return f"[{get_backend().description}]"
+
+
+precision_menu = Menu('n', 'precision', main_menu, doc=precision_doc,
+                      mode_display=precision_mode_display)
+
+
+def _precision_preset(key, description, digits):
+    "Register an operation setting the precision to /digits/."
+    @Operation(key, menu=precision_menu, push=0,
+               description=f"{description} ({digits} digits)",
+               log_as=f"precision {digits} digits")
+    def preset():
+        set_precision(digits)
+    preset.__doc__ = f"Calculate to {digits} significant digits."
+    return preset
+
+
+_precision_preset('s', 'standard', PRECISION)
+_precision_preset('e', 'extended', 28)
+_precision_preset('h', 'high', 50)
+_precision_preset('v', 'very high', 100)
+_precision_preset('x', 'extreme', 1000)
+
+
+@Operation('n', menu=precision_menu, push=0, description='bos digits',
+           log_as="precision {0} digits",
+           unit_handling=no_output_unit_handling(),
+           any_backend=True)
+def precision_bos(digits):
+    "Calculate to bos significant digits."
+    set_precision(digits)
+
+precision_bos.ensure(before=[30], after=[])
+precision_bos.ensure(before=[Decimal("2.5")], raises=ValueError)
+precision_bos.ensure(before=[0], raises=ValueError)
+
+
+def _backend_choice(key, backend, doc):
+    "Register an operation switching to /backend/."
+    @Operation(key, menu=precision_menu, push=0,
+               description=f"{backend.description} arithmetic",
+               log_as=f"{backend.description} arithmetic")
+    def choose():
+        set_backend(backend.name)
+    choose.__doc__ = doc
+    return choose
+
+
+_backend_choice('d', DECIMAL,
+                "Calculate in decimal, to the precision chosen on this menu.")
+_backend_choice('f', FLOAT,
+                "Calculate in binary floating point, to about 16 significant "
+                "digits, which is considerably faster.")
+_backend_choice('r', RATIONAL,
+                "Calculate exactly, with fractions. Results without an exact "
+                "decimal at the precision chosen on this menu are shown as a "
+                "fraction like 1/3, or rounded to that precision if the "
+                "fraction is too long to show. Square roots, trigonometry and "
+                "fractional powers can't be exact; they're rounded likewise.")
+
+
+
 #############
 # CONSTANTS #
 #############
@@ -274,8 +580,8 @@ constants_menu = Menu(CONSTANT_MENU_CHARACTER,
                       'insert constant',
                       main_menu,
                       doc=log_doc)
-Constant(math.pi, 'p', description='pi', menu=constants_menu)
-Constant(math.e, 'e', description='e', menu=constants_menu)
+Constant(decimalmath.pi, 'p', description='pi', menu=constants_menu)
+Constant(decimalmath.e, 'e', description='e', menu=constants_menu)
 
 
 #################
@@ -0,0 +1,254 @@
+"""
+headless.py - drive the esc interface without a terminal
+
+The classes here stand in for curses' window objects and for the
+:class:`EscScreen <esc.display.EscScreen>` facade, rendering to an in-memory
+character grid and reading keys from a script instead of the keyboard.
+This lets the real main loop run at full speed under pytest or a benchmark
+harness, with no TTY required.
+"""
+
+from collections import deque
+import curses
+
+from . import display
+
+
+class InputExhausted(Exception):
+    """
+    Raised by a headless window's getch() when the scripted input has run
+    out. This is how a scripted session that doesn't end with 'q' stops the
+    main loop.
+    """
+
+
+class VirtualWindow:
+    """
+    In-memory stand-in for a curses window object. Only the subset of the
+    curses window API that esc uses is implemented, with curses' semantics:
+    writing outside the window raises ``curses.error``, and nothing appears
+    on the terminal's grid until :meth:`refresh` is called.
+    """
+    def __init__(self, terminal, height, width, begin_y, begin_x):
+        self.terminal = terminal
+        self.height = height
+        self.width = width
+        self.begin_y = begin_y
+        self.begin_x = begin_x
+        self.cursor_y = 0
+        self.cursor_x = 0
+        self.buffer = self._blank(height, width)
+
+    @staticmethod
+    def _blank(height, width):
+        return [[' '] * width for _ in range(height)]
+
+    def _put(self, text):
+        "Write /text/ at the cursor, wrapping at the right edge like curses."
+        for char in text:
+            if char == '\n':
+                self.cursor_y += 1
+                self.cursor_x = 0
+            else:
+                if self.cursor_y >= self.height:
+                    raise curses.error("addstr() returned ERR")
+                self.buffer[self.cursor_y][self.cursor_x] = char
+                self.cursor_x += 1
+                if self.cursor_x >= self.width:
+                    self.cursor_x = 0
+                    self.cursor_y += 1
+        if self.cursor_y >= self.height:
+            # curses writes the final character but reports failure when the
+            # cursor can't be advanced past the bottom-right corner.
+            self.cursor_y = self.height - 1
+            self.cursor_x = self.width - 1
+            raise curses.error("addstr() returned ERR")
+
+    def addstr(self, *args):
+        "addstr([y, x,] str[, attr])"
+        if len(args) >= 3:
+            y, x, text = args[:3]
+            self.move(y, x)
+        else:
+            text = args[0]
+        self._put(text)
+
+    def move(self, y, x):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("wmove() returned ERR")
+        self.cursor_y = y
+        self.cursor_x = x
+
+    def clear(self):
+        self.erase()
+
+    def erase(self):
+        self.buffer = self._blank(self.height, self.width)
+        self.cursor_y = self.cursor_x = 0
+
+    def border(self):
+        if self.height < 2 or self.width < 2:
+            return
+        horizontal = '+' + '-' * (self.width - 2) + '+'
+        self.buffer[0] = list(horizontal)
+        self.buffer[-1] = list(horizontal)
+        for row in self.buffer[1:-1]:
+            row[0] = row[-1] = '|'
+
+    def refresh(self):
+        "Copy this window's contents onto the terminal grid."
+        self.terminal.blit(self)
+
+    def getch(self):
+        return self.terminal.next_key()
+
+    def timeout(self, delay):
+        "Nonnegative delays make getch() return -1 instead of running out."
+        self.terminal.blocking = delay < 0
+
+    def keypad(self, flag):
+        pass
+
+    def touchwin(self):
+        pass
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getbegyx(self):
+        return self.begin_y, self.begin_x
+
+    def getyx(self):
+        return self.cursor_y, self.cursor_x
+
+    def mvwin(self, new_y, new_x):
+        self.begin_y = new_y
+        self.begin_x = new_x
+
+    def resize(self, height, width):
+        "Change the window's size, keeping whatever content still fits."
+        new_buffer = self._blank(height, width)
+        for y, row in enumerate(self.buffer[:height]):
+            new_buffer[y][:min(width, self.width)] = row[:width]
+        self.buffer = new_buffer
+        self.height = height
+        self.width = width
+        self.cursor_y = min(self.cursor_y, height - 1)
+        self.cursor_x = min(self.cursor_x, width - 1)
+
+
+class HeadlessTerminal(VirtualWindow):
+    """
+    The virtual terminal: a :class:`VirtualWindow` covering the whole screen
+    (so it can be passed wherever curses' ``stdscr`` is expected)
+    that also owns the visible character grid and the scripted input.
+
+    :param height: Number of rows in the terminal.
+    :param width: Number of columns in the terminal.
+    :param keys: Initial scripted input; see :meth:`feed`.
+    """
+    def __init__(self, height=24, width=80, keys=()):
+        self.grid = self._blank(height, width)
+        self.input = deque()
+        #: If False, getch() returns -1 when no input is queued, as curses
+        #: does with a timeout set.
+        self.blocking = True
+        #: Number of window refreshes performed, a rough measure of redraw work.
+        self.refresh_count = 0
+        super().__init__(self, height, width, 0, 0)
+        self.feed(*keys)
+
+    def feed(self, *keys):
+        """
+        Queue keys to be returned by getch(). Each argument may be a string,
+        whose characters are queued in order, or an int, for special keys
+        like ``curses.KEY_F1``.
+        """
+        for key in keys:
+            if isinstance(key, str):
+                self.input.extend(ord(c) for c in key)
+            else:
+                self.input.append(key)
+
+    def next_key(self):
+        try:
+            return self.input.popleft()
+        except IndexError:
+            if not self.blocking:
+                return -1
+            raise InputExhausted() from None
+
+    def simulate_resize(self, height, width):
+        "Change the terminal size and queue the resulting KEY_RESIZE event."
+        self.grid = self._blank(height, width)
+        self.resize(height, width)
+        self.input.append(curses.KEY_RESIZE)
+
+    def blit(self, window):
+        "Copy the visible part of /window/ onto the grid."
+        self.refresh_count += 1
+        for y, row in enumerate(window.buffer, window.begin_y):
+            if not 0 <= y < len(self.grid):
+                continue
+            grid_row = self.grid[y]
+            for x, char in enumerate(row, window.begin_x):
+                if 0 <= x < len(grid_row):
+                    grid_row[x] = char
+
+    def row(self, y):
+        "Return the text currently displayed on row /y/."
+        return ''.join(self.grid[y])
+
+    def text(self):
+        "Return the whole screen as a string, one line per row."
+        return '\n'.join(''.join(row) for row in self.grid)
+
+
+class HeadlessScreen(display.EscScreen):
+    """
+    :class:`EscScreen <esc.display.EscScreen>` rendering onto a
+    :class:`HeadlessTerminal` rather than curses.
+    """
+    def __init__(self, stdscr):
+        #: The :class:`HeadlessTerminal` we are rendering onto.
+        self.terminal = stdscr
+        super().__init__(stdscr)
+
+    @staticmethod
+    def _init_colors():
+        pass
+
+    def new_window(self, height, width, start_y, start_x):
+        return VirtualWindow(self.terminal, height, width, start_y, start_x)
+
+    @staticmethod
+    def color_pair(number):
+        # Mirror curses' encoding so attributes stay distinct ints.
+        return number << 8
+
+    def ungetch(self, c):
+        self.terminal.input.appendleft(c)
+
+
+def init(height=24, width=80, keys=()):
+    """
+    Install a :class:`HeadlessScreen` as the ``display.screen()`` singleton
+    and return it. Its terminal is available as the ``terminal`` attribute.
+    """
+    return display.init(HeadlessTerminal(height, width, keys),
+                        screen_class=HeadlessScreen)
+
+
+def run(keys, ss, registry, stacks=None):
+    """
+    Feed /keys/ to the installed headless screen and run the main loop
+    against /ss/ and /registry/ until the input runs out or the user quits.
+    Pass the same /stacks/ (:class:`esc.workspaces.Workspaces`) to successive
+    runs to keep named stacks around between them.
+    """
+    from .__main__ import user_loop  # pylint: disable=import-outside-toplevel
+    display.screen().terminal.feed(*keys)
+    try:
+        user_loop(ss, registry, stacks)
+    except (InputExhausted, SystemExit):
+        pass
@@ -0,0 +1,176 @@
+"""
+helpindex.py - find commands by what they do
+
+The :class:`HelpIndex` lists every command esc knows about -- the built-ins
+and everything reachable from the main menu -- along with the keys you'd
+press to reach it, and keeps an inverted index from each word of each
+command's key, description and documentation to the commands using it. The
+help system uses it both to look up built-ins by key and to search.
+
+The index is built the first time it's needed and reused until a menu
+anywhere in the tree gains or loses a child (normally that only happens
+while plugins load at startup).
+"""
+
+from bisect import bisect_left
+import curses.ascii
+from dataclasses import dataclass
+import inspect
+import re
+import textwrap
+from typing import Tuple
+
+from . import builtin_stubs
+from .commands import EscBuiltin, EscCommand, EscMenu, main_menu
+
+#: How much a query word matching each part of a command counts for.
+KEY_WEIGHT = 8
+DESCRIPTION_WEIGHT = 4
+DOC_WEIGHT = 1
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def words(text):
+    """
+    Split /text/ into the lowercase words the index is made of.
+
+    >>> words("Take the square root of bos.")
+    ['take', 'the', 'square', 'root', 'of', 'bos']
+    """
+    return _WORD_RE.findall(text.lower())
+
+
+@dataclass(frozen=True)
+class HelpEntry:
+    "One command in the index."
+    #: Keys to press from the main menu to reach the command, in order.
+    keys: Tuple[str, ...]
+    #: The :class:`EscCommand <esc.commands.EscCommand>` itself.
+    command: EscCommand
+    #: The menu the command is chosen from.
+    menu: EscMenu
+
+    @property
+    def key_path(self):
+        "The keys to reach the command, separated by spaces."
+        return ' '.join(curses.ascii.unctrl(i) for i in self.keys)
+
+    @property
+    def description(self):
+        "The command's description, or its key for anonymous operations."
+        return self.command.description or self.command.key
+
+    @property
+    def doc(self):
+        return textwrap.dedent(self.command.__doc__ or "").strip()
+
+
+def _tree_generation(menu=main_menu):
+    "Sum of the generations of /menu/ and all its submenus."
+    return menu.generation + sum(_tree_generation(i)
+                                 for i in menu.children.values() if i.is_menu)
+
+
+class HelpIndex:
+    """
+    Every command reachable from /root/, plus the built-ins, with an
+    inverted word index over their keys, descriptions and documentation.
+    """
+    def __init__(self, root=main_menu):
+        #: All entries, built-ins first, then in menu order.
+        self.entries = []
+        #: Built-in command instances, by key.
+        self.builtins = {}
+        #: Word -> {entry number: weight}.
+        self._postings = {}
+
+        for _, obj in inspect.getmembers(builtin_stubs, inspect.isclass):
+            if issubclass(obj, EscBuiltin) and obj is not EscBuiltin:
+                builtin = obj()
+                self.builtins[builtin.key] = builtin
+                self._add(HelpEntry((builtin.key,), builtin, root))
+        self._add_menu(root, ())
+        #: Every indexed word, sorted, for prefix lookups.
+        self._vocabulary = sorted(self._postings)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _add_menu(self, menu, keys):
+        for child in menu.children.values():
+            child_keys = keys + (child.key,)
+            self._add(HelpEntry(child_keys, child, menu))
+            if child.is_menu:
+                self._add_menu(child, child_keys)
+
+    def _add(self, entry):
+        number = len(self.entries)
+        self.entries.append(entry)
+        for weight, text in ((DOC_WEIGHT, entry.doc),
+                             (DESCRIPTION_WEIGHT, entry.command.description or ""),
+                             (KEY_WEIGHT, entry.command.key)):
+            for word in words(text):
+                postings = self._postings.setdefault(word, {})
+                postings[number] = max(weight, postings.get(number, 0))
+
+    def _matching_words(self, prefix):
+        "Yield each indexed word starting with /prefix/."
+        vocabulary = self._vocabulary
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            if not vocabulary[i].startswith(prefix):
+                return
+            yield vocabulary[i]
+
+    def prefix_matches(self, prefix):
+        """
+        Return the set of numbers of the entries with an indexed word
+        starting with /prefix/.
+        """
+        numbers = set()
+        for word in self._matching_words(prefix):
+            numbers.update(self._postings[word])
+        return numbers
+
+    def search(self, query):
+        """
+        Return the entries matching every word in /query/, best first.
+        Each query word matches indexed words it is a prefix of, so results
+        can be shown as the user types; whole-word matches score double.
+        A query with no words in it (say, "+") matches commands by key.
+        """
+        terms = words(query)
+        if not terms:
+            query = query.strip()
+            return [i for i in self.entries if query and i.command.key == query]
+
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for word in self._matching_words(term):
+                bonus = 2 if word == term else 1
+                for number, weight in self._postings[word].items():
+                    term_scores[number] = max(weight * bonus,
+                                              term_scores.get(number, 0))
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {number: score + term_scores[number]
+                          for number, score in scores.items()
+                          if number in term_scores}
+
+        ranked = sorted(scores, key=lambda n: (-scores[n],
+                                               len(self.entries[n].keys), n))
+        return [self.entries[n] for n in ranked]
+
+
+_INDEX = None  # pylint: disable=invalid-name
+
+
+def help_index():
+    "Return the index of all commands, building it if the menus have changed."
+    global _INDEX  # pylint: disable=global-statement
+    generation = _tree_generation()
+    if _INDEX is None or _INDEX[0] != generation:
+        _INDEX = (generation, HelpIndex())
+    return _INDEX[1]
@@ -3,17 +3,99 @@ helpme.py - online help functions for esc
 """
 
 import curses
-import inspect
-
-from . import builtin_stubs
+import decimal
+import threading
+import time
+
+from . import backends
+from . import history
+from . import palette
+from .consts import HELP_SEARCH_CHARACTER
 from .display import screen, fetch_input
+from .helpindex import help_index
 from .oops import NotInMenuError
-from .status import status
+from .stack import StackState
+from .status import detached, status
+
+#: Seconds a help simulation may run before esc gives up on it.
+SIMULATION_TIME_LIMIT = 3.0
+
+#: How often, in milliseconds, the help window checks on a simulation.
+SIMULATION_POLL_MS = 50
 
 
-def _fetch_input_handling_resize(redraw):
-    """Fetch input from the status bar, handling terminal resizes."""
+class HelpSimulation:
+    """
+    The simulated result shown on the help page for /esc_command/.
+
+    If the result isn't already known, the command is simulated on a worker
+    thread against a snapshot of the stack, so the help page can be drawn
+    straight away and the result filled in when it's ready. A simulation that
+    runs past :data:`SIMULATION_TIME_LIMIT` is abandoned: its thread is left
+    to finish on its own, and anything it returns is ignored (though it's
+    still remembered for the next time help is requested).
+    """
+    def __init__(self, esc_command, ss, registry):
+        self._results_info = esc_command.remembered_simulated_result(ss, registry)
+        self._finished = threading.Event()
+        self._deadline = time.monotonic() + SIMULATION_TIME_LIMIT
+        if self._results_info is not None:
+            self._finished.set()
+            return
+
+        snapshot = StackState()
+        snapshot.restore(ss.memento())
+        context = decimal.getcontext().copy()
+        backend = backends.get_backend().name
+
+        def simulate():
+            decimal.setcontext(context)
+            backends.set_backend(backend)
+            # The user carries on meanwhile, so keep out of their undo
+            # history and status bar.
+            with history.private(), detached():
+                try:
+                    self._results_info = esc_command.simulated_result(
+                        snapshot, registry)
+                except Exception:  # pylint: disable=broad-except
+                    self._results_info = ("An error would occur.",)
+            self._finished.set()
+
+        threading.Thread(target=simulate, daemon=True,
+                         name=f"simulate {esc_command.key}").start()
+
+    @property
+    def settled(self):
+        "True if the simulation has finished or been abandoned."
+        return self._finished.is_set() or time.monotonic() >= self._deadline
+
+    @property
+    def results_info(self):
+        "The lines to show in the help window right now."
+        if self._finished.is_set():
+            return self._results_info
+        if time.monotonic() >= self._deadline:
+            return ("The simulation took too long and was abandoned.",)
+        return ("Simulating...",)
+
+    def wait(self, seconds):
+        "Wait up to /seconds/ for the simulation to finish."
+        self._finished.wait(seconds)
+
+
+def _fetch_input_handling_resize(redraw, simulation=None):
+    """
+    Fetch input from the status bar, handling terminal resizes. While
+    /simulation/ is still running, keep checking on it and redraw once
+    it settles.
+    """
     while True:
+        if simulation is not None and not simulation.settled:
+            simulation.wait(SIMULATION_POLL_MS / 1000)
+            if simulation.settled:
+                redraw()
+            elif not screen().input_pending(0):
+                continue
         c = fetch_input(True)
         if c == curses.KEY_RESIZE:
             screen().handle_resize()
@@ -23,7 +105,7 @@ def _fetch_input_handling_resize(redraw):
         return c
 
 
-def _show_help(esc_command, ss, registry):
+def _show_help(esc_command, ss, results_info):
     """Render the help display for the given command."""
     screen().refresh_stack(ss)
     status.advisory(status_message(esc_command))
@@ -32,7 +114,7 @@ def _show_help(esc_command, ss, registry):
                               esc_command.help_title,
                               esc_command.signature_info,
                               esc_command.__doc__,
-                              esc_command.simulated_result(ss, registry))
+                              results_info)
 
 
 def builtin_help(operation_key, menu):
@@ -53,15 +135,21 @@ def builtin_help(operation_key, menu):
     ('The last change made to your stack (if any)', 'would be undone.')
     """
     if menu.is_main_menu:
-        matching_builtin = [obj for name, obj in inspect.getmembers(builtin_stubs)
-                            if inspect.isclass(obj)
-                            and name != 'EscBuiltin'
-                            and obj.key == operation_key]
-        if matching_builtin:
-            return matching_builtin[0]()
+        return help_index().builtins.get(operation_key)
     return None
 
 
+def search_help(menu=None):
+    """
+    Prompt for a search of the help (see :func:`esc.palette.pick`).
+    Return the chosen :class:`HelpEntry <esc.helpindex.HelpEntry>`,
+    or None if the search was cancelled.
+    """
+    return palette.pick("Search Help", help_index().search, status.searching_help,
+                        "Type words from a command's name or description.",
+                        menu)
+
+
 def status_message(command):
     """
     Determine the status message to use to describe the command we're looking
@@ -80,6 +168,13 @@ def get_help(operation_key, menu, ss, registry, recursing=False):
     """
     Display the on-line help page for the provided operation.
     """
+    if (operation_key == HELP_SEARCH_CHARACTER and not recursing
+            and operation_key not in menu.children):
+        entry = search_help(menu)
+        if entry is not None:
+            get_help(entry.command.key, entry.menu, ss, registry)
+        return
+
     esc_command = builtin_help(operation_key, menu)
     if not esc_command:
         try:
@@ -91,22 +186,21 @@ def get_help(operation_key, menu, ss, registry, recursing=False):
             # that doesn't exist.
             return
 
-    _show_help(esc_command, ss, registry)
+    simulation = HelpSimulation(esc_command, ss, registry)
+    def redraw():
+        _show_help(esc_command, ss, simulation.results_info)
+        if esc_command.is_menu:
+            screen().display_menu(esc_command)
+    _show_help(esc_command, ss, simulation.results_info)
 
     # If this is a menu, we can select items on the menu to dive into.
     if esc_command.is_menu:
         menu.execute(operation_key, ss, registry)
         screen().display_menu(esc_command)
-
-        def redraw():
-            _show_help(esc_command, ss, registry)
-            screen().display_menu(esc_command)
-
         c = _fetch_input_handling_resize(redraw)
         get_help(chr(c), esc_command, ss, registry, recursing=True)
     else:
-        c = _fetch_input_handling_resize(
-            lambda: _show_help(esc_command, ss, registry))
+        _fetch_input_handling_resize(redraw, simulation)
 
     if not recursing:
         screen().helpw = None
@@ -2,6 +2,10 @@
 history.py - manage a history of calculations
 """
 
+from contextlib import contextmanager
+import contextvars
+
+
 class HistoricalStack:
     """
     Manages a history of checkpoints of the stack over time
@@ -10,6 +14,7 @@ class HistoricalStack:
     def __init__(self):
         self.undo_stack = []
         self.redo_stack = []
+        self._batched = False
 
     def clear(self):
         """
@@ -23,12 +28,28 @@ class HistoricalStack:
     def checkpoint_stack(self, ss):
         """
         Create and store a checkpoint for the given StackState.
+        Within :meth:`batch`, this does nothing.
         """
+        if self._batched:
+            return
         if self.redo_stack:
             self.redo_stack = []
         if (not self.undo_stack) or self.undo_stack[-1] != ss.memento():
             self.undo_stack.append(ss.memento())
 
+    @contextmanager
+    def batch(self, ss):
+        """
+        Checkpoint /ss/, then ignore any further checkpoints until the end of
+        the block, so everything done within it is undone in one step.
+        """
+        self.checkpoint_stack(ss)
+        self._batched = True
+        try:
+            yield
+        finally:
+            self._batched = False
+
     def undo(self, ss):
         """
         Mutate the provided StackState to bring it back to the preceding
@@ -63,3 +84,28 @@ class HistoricalStack:
 # Make a single HistoricalStack available as a module global.
 # pylint: disable=invalid-name
 hs = HistoricalStack()
+
+_current = contextvars.ContextVar('esc_history', default=hs)
+
+
+def current():
+    """
+    The HistoricalStack that stack changes are checkpointed to: :data:`hs`,
+    except within :func:`private`.
+    """
+    return _current.get()
+
+
+@contextmanager
+def private():
+    """
+    Context manager checkpointing stack changes made within it, in the
+    current context only, to a new HistoricalStack of their own rather than
+    :data:`hs` -- so, for instance, a help simulation running on another
+    thread doesn't disturb the user's undo history.
+    """
+    token = _current.set(HistoricalStack())
+    try:
+        yield
+    finally:
+        _current.reset(token)
@@ -6,6 +6,7 @@ dependency, making it easy to unit-test.
 """
 
 from dataclasses import dataclass
+from functools import lru_cache
 
 from .consts import STACKWIDTH
 
@@ -18,7 +19,7 @@ STACK_COL_WIDTH = STACKWIDTH + 3  # 24 — border + padding around STACKWIDTH
 COMMANDS_COL_WIDTH = 24
 
 
-@dataclass
+@dataclass(frozen=True)
 class WindowSpec:  # pylint: disable=invalid-name
     "Position and size for a single curses window."
     x: int
@@ -27,7 +28,7 @@ class WindowSpec:  # pylint: disable=invalid-name
     height: int
 
 
-@dataclass
+@dataclass(frozen=True)
 class LayoutSpec:
     "Computed layout for every window in the esc interface."
     status: WindowSpec
@@ -40,6 +41,7 @@ class LayoutSpec:
 UNIT_STACK_COL_WIDTH = STACK_COL_WIDTH + 15  # 39 — wider for unit display
 
 
+@lru_cache(maxsize=64)
 def compute_layout(term_height: int, term_width: int,
                    units_active: bool = False) -> LayoutSpec:
     """
@@ -58,6 +60,10 @@ def compute_layout(term_height: int, term_width: int,
     * **Registers** — preferred 5 rows (3 content + 2 border), compressed
       or hidden when the terminal is short.
 
+    Results are memoized per terminal size, since a drag-resize revisits the
+    same handful of sizes many times; the specs are frozen so callers can't
+    alter a shared result.
+
     >>> layout = compute_layout(24, 80)
     >>> layout.status
     WindowSpec(x=0, y=0, width=80, height=1)
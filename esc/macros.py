@@ -0,0 +1,183 @@
+"""
+macros.py - record keystrokes and replay them as a single operation
+
+While a macro is being recorded, the keys the user types in the main loop
+are kept as well as acted on. When recording stops they're resolved, once,
+into the numbers they enter and the :class:`EscOperation
+<esc.commands.EscOperation>`\\ s they choose from the menus. Replaying the
+macro then runs those steps directly -- as many times as you like, or once
+for each item on the stack -- as one transaction with one undo checkpoint
+and one line of history.
+"""
+
+import curses
+
+from . import history
+from .commands import main_menu
+from .consts import QUIT_CHARACTER
+from .oops import FunctionExecutionError, MacroError, NotInMenuError
+from .stack import StackItem, StackState
+from . import util
+
+
+class Macro:
+    """
+    A recorded sequence of number entries and operations.
+
+    :param keys: The key codes typed while recording.
+    :raises MacroError: if the keys do anything other than enter numbers
+        and choose operations from the menus.
+    """
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        #: Entered StackItems to push and EscOperations to execute, in order.
+        self.steps = self._compile(self.keys)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"<Macro: {self.summary}>"
+
+    @staticmethod
+    def _compile(keys):
+        "Resolve /keys/ into a list of steps."
+        steps = []
+        number = None
+        menu = main_menu
+
+        def finish_number():
+            nonlocal number
+            if number is not None:
+                if not number.finish_entry():
+                    raise MacroError(
+                        f"The macro enters '{number.string}', which isn't a number.")
+                steps.append(number)
+                number = None
+
+        for key in keys:
+            if key in (curses.KEY_LEFT, curses.KEY_RIGHT):
+                continue  # only scrolls the stack window
+            if key in (curses.KEY_BACKSPACE, 127):
+                if number is not None:
+                    number.backspace()
+                    if not number.string:
+                        number = None
+                continue
+
+            char = chr(key) if 0 <= key < 256 else None
+            if char is not None and menu.is_main_menu and util.is_number(char):
+                char = '-' if char == '_' else char
+                if number is None:
+                    number = StackItem(firstchar=char)
+                else:
+                    number.add_character(char)
+                continue
+
+            finish_number()
+            if char is not None and menu.is_main_menu and char in (' ', '\n'):
+                continue
+            if char == QUIT_CHARACTER and not menu.is_main_menu:
+                menu = menu.parent
+                continue
+            try:
+                child = menu.child(char) if char is not None else None
+            except NotInMenuError:
+                child = None
+            if child is None:
+                raise MacroError("Macros can only enter numbers and run "
+                                 "operations from the menus.")
+            if child.is_menu:
+                menu = child
+            else:
+                steps.append(child)
+                menu = main_menu
+
+        finish_number()
+        if not steps:
+            raise MacroError("Nothing was recorded.")
+        return steps
+
+    @property
+    def summary(self):
+        "The steps in brief, e.g. '2, *, 1, +'."
+        return ', '.join(i.string if isinstance(i, StackItem)
+                         else i.description or i.key
+                         for i in self.steps)
+
+    def _run(self, ss, registry):
+        for step in self.steps:
+            if isinstance(step, StackItem):
+                ss.push((step,))
+            else:
+                step.execute(None, ss, registry)
+
+    def replay(self, ss, registry, times=1):
+        """
+        Run the macro on /ss/ /times/ times in a row.
+
+        :raises esc.oops.FunctionExecutionError: if any step fails, in which
+            case the stack is left as it was.
+        """
+        with ss.transaction(), history.current().batch(ss):
+            ss.enter_number()
+            history_length = len(ss.operation_history)
+            for _ in range(times):
+                self._run(ss, registry)
+            del ss.operation_history[history_length:]
+            ss.record_operation(f"Macro [{self.summary}] x {times}")
+
+    def replay_over_items(self, ss, registry):
+        """
+        Run the macro once for each item on /ss/, as if that item were alone
+        on the stack, replacing the items with the results.
+
+        :raises esc.oops.FunctionExecutionError: if any step fails, in which
+            case the stack is left as it was.
+        """
+        with ss.transaction(), history.current().batch(ss):
+            ss.enter_number()
+            if ss.is_empty:
+                raise FunctionExecutionError("There are no items to run the macro on.")
+            items = ss.pop(len(ss.s))
+            results = []
+            for item in items:
+                scratch = StackState()
+                scratch.push((item,))
+                self._run(scratch, registry)
+                results.extend(scratch.s)
+            ss.push(results, f"Macro [{self.summary}] on {len(items)} items")
+
+
+class MacroRecorder:
+    "Keeps the keys typed while recording, and the last macro recorded."
+    def __init__(self):
+        self.recording = False
+        #: The last macro recorded, or None if there hasn't been one.
+        self.macro = None
+        self._keys = []
+
+    def start(self):
+        self.recording = True
+        self._keys = []
+
+    def record(self, key):
+        "Remember /key/ if we're recording."
+        if self.recording:
+            self._keys.append(key)
+
+    def stop(self):
+        """
+        Stop recording and make the keys recorded, less the last one (which
+        stopped the recording), into the current macro.
+
+        :raises MacroError: if the keys can't be made into a macro; the
+            previous macro is kept.
+        """
+        self.recording = False
+        self.macro = Macro(self._keys[:-1])
+        return self.macro
+
+
+# pylint: disable=invalid-name
+recorder = MacroRecorder()
@@ -0,0 +1,199 @@
+"""
+mapreduce.py - run an operation over many items of the stack at once
+
+Mapping runs a one-item operation on each item separately; reducing folds a
+two-item operation over the items from the top down, and scanning does the
+same but keeps every running result. Either way the whole pass is a single
+change to the stack with one line of history, and the units of the results
+are worked out as few times as the operation's unit handler allows.
+
+These work on the :class:`EscOperation <esc.commands.EscOperation>` from the
+outside, using the same pieces it uses to run itself once.
+"""
+
+# These are the operation's own steps for running itself, shared here.
+# pylint: disable=protected-access
+
+from .oops import FunctionExecutionError, UnitError
+from .stack import StackItem
+
+
+def map_over(operation, ss, registry, count=None, unit_override=False):
+    """
+    Run /operation/ separately on each item on the stack, or on only the
+    last /count/ items, replacing each item with its result.
+
+    The whole pass is a single change to the stack, with one line of
+    history. The units of the results are worked out once for each
+    distinct unit among the items (unless the unit handler needs
+    to see the values too).
+
+    :raises esc.oops.FunctionExecutionError: or a subclass, if the
+        operation doesn't take one item and return one, or fails on any
+        item; the stack is then left as it was.
+    """
+    if operation.pop != 1 or operation.push != 1:
+        raise FunctionExecutionError(
+            f"Only operations that take one item and return one "
+            f"can be mapped, and '{operation.key}' doesn't.")
+
+    with ss.transaction():
+        items = _take_items(operation, ss, count, 1)
+        count = len(items)
+        units = {}
+        results = []
+        for item in items:
+            unit_key = ((item.unit, item.decimal)
+                        if operation._units_read_values else item.unit)
+            try:
+                unit = units[unit_key]
+            except KeyError:
+                unit = operation._compute_result_units(
+                    [item], 1, override=unit_override)[0]
+                units[unit_key] = unit
+            retvals = operation._call_function([item], registry)
+            if not hasattr(retvals, '__iter__'):
+                retvals = (retvals,)
+            value, = operation._decimalize_results(retvals)
+            results.append(StackItem(decval=value, unit=unit))
+
+        items_word = "item" if count == 1 else "items"
+        ss.push(results, f"{operation.description or operation.key} mapped "
+                         f"over {count} {items_word}")
+
+
+def reduce_over(operation, ss, registry, count=None, scan=False,
+                unit_override=False):
+    """
+    Fold /operation/ over the stack (or over only the last /count/ items)
+    from the top down: run it on the first two items, then on that result
+    and the third item, and so on, replacing the items with the final
+    result -- or, if /scan/ is true, with every running result.
+
+    The whole pass is a single change to the stack, with one line of
+    history. If the unit handler can fold units (see
+    :class:`UnitHandler <esc.units.UnitHandler>`), the units of the results
+    are worked out in one pass before any values are; otherwise they're
+    worked out a step at a time, once per distinct pair of units where
+    the handler doesn't need to see the values.
+
+    :raises esc.oops.FunctionExecutionError: or a subclass, if the
+        operation doesn't take two items and return one, or any step
+        fails; the stack is then left as it was.
+    """
+    # pylint: disable=too-many-arguments
+    if operation.pop != 2 or operation.push != 1:
+        raise FunctionExecutionError(
+            f"Only operations that take two items and return one "
+            f"can be {'scanned' if scan else 'reduced'}, "
+            f"and '{operation.key}' doesn't.")
+
+    with ss.transaction():
+        if operation.fold_segment is not None and not scan:
+            segment = _take_segment(operation, ss, count)
+            if segment is not None:
+                _reduce_segment(operation, ss, segment, unit_override)
+                return
+        items = _take_items(operation, ss, count, 2)
+        folded_units = _fold_result_units(operation, items, scan,
+                                          unit_override)
+        pair_units = {}
+
+        accumulator = items[0]
+        results = [accumulator]
+        for step, item in enumerate(items[1:]):
+            if folded_units is None:
+                pair_key = (accumulator.unit, item.unit)
+                if operation._units_read_values or pair_key not in pair_units:
+                    pair_units[pair_key] = operation._compute_result_units(
+                        [accumulator, item], 1, override=unit_override)[0]
+                unit = pair_units[pair_key]
+            elif scan:
+                unit = folded_units[step]
+            else:
+                unit = folded_units[0]
+            retvals = operation._call_function([accumulator, item], registry)
+            if not hasattr(retvals, '__iter__'):
+                retvals = (retvals,)
+            value, = operation._decimalize_results(retvals)
+            accumulator = StackItem(decval=value, unit=unit)
+            if scan:
+                results.append(accumulator)
+
+        name = operation.description or operation.key
+        if scan:
+            ss.push(results, f"{name} scanned over {len(items)} items")
+        else:
+            ss.push([accumulator], f"{name} reduced over {len(items)} items "
+                                   f"= {accumulator}")
+
+
+def _take_items(operation, ss, count, minimum):
+    """
+    Enter the number being typed, if any, and pop the last /count/ items
+    (or the whole stack, if /count/ is None) to run /operation/ over,
+    throwing an exception if there are fewer than /minimum/.
+    """
+    try:
+        ss.enter_number(running_op=operation.key)
+    except ValueError as e:
+        raise FunctionExecutionError(str(e))
+    if count is None:
+        count = len(ss.s)
+    items = ss.pop(count) if count >= minimum else None
+    if not items:
+        raise operation._insufficient_items_on_stack(max(count, minimum))
+    return items
+
+
+def _fold_result_units(operation, items, running, override):
+    """
+    Return the units of the results of folding /operation/ over /items/ --
+    every running result if /running/, else just the last -- using the unit
+    handler's ``fold`` method. Return None if the handler doesn't have one,
+    so the units have to be worked out pairwise.
+    """
+    steps = len(items) - 1 if running else 1
+    if all(i.unit is None or i.unit.is_unitless for i in items):
+        return [None] * steps
+    fold = getattr(operation.unit_handling, 'fold', None)
+    if fold is None:
+        return None
+    try:
+        units = fold(items, running=running, override=override)
+    except UnitError:
+        if override:
+            return [None] * steps
+        raise
+    return [(u if u is not None and not u.is_unitless else None)
+            for u in units]
+
+
+def _take_segment(operation, ss, count):
+    """
+    If the last /count/ items (or the whole stack, if /count/ is None)
+    are all part of one :class:`StackSegment <esc.stack.StackSegment>`
+    of at least two items, pop and return it; otherwise return None.
+    """
+    try:
+        ss.enter_number(running_op=operation.key)
+    except ValueError as e:
+        raise FunctionExecutionError(str(e))
+    if count is None:
+        count = len(ss.s)
+    return ss.pop_segment(count) if count >= 2 else None
+
+
+def _reduce_segment(operation, ss, segment, unit_override):
+    "Reduce over /segment/ using fold_segment, without making its items."
+    with operation._arithmetic_errors():
+        value, = operation._decimalize_results(
+            (operation.fold_segment(segment),))
+    if segment.unit is None:
+        unit = None
+    else:
+        unit, = operation._compute_result_units(
+            [segment[0], segment[-1]], 1, override=unit_override)
+    result = StackItem(decval=value, unit=unit)
+    ss.push([result], f"{operation.description or operation.key} reduced "
+                      f"over {len(segment)} items = {result}")
@@ -0,0 +1,97 @@
+"""
+memo.py - remember the results of pure operations
+
+An operation registered with ``pure=True`` promises that its results depend
+only on its inputs, so esc can reuse the results of earlier calls with the
+same inputs rather than running it again -- both when the user repeats a
+calculation and when the help system simulates it. A result is reused only
+if everything else that could affect it is also unchanged: the decimal
+context's precision and rounding, the number backend, and the value of
+every mode.
+"""
+
+from collections import Counter, OrderedDict
+import decimal
+import threading
+
+from . import backends
+from . import modes
+
+#: Most results kept before the least recently used are forgotten.
+RESULT_CACHE_SIZE = 256
+
+
+class ResultCache:
+    """
+    A bounded, least-recently-used map from an operation and its inputs to
+    the values its function returned. Hits and misses are counted per
+    operation so you can see whether caching an operation is paying off.
+
+    Help simulations run on worker threads, so lookups and updates are
+    serialized with a lock (the operation itself runs outside it).
+    """
+    def __init__(self, maxsize=RESULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        #: Cache hits, by operation.
+        self.hits = Counter()
+        #: Cache misses, by operation.
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    @staticmethod
+    def key(operation, args):
+        """
+        Return the cache key for running /operation/ on the StackItems /args/.
+        Decimals are keyed by their exact representation, so that 2.0 and 2
+        (which are equal, but display differently) don't share a result.
+        """
+        context = decimal.getcontext()
+        return (operation,
+                tuple((backends.cache_key(i.decimal), i.unit) for i in args),
+                context.prec,
+                context.rounding,
+                backends.get_backend(),
+                modes.snapshot())
+
+    def call(self, operation, args, registry):
+        """
+        Return the result of calling /operation/'s function on /args/,
+        reusing a remembered result if there is one.
+        Exceptions aren't remembered.
+        """
+        key = self.key(operation, args)
+        with self._lock:
+            try:
+                result = self._results[key]
+            except KeyError:
+                self.misses[operation] += 1
+            else:
+                self.hits[operation] += 1
+                self._results.move_to_end(key)
+                return result
+
+        result = operation.function(args, registry)
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def stats(self, operation):
+        "Return the (hits, misses) counted for /operation/."
+        return self.hits[operation], self.misses[operation]
+
+    def clear(self):
+        "Forget all results and reset the counters."
+        with self._lock:
+            self._results.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+
+# pylint: disable=invalid-name
+result_cache = ResultCache()
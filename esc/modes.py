@@ -5,6 +5,8 @@ modes.py - Manage calculator state/modes
 from .oops import ProgrammingError
 
 MODES = {}
+_generation = 0  # pylint: disable=invalid-name
+_snapshot = (None, ())  # pylint: disable=invalid-name
 
 
 class Mode:
@@ -35,9 +37,37 @@ class Mode:
         if self.allowable_values is not None and val not in self.allowable_values:
             raise ProgrammingError(f"Tried to set invalid mode {val} "
                                    f"(valid values: {','.join(self.allowable_values)})")
+        if val != self._value:
+            _bump_generation()
         self._value = val
 
 
+def _bump_generation():
+    global _generation
+    _generation += 1
+
+
+def generation():
+    """
+    Return a counter that changes whenever any mode is registered or changes
+    value. Caches of anything that depends on modes (such as a menu's mode
+    display) can store it and compare later to tell whether they are stale.
+    """
+    return _generation
+
+
+def snapshot():
+    """
+    Return a hashable tuple of the (name, value) of every mode, sorted by
+    name, for use in cache keys. It's only rebuilt when a mode changes.
+    """
+    global _snapshot
+    if _snapshot[0] != _generation:
+        values = tuple(sorted((name, mode.value) for name, mode in MODES.items()))
+        _snapshot = (_generation, values)
+    return _snapshot[1]
+
+
 def get(name):
     """
     Retrieve the value of a mode with a given name. Return None if no mode by
@@ -60,6 +90,7 @@ def register(name, default_value, allowable_values=None):
     if name in MODES:
         raise ProgrammingError("Tried to re-register an existing mode {name}.")
     MODES[name] = Mode(name, default_value, allowable_values)
+    _bump_generation()
 
 
 #pylint: disable=redefined-builtin
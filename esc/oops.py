@@ -70,6 +70,13 @@ class InvalidNameError(EscError):
     """
 
 
+class MacroError(EscError):
+    """
+    Raised when recorded keys can't be made into a macro. The message can be
+    printed to the status bar.
+    """
+
+
 class FunctionExecutionError(EscError):
     r"""
     A broad exception type that occurs when the code within an operation
@@ -0,0 +1,206 @@
+"""
+palette.py - find a command by typing part of its name
+
+The command palette lists every operation in the menu tree, however deeply
+nested, and narrows the list as you type. Letters need only appear in order
+in an operation's key path or description to match it ("sqr" finds "square
+root"), and longer words also match the start of words in its documentation.
+Each word of the query has to match.
+
+This module also holds :func:`pick`, the prompt shared by the palette and
+the help search, which shows the ranked matches as the user types and lets
+them choose one.
+"""
+
+import curses
+import curses.ascii
+import heapq
+import re
+
+from .commands import EscOperation
+from .display import screen, fetch_input
+from .helpindex import help_index
+
+#: Most matches the palette ranks and shows for a query.
+MAX_MATCHES = 50
+
+#: Shortest query word that is also looked for in documentation.
+#: Shorter words match far too much text to be useful.
+MIN_DOC_TERM_LENGTH = 3
+
+#: Most query words whose matches are remembered.
+MAX_REMEMBERED_TERMS = 1024
+
+# How well a query word matched, best first.
+_PREFIX, _SUBSTRING, _SCATTERED, _IN_DOC = range(4)
+
+
+def _char_mask(text):
+    "Return a bitmask with a bit set for (roughly) each character in /text/."
+    mask = 0
+    for char in text:
+        mask |= 1 << (ord(char) & 63)
+    return mask
+
+
+class FuzzyFinder:
+    """
+    Fuzzy search over the operations in the help index.
+
+    Each operation's label (key path and description) carries a bitmask of
+    the characters in it, so most operations that can't match a query word
+    are passed over with one integer comparison. The matches for each word
+    are remembered, and a word being typed is only checked against the
+    operations that matched it a letter ago -- so typing another word, or
+    opening the palette again later, costs little.
+    """
+    def __init__(self, index=None):
+        self.index = index or help_index()
+        #: Numbers of the index entries that are operations.
+        self.numbers = [n for n, entry in enumerate(self.index.entries)
+                        if isinstance(entry.command, EscOperation)]
+        self._labels = {n: f"{self.index.entries[n].key_path} "
+                           f"{self.index.entries[n].description}".lower()
+                        for n in self.numbers}
+        self._masks = {n: _char_mask(label) for n, label in self._labels.items()}
+        #: Query word -> {entry number: (tier, position)}.
+        self._term_matches = {}
+
+    def matches(self, term):
+        """
+        Return a dict mapping the number of each entry /term/ matches to
+        a (tier, position) pair; lower pairs are better matches.
+        """
+        matches = self._term_matches.get(term)
+        if matches is not None:
+            return matches
+
+        shorter = self._term_matches.get(term[:-1])
+        if shorter is None:
+            candidates = self.numbers
+        else:
+            # Any label the term matches, its first letters matched too.
+            candidates = [n for n, (tier, _) in shorter.items() if tier != _IN_DOC]
+
+        search = re.compile('.*?'.join(re.escape(c) for c in term)).search
+        term_mask = _char_mask(term)
+        labels = self._labels
+        masks = self._masks
+        matches = {}
+        for number in candidates:
+            if masks[number] & term_mask != term_mask:
+                continue
+            label = labels[number]
+            match = search(label)
+            if match is None:
+                continue
+            position = label.find(term)
+            if position == 0 or position > 0 and not label[position - 1].isalnum():
+                matches[number] = (_PREFIX, position)
+            elif position > 0:
+                matches[number] = (_SUBSTRING, position)
+            else:
+                matches[number] = (_SCATTERED, match.end() - match.start())
+        if len(term) >= MIN_DOC_TERM_LENGTH:
+            for number in self.index.prefix_matches(term) & labels.keys():
+                matches.setdefault(number, (_IN_DOC, 0))
+
+        if len(self._term_matches) >= MAX_REMEMBERED_TERMS:
+            self._term_matches.clear()
+        self._term_matches[term] = matches
+        return matches
+
+    def search(self, query, limit=MAX_MATCHES):
+        """
+        Return up to /limit/ :class:`HelpEntries <esc.helpindex.HelpEntry>`
+        (or all of them, if /limit/ is None) for operations matching every
+        word of /query/, best first.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        first, *rest = sorted((self.matches(i) for i in terms), key=len)
+        scored = []
+        for number, (tier, position) in first.items():
+            for matches in rest:
+                score = matches.get(number)
+                if score is None:
+                    break
+                tier += score[0]
+                position += score[1]
+            else:
+                scored.append((tier, position,
+                               len(self.index.entries[number].keys), number))
+        best = sorted(scored) if limit is None else heapq.nsmallest(limit, scored)
+        return [self.index.entries[i[-1]] for i in best]
+
+
+_FINDER = None  # pylint: disable=invalid-name
+
+
+def finder():
+    "Return a FuzzyFinder over the current help index, reusing it if possible."
+    global _FINDER  # pylint: disable=global-statement
+    index = help_index()
+    if _FINDER is None or _FINDER.index is not index:
+        _FINDER = FuzzyFinder(index)
+    return _FINDER
+
+
+def pick(heading, search, prompt, hint, menu=None):
+    """
+    Prompt for a search, showing the matches in a window under /heading/
+    as the user types. Up and down move the selection, Enter picks it, and
+    Esc (or backspacing past the start) cancels.
+
+    :param search: Called with the query; returns a list of
+        :class:`HelpEntries <esc.helpindex.HelpEntry>`, best first.
+    :param prompt: Called with the query to update the status bar.
+    :param hint: Shown in the window until something is typed.
+    :param menu: The menu to redraw if the terminal is resized.
+    :return: The chosen entry, or None if the search was cancelled.
+    """
+    query = ""
+    matches = []
+    selected = 0
+
+    def redraw():
+        prompt(query)
+        screen().refresh_status()
+        screen().show_search_window(
+            heading, [(i.key_path, i.description) for i in matches], selected,
+            hint if not query else "No commands match.")
+
+    try:
+        while True:
+            redraw()
+            c = fetch_input(True)
+            if c == curses.KEY_RESIZE:
+                screen().handle_resize()
+                if not screen().too_small and menu is not None:
+                    screen().display_menu(menu)
+                continue
+            if c == 27:  # Esc
+                return None
+            if c in (curses.KEY_ENTER, ord('\n'), ord('\r')):
+                if matches:
+                    return matches[selected]
+                continue
+            if c == curses.KEY_DOWN:
+                selected = min(selected + 1, max(len(matches) - 1, 0))
+                continue
+            if c == curses.KEY_UP:
+                selected = max(selected - 1, 0)
+                continue
+            if c in (curses.KEY_BACKSPACE, 127) or curses.ascii.unctrl(c) == '^H':
+                if not query:
+                    return None
+                query = query[:-1]
+            elif 32 <= c < 127:
+                query += chr(c)
+            else:
+                continue
+            matches = search(query)
+            selected = 0
+    finally:
+        screen().hide_search_window()
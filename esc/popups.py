@@ -0,0 +1,131 @@
+"""
+popups.py - the temporary windows drawn over the main ones
+
+The help window and the search list cover part of the screen while they're
+up; :class:`EscScreen <esc.display.EscScreen>` creates them on demand, and
+whatever was underneath is redrawn when they go away.
+"""
+
+import curses
+import itertools
+import textwrap
+
+from .display import Window, _fit
+from .util import truncate, centered_position
+
+
+class HelpWindow(Window):  # pylint: disable=too-many-instance-attributes
+    "Temporary window displaying help messages."
+    heading = "Help"
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, scr, is_menu, help_title, signature_info, docstring,
+                 results_info):
+        layout = scr._layout
+        if is_menu:
+            w = layout.stack.width + layout.history.width
+            x = layout.stack.x
+            y = layout.stack.y
+        else:
+            w = layout.history.width + layout.commands.width
+            x = layout.history.x
+            y = layout.history.y
+        h = layout.commands.height
+
+        super().__init__(scr, w, h, x, y)
+        self.help_title = help_title
+        self.signature_info = signature_info
+        self.docstring = docstring
+        self.results_info = results_info
+        self.refresh()
+
+    def refresh(self):
+        self.scr.hide_registers_window()
+        try:
+            self.window.clear()
+            self.window.border()
+            max_content_width = self.width - 2
+            self.window.addstr(
+                1,
+                centered_position(self.help_title, self.width),
+                self.help_title,
+                self.scr.color_pair(2))
+
+            indent = "    "
+            docstring_lines = (indent + i for i in
+                               textwrap.wrap(
+                                   textwrap.dedent(self.docstring).strip(),
+                                   max_content_width - len(indent)))
+
+            if self.results_info is not None:
+                rest = (
+                    "",
+                    "If you executed this command now...",
+                    *(f"    {i}" for i in self.results_info))
+            else:
+                rest = (())
+            display_iterable = itertools.chain(
+                ("Description:",),
+                docstring_lines,
+                ("", "Signature:"),
+                self.signature_info,
+                rest
+            )
+            last_content_row = self.height - 2
+            for yposn, text in enumerate(display_iterable, 2):
+                if yposn >= last_content_row:
+                    self.window.addstr(last_content_row, 1, "...")
+                    break
+                if max_content_width > 3:
+                    text = truncate(text, max_content_width)
+                self.window.addstr(yposn, 1, text)
+        except curses.error:
+            pass
+        super().refresh()
+
+
+class SearchWindow(Window):
+    """
+    Temporary window listing the commands that match a search, one of them
+    selected. It covers the same area as the help window for an operation,
+    scrolling to keep the selection in view.
+    """
+    max_key_width = 8  #: key paths longer than this push the descriptions over
+
+    def __init__(self, scr, heading):
+        layout = scr._layout
+        super().__init__(scr,
+                         layout.history.width + layout.commands.width,
+                         layout.commands.height,
+                         layout.history.x,
+                         layout.history.y)
+        self.heading = heading
+        #: (key path, description) of each match, best first.
+        self.rows = ()
+        self.selected = 0
+        #: Shown in place of the list when there are no rows.
+        self.empty_message = ""
+
+    def refresh(self):
+        self.scr.hide_registers_window()
+        try:
+            self.window.clear()
+            self.window.border()
+            max_content_width = self.width - 2
+            visible = self.height - 2
+            if not self.rows:
+                self.window.addstr(1, 2, truncate(self.empty_message,
+                                                  max_content_width - 2))
+            first = max(0, self.selected - visible + 1)
+            key_width = min(self.max_key_width,
+                            max((len(k) for k, _ in self.rows), default=0))
+            for yposn, (index, (keys, description)) in enumerate(
+                    itertools.islice(enumerate(self.rows), first, first + visible), 1):
+                marker = '>' if index == self.selected else ' '
+                text = f"{marker} {keys:<{key_width}}  {description}"
+                attr = (self.scr.color_pair(1) if index == self.selected
+                        else self.scr.color_pair(0))
+                self.window.addstr(yposn, 1, _fit(text, max_content_width), attr)
+        except curses.error:
+            pass
+        super().refresh()
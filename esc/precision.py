@@ -0,0 +1,67 @@
+"""
+precision.py - how many significant digits esc calculates with
+
+esc starts out calculating with :data:`esc.consts.PRECISION` significant
+digits, but the precision menu can change that at any time. Rather than
+changing the one shared :class:`decimal.Context` in place, each change
+installs a new context with :func:`decimal.setcontext`, which keeps the
+current context in a context variable. So the precision belongs to the
+session that set it: help simulations running on their own threads, tests
+running under :func:`decimal.localcontext`, and so on each have their own,
+and changing one doesn't disturb the others.
+
+The precision in effect is also recorded on the
+:class:`StackState <esc.stack.StackState>` whenever the stack changes, so
+undoing past a change of precision changes it back.
+"""
+
+import decimal
+
+from .consts import PRECISION, STACKWIDTH
+
+#: Most significant digits esc will calculate with.
+MAX_PRECISION = 100000
+
+
+def make_context(digits):
+    """
+    Return a new decimal context calculating to /digits/ significant digits.
+    Overflow gives infinity rather than raising an exception.
+    """
+    return decimal.Context(prec=digits,
+                           traps=[decimal.InvalidOperation, decimal.DivisionByZero])
+
+
+def get_precision():
+    "The number of significant digits in effect in the current session."
+    return decimal.getcontext().prec
+
+
+def set_precision(digits):
+    """
+    Calculate to /digits/ significant digits from now on, in the current
+    session only.
+
+    :raises ValueError: if /digits/ isn't a whole number from 1 to
+        :data:`MAX_PRECISION`.
+    """
+    if not 1 <= digits <= MAX_PRECISION or digits != int(digits):
+        raise ValueError(f"Precision must be a whole number of digits "
+                         f"from 1 to {MAX_PRECISION}.")
+    digits = int(digits)
+    if digits != decimal.getcontext().prec:
+        context = decimal.getcontext().copy()
+        context.prec = digits
+        decimal.setcontext(context)
+
+
+def entry_width():
+    """
+    The most characters a number being typed in can have. There's always
+    room for the full precision plus a sign, point and exponent.
+
+    >>> with decimal.localcontext(make_context(50)):
+    ...     entry_width()
+    59
+    """
+    return max(STACKWIDTH, get_precision() + STACKWIDTH - PRECISION)
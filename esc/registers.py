@@ -2,19 +2,202 @@
 registers.py - manage registers
 """
 
-from typing import Dict
+import bisect
+from contextlib import suppress
+import json
+import os
+from pathlib import Path
+import re
+import tempfile
+from typing import Callable, Dict, List, Union
 
+from . import backends
 from .oops import InvalidNameError
-from .stack import StackItem
+from .stack import StackItem, StackSlice
+from .units import UnitExpression
+
+#: Longest register name allowed.
+MAX_NAME_LENGTH = 32
+_VALID_NAME = re.compile(r'[A-Za-z][A-Za-z0-9_]*')
+
+
+def default_store_path():
+    "Where esc keeps the user's registers between sessions."
+    return Path.home() / ".esc" / "registers"
+
+
+class RegisterStore:
+    """
+    On-disk home of a :class:`Registry`.
+
+    The file holds one register per line: the name, a tab, and the value
+    encoded as a small JSON object. Since names can't contain tabs, reading
+    the index only needs to split each line at its first tab; the JSON is
+    left as a string until that register's value is wanted
+    (see :func:`decode_item`).
+
+    Writes go to a temporary file in the same directory which is then renamed
+    over the store, so a crash or full disk mid-write leaves the previous
+    version intact rather than a truncated file.
+    """
+    HEADER = "# esc registers, version 1\n"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        #: Number of times the store has been written, for diagnostics.
+        self.writes = 0
+
+    def load(self) -> Dict[str, str]:
+        """
+        Return a dict mapping each stored register's name to its still-encoded
+        value. A missing file is an empty store.
+        """
+        index = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('#'):
+                        continue
+                    name, sep, encoded = line.rstrip('\n').partition('\t')
+                    if sep and Registry._valid_name(name):
+                        index[name] = encoded
+        except FileNotFoundError:
+            pass
+        return index
+
+    def write(self, entries):
+        """
+        Atomically replace the store's contents with /entries/,
+        an iterable of (name, encoded value) pairs.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent,
+                                         prefix=f".{self.path.name}.",
+                                         suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.HEADER)
+                for name, encoded in entries:
+                    f.write(f"{name}\t{encoded}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+        self.writes += 1
+
+
+def _item_fields(item: StackItem):
+    unit = item.unit.exponents if item.unit is not None else None
+    fields = {'value': str(item.decimal), 'unit': unit}
+    backend = backends.backend_of(item.decimal)
+    if backend is not backends.DECIMAL:
+        fields['backend'] = backend.name
+    return fields
+
+
+def _item_from_fields(fields) -> StackItem:
+    unit = fields.get('unit')
+    backend = backends.BACKENDS[fields.get('backend', backends.DECIMAL.name)]
+    return StackItem(decval=backend.from_string(fields['value']),
+                     unit=UnitExpression(unit) if unit is not None else None)
+
+
+def encode_item(item: Union[StackItem, StackSlice]) -> str:
+    """
+    Encode a register's value for a :class:`RegisterStore`. The Decimal is
+    written out in full, so no precision is lost, along with its unit.
+    A :class:`StackSlice <esc.stack.StackSlice>` is written as a list of
+    the same. A number made by another :mod:`backend <esc.backends>` is
+    written out in full likewise and tagged with the backend's name.
+
+    >>> from decimal import Decimal
+    >>> from fractions import Fraction
+    >>> encode_item(StackItem(decval=Decimal('2.5'), unit=UnitExpression({'m': 1})))
+    '{"value": "2.5", "unit": {"m": 1}}'
+    >>> encode_item(StackSlice([StackItem(decval=Decimal(1))]))
+    '{"items": [{"value": "1", "unit": null}]}'
+    >>> encode_item(StackItem(decval=Fraction(1, 3)))
+    '{"value": "1/3", "unit": null, "backend": "rational"}'
+    """
+    if isinstance(item, StackSlice):
+        return json.dumps({'items': [_item_fields(i) for i in item]})
+    return json.dumps(_item_fields(item))
+
+
+def decode_item(encoded: str) -> Union[StackItem, StackSlice]:
+    """
+    Inverse of :func:`encode_item`.
+
+    >>> decode_item('{"value": "2.5", "unit": {"m": 1}}')
+    <StackItem: Decimal(2.5) String(2.5) Unit(UnitExpression({'m': 1}))>
+    >>> decode_item('{"items": [{"value": "1", "unit": null}]}')
+    <StackSlice: 1 items>
+    >>> from fractions import Fraction
+    >>> decode_item(encode_item(StackItem(decval=Fraction(1, 3)))).decimal
+    Fraction(1, 3)
+    >>> decode_item(encode_item(StackItem(decval=0.1))).decimal
+    0.1
+    >>> decode_item('garbage')
+    Traceback (most recent call last):
+      ...
+    ValueError: Can't decode the register value 'garbage'.
+
+    :raises ValueError: if /encoded/ isn't something :func:`encode_item`
+        could have written, e.g., because the file was edited by hand.
+    """
+    try:
+        data = json.loads(encoded)
+        if 'items' in data:
+            return StackSlice(_item_from_fields(i) for i in data['items'])
+        return _item_from_fields(data)
+    except (ArithmeticError, AttributeError, KeyError, TypeError,
+            ValueError) as e:
+        raise ValueError(f"Can't decode the register value {encoded!r}.") from e
 
 
 class Registry:
     """
     The Registry stores the values of esc registers. It's basically a fancy
     dictionary with some validation and a display-sorted :meth:`items` method.
+
+    The sorted order is kept in an index updated as registers are set and
+    deleted, rather than sorting on every display. Since every name
+    beginning with a given prefix sits in one contiguous run of that index,
+    prefix lookups for completion are a pair of binary searches, which keeps
+    them interactive with many thousands of registers. Anything that caches a
+    view of the registers can watch :attr:`generation` or register a
+    callback with :meth:`add_listener` to learn when it's stale.
+
+    If a :class:`RegisterStore` is provided, the registers saved in it are
+    loaded, but only their names are read up front; each value stays
+    encoded until it's first retrieved, so startup doesn't slow down as
+    registers accumulate. Changes are not written back until :meth:`save`
+    is called, which lets the caller batch a burst of changes into one write.
+
+    A stored value that can't be decoded when it's retrieved is set aside:
+    the register disappears from the registry, but its encoded value is
+    kept in :attr:`unreadable` and written back by :meth:`save`, so it
+    isn't lost, and its name is reported by :meth:`newly_unreadable`.
     """
-    def __init__(self):
-        self._registers: Dict[str, StackItem] = {}
+    def __init__(self, store: RegisterStore = None):
+        #: Values are StackItems or StackSlices,
+        #: or encoded strings not yet decoded.
+        self._registers: Dict[str, Union[StackItem, StackSlice, str]] = {}
+        self._sorted_keys: List[str] = []
+        self._listeners: List[Callable[[str], None]] = []
+        #: Incremented whenever a register is set or deleted.
+        self.generation = 0
+        self.store = store
+        self._unsaved = False
+        #: Encoded values that couldn't be decoded, by register name.
+        self.unreadable: Dict[str, str] = {}
+        self._newly_unreadable: List[str] = []
+        if store is not None:
+            self._registers = store.load()
+            self._sorted_keys = sorted(self._registers)
 
     def __bool__(self):
         return bool(self._registers)
@@ -26,7 +209,22 @@ class Registry:
         return len(self._registers)
 
     def __getitem__(self, key):
-        return self._registers[key]
+        value = self._registers[key]
+        if isinstance(value, str):
+            try:
+                value = decode_item(value)
+            except ValueError:
+                self._set_aside(key)
+                raise KeyError(key) from None
+            self._registers[key] = value
+        return value
+
+    def _set_aside(self, key):
+        "Move the undecodable register /key/ into :attr:`unreadable`."
+        self.unreadable[key] = self._registers.pop(key)
+        del self._sorted_keys[bisect.bisect_left(self._sorted_keys, key)]
+        self._newly_unreadable.append(key)
+        self.generation += 1
 
     def __setitem__(self, key, value):
         """
@@ -37,20 +235,107 @@ class Registry:
         """
         if not self._valid_name(key):
             raise InvalidNameError(
-                "Register names must be uppercase or lowercase letters.")
+                "Register names must start with a letter and contain only "
+                "letters, digits, and underscores.")
+        if key not in self._registers:
+            bisect.insort(self._sorted_keys, key)
         self._registers[key] = value
+        self.unreadable.pop(key, None)
+        self._changed(key)
 
     def __delitem__(self, key):
         del self._registers[key]
+        del self._sorted_keys[bisect.bisect_left(self._sorted_keys, key)]
+        self._changed(key)
+
+    def _changed(self, key):
+        self.generation += 1
+        self._unsaved = self.store is not None
+        for listener in self._listeners:
+            listener(key)
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """
+        Call *callback* with the register name
+        whenever a register is set or deleted.
+        """
+        self._listeners.append(callback)
+
+    def newly_unreadable(self):
+        """
+        Return the names of the registers set aside as unreadable since the
+        last call, so they can be reported.
+        """
+        names, self._newly_unreadable = self._newly_unreadable, []
+        return names
+
+    @property
+    def has_unsaved_changes(self):
+        "True if registers have changed since they were last saved to the store."
+        return self._unsaved
+
+    def save(self):
+        """
+        Write all registers to the store, if there is one. Values that were
+        never decoded, or couldn't be, are written back as they were read.
+
+        :raises OSError: if the store couldn't be written. The changes are
+            then considered saved anyway, so that a broken store doesn't
+            cause a retry on every keystroke; the next change tries again.
+        """
+        if self.store is None:
+            return
+        self._unsaved = False
+        def encoded(value):
+            return value if isinstance(value, str) else encode_item(value)
+        entries = {key: encoded(self._registers[key]) for key in self._sorted_keys}
+        entries.update(self.unreadable)
+        self.store.write(sorted(entries.items()))
 
     @staticmethod
     def _valid_name(name: str):
-        "A key (register name) is valid if it's exactly one alphabetic character."
-        return len(name) == 1 and name.isalpha()
+        """
+        A key (register name) is valid if it's an ASCII letter followed by
+        up to MAX_NAME_LENGTH - 1 letters, digits, and underscores.
+        """
+        return (len(name) <= MAX_NAME_LENGTH
+                and _VALID_NAME.fullmatch(name) is not None)
 
-    def items(self):
-        "Return an iterable of items, sorted by register key."
-        return sorted(self._registers.items(), key=lambda i: i[0])
+    def _prefix_range(self, prefix):
+        "Return the slice of the sorted index whose names start with /prefix/."
+        start = bisect.bisect_left(self._sorted_keys, prefix)
+        if not prefix:
+            return start, len(self._sorted_keys)
+        # The first string sorting after every string with this prefix.
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return start, bisect.bisect_left(self._sorted_keys, upper, lo=start)
+
+    def count(self, prefix: str = ''):
+        "Return the number of registers whose names start with *prefix*."
+        start, stop = self._prefix_range(prefix)
+        return stop - start
+
+    def completions(self, prefix: str, limit: int = None):
+        """
+        Return the names of registers starting with *prefix*, sorted,
+        and at most *limit* of them if a limit is given.
+        """
+        start, stop = self._prefix_range(prefix)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return self._sorted_keys[start:stop]
+
+    def items(self, prefix: str = '', limit: int = None):
+        """
+        Return an iterable of items, sorted by register key.
+        If *prefix* is given, only registers whose names start with it
+        are included; if *limit* is given, at most that many are returned.
+        """
+        items = []
+        for key in self.completions(prefix, limit):
+            with suppress(KeyError):  # unreadable, and now set aside
+                items.append((key, self[key]))
+        return items
 
     def values(self):
-        return self._registers.values()
+        return [value for _, value in self.items()]
@@ -9,9 +9,12 @@ from contextlib import contextmanager
 import copy
 import decimal
 from decimal import Decimal
+import itertools
+import math
 
-from .consts import STACKWIDTH
+from . import backends
 from . import history
+from . import precision
 from .oops import RollbackTransaction
 from .status import status
 
@@ -36,6 +39,11 @@ class StackItem:
     until we call :meth:`finish_entry`.
     The StackState is in charge of calling this method if needed
     before trying to do any calculations with the number.
+
+    Once entered, a StackItem is never changed in place;
+    anything that needs a different value or unit makes a new item.
+    This lets the undo history and registers share items with the stack
+    rather than copying them.
     """
     def __init__(self, firstchar=None, decval=None, unit=None):
         """
@@ -51,7 +59,9 @@ class StackItem:
             If specified, initialize the string representation to this string
             and prepare for more characters to be entered with :meth:`add_character`.
         :param decval:
-            If specified, make this Decimal the value of the StackItem
+            If specified, make this Decimal (or float or Fraction, under
+            the float or rational :mod:`backend <esc.backends>`) the value
+            of the StackItem
             and create a string representation from it.
         :param unit:
             An optional :class:`UnitExpression <esc.units.UnitExpression>`
@@ -60,10 +70,15 @@ class StackItem:
         #: Whether the number has been fully entered. If not entered,
         #: many methods will not work as we don't have a Decimal representation yet.
         self.is_entered = None
-        #: Decimal representation.
+        #: Decimal representation -- or, for an item made under the float
+        #: or rational :mod:`backend <esc.backends>`, float or Fraction
+        #: representation.
         #: This is ``None`` if :attr:`is_entered` is ``False``.
         self.decimal = None
-        #: String representation.
+        #: String representation. An item made from a number of another
+        #: :mod:`backend <esc.backends>` works it out when it's first asked
+        #: for, since many such items (say, the running totals of a
+        #: reduction) are never shown.
         self.string = None
         #: Optional unit annotation.
         self.unit = unit
@@ -82,6 +97,13 @@ class StackItem:
     def __str__(self):
         return self.string_with_units
 
+    def __getattr__(self, name):
+        # Only called for attributes that haven't been set.
+        if name != 'string':
+            raise AttributeError(name)
+        self._string_repr_from_value()
+        return self.string
+
     @property
     def string_with_units(self):
         "Number + unit: e.g. '42 miles'. Returns just the number if no unit."
@@ -91,7 +113,8 @@ class StackItem:
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return ((self.is_entered, self.decimal, self.string, self.unit)
+                    == (other.is_entered, other.decimal, other.string, other.unit))
         return NotImplemented
 
     @staticmethod
@@ -121,18 +144,29 @@ class StackItem:
         self.string = firstchar
 
     def _init_full(self, decval):
-        "Initialize an item from a Decimal."
-        if not isinstance(decval, Decimal):
+        "Initialize an item from a Decimal (or a number of another backend)."
+        if not isinstance(decval, backends.NUMBER_TYPES):
             raise TypeError("Only Decimals are valid initial values "
                             "for the decval constructor parameter.")
         self.is_entered = True
         self.decimal = decval
-        self._string_repr_from_value()
+        if isinstance(decval, Decimal):
+            self._string_repr_from_value()
+        else:
+            del self.string  # worked out by __getattr__ when first needed
 
     def _string_repr_from_value(self):
         "(Re)set the string representation based on the attribute /value/."
+        value = self.decimal
+        if not isinstance(value, Decimal):
+            backend = backends.backend_of(value)
+            exact = backend.exact_string(value)
+            if exact is not None:
+                self.string = exact
+                return
+            value = backend.to_decimal(value)
         self.string = \
-            str(self._remove_exponent(self.decimal.normalize())).replace('E', 'e')
+            str(self._remove_exponent(value.normalize())).replace('E', 'e')
 
     def add_character(self, nextchar):
         """
@@ -143,11 +177,11 @@ class StackItem:
         if the number has already been entered completely.
 
         :return: ``True`` if successful,
-                 ``False`` if the stack width (``esc.consts.STACKWIDTH``)
-                 has been exceeded.
+                 ``False`` if the width allowed at the current precision
+                 (see :func:`esc.precision.entry_width`) has been exceeded.
         """
         assert not self.is_entered, "Number already entered!"
-        if len(self.string) < STACKWIDTH:
+        if len(self.string) < precision.entry_width():
             self.string += nextchar
             return True
         else:
@@ -166,21 +200,366 @@ class StackItem:
     def finish_entry(self):
         """
         Signal that the user is done entering a string
-        and it should be converted to a Decimal value.
+        and it should be converted to a Decimal value
+        (or a number of the current :mod:`backend <esc.backends>`).
         If successful, return ``True``;
         if the entered string does not form a valid number, return ``False``.
         This should be called only by the
         ``enter_number`` method of ``StackState``.
         """
         try:
-            self.decimal = Decimal(self.string)
-        except decimal.InvalidOperation:
+            self.decimal = backends.get_backend().from_string(self.string)
+        except ValueError:
             return False
         else:
             self._string_repr_from_value()
             self.is_entered = True
             return True
 
+    def with_unit(self, unit):
+        "Return a copy of this item tagged with /unit/ instead of its own unit."
+        new_item = copy.copy(self)
+        new_item.unit = unit
+        return new_item
+
+
+class StackSlice:
+    """
+    A run of entered StackItems lifted off the stack as a unit, so it can be
+    kept in a register and pushed back later.
+
+    The items themselves are shared with the stack they came from (see
+    :class:`StackItem` for why that's safe); capturing or restoring a slice
+    copies only references, never the numbers.
+    """
+    #: Number of items shown by :attr:`string`.
+    preview_length = 3
+
+    def __init__(self, items):
+        self.items = tuple(items)
+        #: Slices are never unit-tagged as a whole; their items carry units.
+        self.unit = None
+
+    def __repr__(self):
+        return f"<StackSlice: {len(self.items)} items>"
+
+    def __str__(self):
+        return self.string
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.items == other.items
+        return NotImplemented
+
+    @property
+    def string(self):
+        """
+        The length and the first few values, for the registers window.
+
+        >>> StackSlice(StackItem(decval=Decimal(i)) for i in range(5)).string
+        '[5] 0, 1, 2, ...'
+        """
+        preview = ", ".join(str(i) for i in self.items[:self.preview_length])
+        if len(self.items) > self.preview_length:
+            preview += ", ..."
+        return f"[{len(self.items)}] {preview}"
+
+
+class StackSegment:
+    """
+    A run of stack items following an arithmetic sequence (each item is the
+    last plus a fixed step) or a geometric one (each item is the last times
+    a fixed ratio), kept as its first term, step and length rather than as
+    items. However long it is, it takes the same small amount of memory.
+
+    Items are made when they're asked for -- when they're displayed, or
+    popped off the stack by an operation -- and not kept afterwards. Slicing
+    a segment gives another segment, without making any items, so a stack
+    can be cut back through a segment without expanding it.
+
+    Like a StackItem, a segment never changes once made.
+
+    :param start: The first term, a Decimal (or a float or Fraction, under
+        the float or rational :mod:`backend <esc.backends>`).
+    :param step: The common difference or (if /geometric/) ratio, likewise.
+    :param count: The number of items.
+    :param geometric: If true, the items form a geometric sequence.
+    :param unit: The :class:`UnitExpression <esc.units.UnitExpression>`
+        every item is tagged with, or ``None`` for unitless.
+    """
+    def __init__(self, start, step, count, geometric=False, unit=None, offset=0):
+        self.start = start
+        self.step = step
+        self.count = count
+        self.geometric = geometric
+        self.unit = unit
+        # Index in the original sequence of our first item, so slices
+        # compute their items from the original start, without rounding.
+        self.offset = offset
+
+    def __repr__(self):
+        kind = "geometric" if self.geometric else "arithmetic"
+        return (f"<StackSegment: {kind} {self.start}, {self.step}, "
+                f"{self.offset}+{self.count} items>")
+
+    def __str__(self):
+        return self.string
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self._item(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(self.count)
+            if stride != 1:
+                raise ValueError("Segments can only be sliced contiguously.")
+            return self.__class__(self.start, self.step, max(stop - start, 0),
+                                  self.geometric, self.unit, self.offset + start)
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("segment index out of range")
+        return self._item(index)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.__dict__ == other.__dict__
+        return NotImplemented
+
+    def value(self, index):
+        "The Decimal value of item /index/ (counting from 0) of the segment."
+        position = self.offset + index
+        if self.geometric:
+            try:
+                return self.start * self.step ** position
+            except OverflowError:
+                # Only floats overflow here; go to infinity, as multiplying
+                # floats does, rather than failing wherever the item is used.
+                negative = (self.start < 0) != (self.step < 0 and position % 2 == 1)
+                return -math.inf if negative else math.inf
+        return self.start + self.step * position
+
+    def _item(self, index):
+        return StackItem(decval=self.value(index), unit=self.unit)
+
+    def with_unit(self, unit):
+        "Return a copy of this segment tagged with /unit/."
+        new_segment = copy.copy(self)
+        new_segment.unit = unit
+        return new_segment
+
+    @property
+    def string(self):
+        """
+        The first two values and the last, for the history.
+
+        >>> StackSegment(Decimal(1), Decimal(1), 100000).string
+        '1, 2, ..., 100000'
+        """
+        if self.count <= 3:
+            return ", ".join(str(i) for i in self)
+        return f"{self[0]}, {self[1]}, ..., {self[-1]}"
+
+    def total(self):
+        """
+        The sum of the items, worked out directly from the first term, step
+        and length rather than by adding them up.
+
+        >>> StackSegment(Decimal(1), Decimal(1), 100000).total()
+        Decimal('5000050000')
+        >>> StackSegment(Decimal(1), Decimal(2), 10, geometric=True).total()
+        Decimal('1023')
+        """
+        count, first = self.count, self.offset
+        if self.geometric:
+            if self.step == 1:
+                return self.start * count
+            return (self.start * self.step ** first
+                    * (self.step ** count - 1) / (self.step - 1))
+        # The positions first, first + 1, ..., first + count - 1 sum to this.
+        positions = count * first + count * (count - 1) // 2
+        return self.start * count + self.step * positions
+
+
+class StackList:
+    """
+    The list of items on a :class:`StackState`. It behaves like a list of
+    :class:`StackItem`\\ s, but some of those items may be stored together
+    as a :class:`StackSegment` and only made when they're looked at.
+
+    Indexing gives a StackItem and slicing gives another StackList, sharing
+    items and segments with this one. Working out where an item is takes time
+    proportional to the number of segments, so a stack without segments
+    (by far the usual case) is just a list.
+    """
+    def __init__(self, entries=()):
+        #: StackItems and StackSegments, in order.
+        self._entries = list(entries)
+        #: Indexes into _entries of the segments, ascending.
+        self._segments = [n for n, i in enumerate(self._entries)
+                          if isinstance(i, StackSegment)]
+        self._length = (len(self._entries) - len(self._segments)
+                        + sum(len(self._entries[i]) for i in self._segments))
+
+    @classmethod
+    def _of_items(cls, items):
+        "Make a StackList of the list /items/, which has no segments, in place."
+        new = cls.__new__(cls)
+        new._entries = items
+        new._segments = []
+        new._length = len(items)
+        return new
+
+    def __repr__(self):
+        return f"<StackList: {self._entries!r}>"
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        if not self._segments:
+            return iter(self._entries)
+        return itertools.chain.from_iterable(
+            i if isinstance(i, StackSegment) else (i,) for i in self._entries)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            if self._entries == other._entries:
+                return True
+        elif not isinstance(other, list):
+            return NotImplemented
+        # Stop at the first difference rather than making every item.
+        return (len(self) == len(other)
+                and all(i == j for i, j in zip(self, other)))
+
+    @property
+    def segments(self):
+        "The StackSegments on the stack, in order."
+        return [self._entries[i] for i in self._segments]
+
+    def _locate(self, index):
+        """
+        Return the index into _entries of item /index/, and its position
+        within the segment there, or None if it isn't in a segment.
+        """
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("stack index out of range")
+        extra = 0
+        for position in self._segments:
+            segment_start = position + extra
+            if index < segment_start:
+                break
+            segment_length = len(self._entries[position])
+            if index < segment_start + segment_length:
+                return position, index - segment_start
+            extra += segment_length - 1
+        return index - extra, None
+
+    def _pieces(self, start, stop):
+        "Yield the entries (or parts of segments) holding items start:stop."
+        if start >= stop:
+            return
+        position, within = self._locate(start)
+        remaining = stop - start
+        while remaining:
+            entry = self._entries[position]
+            if isinstance(entry, StackSegment):
+                piece = entry[within or 0:(within or 0) + remaining]
+                remaining -= len(piece)
+                yield piece
+            else:
+                remaining -= 1
+                yield entry
+            position += 1
+            within = None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if not self._segments:
+                return self._of_items(self._entries[index])
+            start, stop, stride = index.indices(self._length)
+            if stride != 1:
+                return self._of_items(list(self)[index])
+            return self.__class__(self._pieces(start, stop))
+        if not self._segments:
+            return self._entries[index]
+        position, within = self._locate(index)
+        if within is None:
+            return self._entries[position]
+        return self._entries[position][within]
+
+    def __setitem__(self, index, item):
+        if not self._segments:
+            self._entries[index] = item
+            return
+        position, within = self._locate(index)
+        if within is None:
+            self._entries[position] = item
+            return
+        # Split the segment around the item being replaced.
+        segment = self._entries[position]
+        pieces = [i for i in (segment[:within], item, segment[within + 1:])
+                  if not isinstance(i, StackSegment) or len(i)]
+        self._entries[position:position + 1] = pieces
+        self._segments = [n for n, i in enumerate(self._entries)
+                          if isinstance(i, StackSegment)]
+
+    def append(self, item):
+        "Add a StackItem to the end."
+        self._entries.append(item)
+        self._length += 1
+
+    def extend(self, items):
+        "Add StackItems to the end."
+        before = len(self._entries)
+        self._entries.extend(items)
+        self._length += len(self._entries) - before
+
+    def append_segment(self, segment):
+        "Add a StackSegment to the end, without making any of its items."
+        if not len(segment):
+            return
+        self._segments.append(len(self._entries))
+        self._entries.append(segment)
+        self._length += len(segment)
+
+    def pop(self):
+        "Remove and return the last item."
+        if not self._length:
+            raise IndexError("pop from empty stack")
+        self._length -= 1
+        last = self._entries[-1]
+        if not isinstance(last, StackSegment):
+            return self._entries.pop()
+        if len(last) == 1:
+            self._entries.pop()
+            self._segments.pop()
+        else:
+            self._entries[-1] = last[:-1]
+        return last[-1]
+
+    def clear(self):
+        self._entries.clear()
+        self._segments = []
+        self._length = 0
+
+
+#: Source of StackState versions. Numbers are never reused, even across
+#: different StackStates, so a version identifies one state of one stack.
+_versions = itertools.count(1)
+
 
 class StackState:
     """
@@ -196,10 +575,24 @@ class StackState:
     exporting and restoring mementos consisting of this object's __dict__.
     """
     def __init__(self):
-        self.s = []
+        self.s = StackList()
         self.operation_history = []
         self.stack_posn = -1
         self._editing_last_item = False
+        #: Changes whenever the contents of the stack or its history change.
+        #: Since it's part of the memento, undoing to an earlier state
+        #: brings back that state's version too.
+        self.version = next(_versions)
+        #: Significant digits and number backend in effect when the stack
+        #: last changed. Restoring a memento brings them back.
+        self.precision = precision.get_precision()
+        self.backend = backends.get_backend().name
+
+    def _touch(self):
+        "Note that the stack has changed, and the precision and backend in effect."
+        self.version = next(_versions)
+        self.precision = precision.get_precision()
+        self.backend = backends.get_backend().name
 
     def __repr__(self):
         vals = [repr(item) if idx != self.stack_posn else f"({item!r})"
@@ -226,6 +619,8 @@ class StackState:
         self._editing_last_item = value
         #TODO: This really shouldn't be here but we can't put the status logic
         # in display either or we have a circular dependency
+        if status.detached:
+            return
         if self._editing_last_item:
             status.entering_number()
         else:
@@ -241,6 +636,7 @@ class StackState:
 
     @bos.setter
     def bos(self, value):
+        self._touch()
         try:
             self.s[self.stack_posn] = value
         except IndexError:
@@ -249,6 +645,7 @@ class StackState:
     @bos.deleter
     def bos(self):
         self.s.pop()  # raises IndexError if nothing here
+        self._touch()
         self.editing_last_item = False
         self.stack_posn -= 1
 
@@ -272,6 +669,7 @@ class StackState:
         Create a new stack item for the user to type into beginning with the
         character /c/.
         """
+        self._touch()
         self.stack_posn += 1
         self.s.append(StackItem(firstchar=c))
         self.editing_last_item = True
@@ -293,6 +691,7 @@ class StackState:
         capacity of the stack.
         """
         if self.editing_last_item:
+            self._touch()
             return self.s[self.stack_posn].add_character(c)
         else:
             return self._new_entry_stack_item(c)
@@ -312,11 +711,13 @@ class StackState:
             del self.bos
             return 1
         else:
+            self._touch()
             self.bos.backspace()
             return 0
 
     def clear(self):
         "Clear the stack."
+        self._touch()
         self.s.clear()
         self.stack_posn = -1
         self.editing_last_item = False
@@ -339,10 +740,11 @@ class StackState:
         # This ensures that we will get a checkpoint anytime we call an
         # operation as well as when we enter a number onto the stack.
         # Multiple checkpoints in a row do nothing, so this is safe.
-        history.hs.checkpoint_stack(self)
+        history.current().checkpoint_stack(self)
 
         if self.editing_last_item:
             if self.s[self.stack_posn].finish_entry():
+                self._touch()
                 self.editing_last_item = False
                 return True
             else:
@@ -364,12 +766,24 @@ class StackState:
         if description is not None:
             self.record_operation(description)
 
-        for i in vals:
-            if isinstance(i, StackItem):
-                self.s.append(i)
-            else:
-                self.s.append(StackItem(decval=i))
-        self.stack_posn += len(vals)
+        self._touch()
+        items = [i if isinstance(i, StackItem) else StackItem(decval=i)
+                 for i in vals]
+        self.s.extend(items)
+        self.stack_posn += len(items)
+        return True
+
+    def push_segment(self, segment, description=None):
+        """
+        Push a :class:`StackSegment` onto the stack. Its items aren't made
+        until they're needed.
+        """
+        if description is not None:
+            self.record_operation(description)
+
+        self._touch()
+        self.s.append_segment(segment)
+        self.stack_posn += len(segment)
         return True
 
     def pop(self, num=1, retain=False):
@@ -380,6 +794,7 @@ class StackState:
         If /retain/ is true, don't remove the items from the stack.
         """
         if not retain:
+            self._touch()
             self.stack_posn -= num
 
         if len(self.s) < num:
@@ -388,11 +803,28 @@ class StackState:
             # Needs a special case, as s[:-0] will wipe out the stack
             return []
         else:
-            stack_slice = self.s[-num:]
+            stack_slice = list(self.s[-num:])
             if not retain:
                 self.s = self.s[:-num]
             return stack_slice
 
+    def pop_segment(self, num):
+        """
+        If the last /num/ items on the stack are all part of one
+        :class:`StackSegment`, pop them and return them as a StackSegment
+        without making the items. Otherwise return None, leaving the stack
+        alone.
+        """
+        if not 0 < num <= len(self.s):
+            return None
+        segments = self.s[-num:].segments
+        if len(segments) != 1 or len(segments[0]) != num:
+            return None
+        self._touch()
+        self.stack_posn -= num
+        self.s = self.s[:-num]
+        return segments[0]
+
     def last_n_items(self, n):
         """
         Return the last /n/ items from the stack, with special meaning for 0
@@ -408,11 +840,11 @@ class StackState:
         should replace the entire stack.
         """
         if n == -1:
-            return self.s[:]
+            return list(self.s)
         elif n == 0:
             return []
         else:
-            return self.s[-n:]
+            return list(self.s[-n:])
 
     def record_operation(self, description):
         """
@@ -424,6 +856,7 @@ class StackState:
         anything (for instance, when clearing the stack, or mutating the
         entire stack with a push=-1).
         """
+        self._touch()
         self.operation_history.append(description)
 
     def memento(self):
@@ -431,8 +864,17 @@ class StackState:
         Generate a memento object for the current state of the stack. The
         stack can later be restored to this state by calling restore() on
         the memento.
+
+        Entered StackItems are never modified in place, so the memento shares
+        them with the live stack; only the lists holding them are copied,
+        along with the item currently being typed, which does change.
         """
-        return copy.deepcopy(self.__dict__)
+        memento = dict(self.__dict__)
+        memento['s'] = self.s[:]
+        memento['operation_history'] = self.operation_history[:]
+        if self._editing_last_item and self.s:
+            memento['s'][self.stack_posn] = copy.copy(self.s[self.stack_posn])
+        return memento
 
     def restore(self, memento):
         """
@@ -441,6 +883,10 @@ class StackState:
         """
         self.__dict__.clear()
         self.__dict__.update(memento)
+        if 'precision' in memento:
+            precision.set_precision(self.precision)
+        if 'backend' in memento:
+            backends.set_backend(self.backend)
         self.editing_last_item = self._editing_last_item  # force property logic to run
 
     @contextmanager
@@ -462,7 +908,7 @@ class StackState:
             yield
         except RollbackTransaction as e:
             self.restore(checkpoint)
-            if e.status_message:
+            if e.status_message and not status.detached:
                 status.error(e.status_message)
         except Exception:
             self.restore(checkpoint)
@@ -3,6 +3,7 @@ status.py - manage the status bar
 """
 
 from contextlib import contextmanager
+import contextvars
 from enum import Enum, auto
 
 
@@ -30,8 +31,15 @@ class StatusState:
         READY = (' ', "Ready (<F1> for help)")
         ENTERING_NUMBER = ('i', "Insert")
         IN_MENU = ('m', "Expecting menu selection")
-        EXPECTING_REGISTER = ('r', "Expecting register identifier (any letter)")
-        EXPECTING_HELP = ('h', "Browsing help (select a command or menu)")
+        EXPECTING_REGISTER = ('r', "Register name? (<Tab> completes, <Enter> ends)")
+        EXPECTING_STACK = ('w', "Stack name? (<Tab> completes, <Enter> ends)")
+        EXPECTING_HELP = ('h', "Browsing help (select a command or menu, ? searches)")
+        SEARCHING_HELP = ('h', "Search help (<Enter> shows help, <Esc> cancels)")
+        FINDING_COMMAND = ('f', "Find command (<Enter> runs it, <Esc> cancels)")
+        MAPPING = ('&', "Map which operation? (type a count first for the last N items)")
+        REDUCING = ('$', "Reduce with which operation? (type a count first for the last N)")
+        SCANNING = ('#', "Scan with which operation? (type a count first for the last N)")
+        EXPECTING_REPLAY_COUNT = ('@', "Replay count? (<Enter> for once, * for each item)")
         ENTERING_UNIT = ('\\', "Entering unit tag")
 
         def __init__(self, status_char, status_message):
@@ -55,7 +63,10 @@ class StatusState:
         self.error_state = StatusState.SuccessCode.OK
         self.error_seen = True
         self.override_msg = ""
+        self.name_prefix = ""
         self._saved_states = []
+        #: True while a macro is being recorded, to remind the user.
+        self.recording_macro = False
 
     def __repr__(self):
         if self.error_state == StatusState.SuccessCode.OK:
@@ -77,7 +88,28 @@ class StatusState:
     @property
     def status_message(self):
         "The status message we should be displaying right now."
+        message = self._message()
+        return f"{message} [recording]" if self.recording_macro else message
+
+    def _message(self):
         if self.error_state == StatusState.SuccessCode.OK:
+            if self.name_prefix:
+                if self.state == StatusState.Modality.EXPECTING_REGISTER:
+                    return f"Register name: {self.name_prefix}"
+                if self.state == StatusState.Modality.EXPECTING_STACK:
+                    return f"Stack name: {self.name_prefix}"
+                if self.state == StatusState.Modality.SEARCHING_HELP:
+                    return f"Search help: {self.name_prefix}"
+                if self.state == StatusState.Modality.FINDING_COMMAND:
+                    return f"Find command: {self.name_prefix}"
+                if self.state == StatusState.Modality.MAPPING:
+                    return f"Map which operation over the last {self.name_prefix} items?"
+                if self.state == StatusState.Modality.REDUCING:
+                    return f"Reduce the last {self.name_prefix} items with which operation?"
+                if self.state == StatusState.Modality.SCANNING:
+                    return f"Scan the last {self.name_prefix} items with which operation?"
+                if self.state == StatusState.Modality.EXPECTING_REPLAY_COUNT:
+                    return f"Replay count: {self.name_prefix}"
             return self.state.status_message  # pylint: disable=no-member
         else:
             return self.override_msg
@@ -97,16 +129,83 @@ class StatusState:
     def in_menu(self):
         self.state = StatusState.Modality.IN_MENU
 
-    def expecting_register(self):
-        "Clear errors and put calculator in a state to select a register."
+    def expecting_register(self, prefix=""):
+        """
+        Clear errors and put calculator in a state to select a register,
+        showing the part of the name typed so far (*prefix*).
+        """
         self._clear_errors()
         self.state = StatusState.Modality.EXPECTING_REGISTER
+        self.name_prefix = prefix
+
+    def expecting_stack(self, prefix=""):
+        """
+        Clear errors and put calculator in a state to select a stack,
+        showing the part of the name typed so far (*prefix*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.EXPECTING_STACK
+        self.name_prefix = prefix
 
     def expecting_help(self):
         "Clear errors and put calculator in a state to select a command to get help on."
         self._clear_errors()
         self.state = StatusState.Modality.EXPECTING_HELP
 
+    def searching_help(self, query=""):
+        """
+        Clear errors and put calculator in a state to search the help,
+        showing the search typed so far (*query*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.SEARCHING_HELP
+        self.name_prefix = query
+
+    def finding_command(self, query=""):
+        """
+        Clear errors and put calculator in a state to find a command by name,
+        showing the search typed so far (*query*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.FINDING_COMMAND
+        self.name_prefix = query
+
+    def mapping(self, count=""):
+        """
+        Clear errors and put calculator in a state to choose an operation to
+        map over the stack, showing the count of items typed so far (*count*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.MAPPING
+        self.name_prefix = count
+
+    def reducing(self, count=""):
+        """
+        Clear errors and put calculator in a state to choose an operation to
+        reduce the stack with, showing the count of items typed so far (*count*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.REDUCING
+        self.name_prefix = count
+
+    def scanning(self, count=""):
+        """
+        Clear errors and put calculator in a state to choose an operation to
+        scan the stack with, showing the count of items typed so far (*count*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.SCANNING
+        self.name_prefix = count
+
+    def expecting_replay_count(self, prefix=""):
+        """
+        Clear errors and put calculator in a state to enter how many times to
+        replay a macro, showing the digits typed so far (*prefix*).
+        """
+        self._clear_errors()
+        self.state = StatusState.Modality.EXPECTING_REPLAY_COUNT
+        self.name_prefix = prefix
+
     def entering_unit(self):
         "Clear errors and put calculator in a state to enter a unit tag."
         self._clear_errors()
@@ -129,6 +228,11 @@ class StatusState:
         self.error_seen = False
         self.override_msg = msg
 
+    @property
+    def detached(self):
+        "True within :func:`detached`, when stack changes shouldn't show here."
+        return _detached.get()
+
     def mark_seen(self):
         """
         We want to clear errors and advisories at the start of every time through
@@ -170,5 +274,23 @@ class StatusState:
             self.pop_state()
 
 
+_detached = contextvars.ContextVar('esc_status_detached', default=False)
+
+
+@contextmanager
+def detached():
+    """
+    Context manager within which, in the current context only, stack
+    changes leave the status bar alone (see :attr:`StatusState.detached`).
+    Help simulations run detached, so they can't change the status bar
+    out from under the user.
+    """
+    token = _detached.set(True)
+    try:
+        yield
+    finally:
+        _detached.reset(token)
+
+
 # pylint: disable=invalid-name
 status = StatusState()
@@ -99,11 +99,24 @@ class UnitExpression:
         else:
             # Filter out zero exponents
             self._exponents = {k: v for k, v in exponents.items() if v != 0}
+        # Canonical form, for comparisons; worked out when first needed.
+        self._canonical = None
 
     @property
     def exponents(self):
         return dict(self._exponents)
 
+    @property
+    def canonical(self):
+        """
+        The exponents with plural and singular variants of each token merged
+        (see :func:`_canonical_exponents`). Expressions aren't changed after
+        they're made, so this is only worked out once.
+        """
+        if self._canonical is None:
+            self._canonical = _canonical_exponents(self._exponents)
+        return self._canonical
+
     @property
     def is_unitless(self):
         """
@@ -126,15 +139,15 @@ class UnitExpression:
         True
         """
         if isinstance(other, UnitExpression):
-            return (_canonical_exponents(self._exponents) == _canonical_exponents(
-                other._exponents))
+            return (self._exponents == other._exponents
+                    or self.canonical == other.canonical)
         return NotImplemented
 
     def __repr__(self):
         return f"UnitExpression({self._exponents!r})"
 
     def __hash__(self):
-        return hash(tuple(sorted(_canonical_exponents(self._exponents).items())))
+        return hash(tuple(sorted(self.canonical.items())))
 
     def __add__(self, other):
         """
@@ -151,8 +164,7 @@ class UnitExpression:
         :raises esc.oops.IncommensurableUnitsError: if the inputs have
             different unit tags.
         """
-        if (_canonical_exponents(self._exponents)
-                != _canonical_exponents(other._exponents)):
+        if self.canonical != other.canonical:
             raise IncommensurableUnitsError(self, other)
         return UnitExpression(self._exponents)
 
@@ -363,6 +375,41 @@ class UnitExpression:
         return UnitExpression(exponents)
 
 
+def _running_units(units, sign, running):
+    """
+    Combine the exponents of /units/ left to right, adding those of the
+    second and later units (or subtracting them, if /sign/ is -1), into a
+    single dict, rather than building a new UnitExpression at every step.
+    Return the unit after each step if /running/, otherwise just the last.
+
+    >>> m, s = UnitExpression({"m": 1}), UnitExpression({"s": 1})
+    >>> [u.display() for u in _running_units([m, s, s], -1, running=True)]
+    ['m / s', 'm / s^2']
+    """
+    exponents = dict(units[0].exponents)
+    results = []
+    for unit in units[1:]:
+        for token, exp in unit.exponents.items():
+            _merge_token(exponents, token, sign * exp)
+        if running:
+            results.append(UnitExpression(exponents))
+    return results if running else [UnitExpression(exponents)]
+
+
+def _check_unitless_operands(items_stackitem, units, override):
+    """
+    Raise UnitlessOperandError if any unitless operand other than 1 is mixed
+    with unitful ones, unless /override/ is set.
+    """
+    if any(u.is_unitless for u in units):
+        unitless_args = [
+            si for si, u in zip(items_stackitem, units) if u.is_unitless
+        ]
+        if not all(a.decimal == 1 for a in unitless_args):
+            if not override:
+                raise UnitlessOperandError()
+
+
 class UnitHandler:
     """
     A UnitHandler is a callable whose parameters are bound positionally
@@ -424,6 +471,14 @@ class UnitHandler:
     or if that is not present a ``__doc__`` attribute (docstring),
     it will be shown in the help screen after :literal:`Units: \\ `.
     In a couple of words, this should describe what happens to the units.
+
+    A handler for a binary operation may also define a ``fold`` method,
+    used when the operation is reduced or scanned over the stack:
+    ``fold(items_stackitem, running, override)`` gets all the
+    :class:`StackItems <esc.stack.StackItem>` being folded, in order, and
+    returns the units of every running result if *running* is true,
+    or a one-element list of the final result's units if not.
+    Without one, units are worked out pairwise as the fold goes.
     """
     #: Short phrase describing what this handler does to the units,
     #: shown on the help screen. Falls back to the docstring if empty.
@@ -450,11 +505,26 @@ class additive_unit_handling(UnitHandler):
     """
     description = "additive (units must match)"
 
+    @staticmethod
+    def _common_unit(units):
+        """
+        Return the unit all of /units/ share, comparing each to the first
+        rather than building a new expression for every pair.
+        """
+        first = units[0]
+        for unit in units:
+            if unit != first:
+                raise IncommensurableUnitsError(first, unit)
+        return first
+
     def __call__(self, *units):
-        base = units[0]
-        for u in units[1:]:
-            base = base + u
-        return [base]
+        return [self._common_unit(units)]
+
+    def fold(self, items_stackitem, running, override):  # pylint: disable=unused-argument
+        "Every item must have the same unit, which every result then has."
+        unit = self._common_unit([si.unit or UnitExpression()
+                                  for si in items_stackitem])
+        return [unit] * (len(items_stackitem) - 1 if running else 1)
 
 
 class multiplicative_unit_handling(UnitHandler):
@@ -473,16 +543,19 @@ class multiplicative_unit_handling(UnitHandler):
 
     def __call__(self, *items_stackitem, override):
         units = [si.unit or UnitExpression() for si in items_stackitem]
-        if any(u.is_unitless for u in units):
-            unitless_args = [
-                si for si, u in zip(items_stackitem, units) if u.is_unitless
-            ]
-            if not all(a.decimal == 1 for a in unitless_args):
-                if not override:
-                    raise UnitlessOperandError()
+        _check_unitless_operands(items_stackitem, units, override)
         result = units[0] * units[1]
         return [result]
 
+    def fold(self, items_stackitem, running, override):
+        """
+        Exponents are added into a single running total. A unitless item
+        other than 1 anywhere in a fold that has unitful items is warned about.
+        """
+        units = [si.unit or UnitExpression() for si in items_stackitem]
+        _check_unitless_operands(items_stackitem, units, override)
+        return _running_units(units, 1, running)
+
 
 class divisive_unit_handling(UnitHandler):
     """
@@ -500,16 +573,19 @@ class divisive_unit_handling(UnitHandler):
 
     def __call__(self, *items_stackitem, override):
         units = [si.unit or UnitExpression() for si in items_stackitem]
-        if any(u.is_unitless for u in units):
-            unitless_args = [
-                si for si, u in zip(items_stackitem, units) if u.is_unitless
-            ]
-            if not all(a.decimal == 1 for a in unitless_args):
-                if not override:
-                    raise UnitlessOperandError()
+        _check_unitless_operands(items_stackitem, units, override)
         result = units[0] / units[1]
         return [result]
 
+    def fold(self, items_stackitem, running, override):
+        """
+        Exponents are subtracted into a single running total. A unitless item
+        other than 1 anywhere in a fold that has unitful items is warned about.
+        """
+        units = [si.unit or UnitExpression() for si in items_stackitem]
+        _check_unitless_operands(items_stackitem, units, override)
+        return _running_units(units, -1, running)
+
 
 class power_unit_handling(UnitHandler):
     """
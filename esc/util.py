@@ -129,7 +129,7 @@ def is_number(c):
     return ('0' <= c <= '9') or (c in ('.', '_', 'e'))
 
 
-def positional_caller(func, bind_item, special_names):
+def positional_caller(func, bind_item, special_names, bind_all=None):
     """
     Inspect the signature of /func/ once and return a ``(caller, num_positional)``
     pair that can bind stack-like items positionally thereafter.
@@ -140,6 +140,9 @@ def positional_caller(func, bind_item, special_names):
         type conversion).
     :param special_names: A set or sequence of parameter names that are
         bound by name from a keyword dict, not positionally from items.
+    :param bind_all: Optionally, ``bind_all(items, parm)`` converts every
+        item bound to a varargs parameter at once, returning an iterable;
+        by default, *bind_item* is called on each one.
     :returns: ``(caller, num_positional)`` where *caller* is
         ``caller(items, special_kwargs)`` and *num_positional* is the count
         of positional parameters (or ``-1`` if the function uses ``*args``).
@@ -174,7 +177,10 @@ def positional_caller(func, bind_item, special_names):
         kwargs = {}
 
         if splat_parm is not None:
-            args.extend(bind_item(item, splat_parm) for item in items)
+            if bind_all is not None:
+                args.extend(bind_all(items, splat_parm))
+            else:
+                args.extend(bind_item(item, splat_parm) for item in items)
         else:
             stack_slice = items[-(len(positional_parms)):] if positional_parms else []
             kwargs.update({
@@ -0,0 +1,172 @@
+"""
+workspaces.py - keep several named stacks and switch between them
+
+Only one stack is on screen at a time: the live
+:class:`StackState <esc.stack.StackState>` that the rest of esc operates on,
+together with the undo history in :data:`esc.history.hs`. Every other stack
+is parked in a :class:`Workspace`. Switching stacks exchanges the
+``__dict__`` of the live objects with the parked ones -- the same state the
+undo mementos capture -- so it costs a few pointer swaps no matter how deep
+the stacks are, and nothing about the hidden stacks is drawn.
+
+Parked stacks that haven't been used for a while are paged out to a
+temporary file once they hold more than :data:`MAX_RESIDENT_ITEMS` items
+between them, and read back in when they're next needed.
+"""
+
+import itertools
+import pickle
+import tempfile
+
+from . import history
+from .oops import InvalidNameError
+from .registers import MAX_NAME_LENGTH
+from .stack import StackState
+
+#: Name of the stack esc starts on.
+DEFAULT_NAME = "main"
+
+#: Number of stack items (counting undo checkpoints) that parked stacks may
+#: hold in memory before the least recently used are paged out to disk.
+MAX_RESIDENT_ITEMS = 10**6
+
+
+class Workspace:
+    """
+    A parked stack: its StackState and its undo history, or, if it's been
+    paged out, the temporary file holding them.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.ss = StackState()
+        self.history = history.HistoricalStack()
+        #: Open temporary file holding our state while paged out, else None.
+        self.page_file = None
+        #: Tick of the last switch away from this stack, for LRU paging.
+        self.last_used = 0
+
+    def __repr__(self):
+        where = "paged out" if self.is_paged_out else f"{self.size} items"
+        return f"<Workspace {self.name}: {where}>"
+
+    @property
+    def is_paged_out(self):
+        return self.page_file is not None
+
+    @property
+    def size(self):
+        "Rough measure of memory use: stack items, counting every checkpoint."
+        checkpoints = self.history.undo_stack + self.history.redo_stack
+        return len(self.ss.s) + sum(len(m['s']) for m in checkpoints)
+
+    def page_out(self):
+        "Move our state to a temporary file, freeing the memory it used."
+        page_file = tempfile.TemporaryFile()
+        pickle.dump((self.ss.__dict__, self.history.__dict__), page_file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        self.page_file = page_file
+        self.ss = self.history = None
+
+    def page_in(self):
+        "Read our state back from the temporary file, if it's paged out."
+        if not self.is_paged_out:
+            return
+        self.page_file.seek(0)
+        ss_state, history_state = pickle.load(self.page_file)
+        self.page_file.close()
+        self.page_file = None
+        self.ss = StackState.__new__(StackState)
+        self.ss.__dict__ = ss_state
+        self.history = history.HistoricalStack.__new__(history.HistoricalStack)
+        self.history.__dict__ = history_state
+
+
+class Workspaces:
+    """
+    The set of named stacks. /ss/ is the live StackState; whichever stack is
+    active has its state in /ss/ and its undo history in ``history.hs``.
+    """
+    def __init__(self, ss, name=DEFAULT_NAME):
+        self.ss = ss
+        self.active_name = name
+        #: Parked stacks by name. The active stack is not in here.
+        self._parked = {}
+        self._clock = itertools.count(1)
+
+    def __contains__(self, name):
+        return name == self.active_name or name in self._parked
+
+    def __len__(self):
+        return len(self._parked) + 1
+
+    @property
+    def names(self):
+        "Names of all stacks, sorted."
+        return sorted(list(self._parked) + [self.active_name])
+
+    def completions(self, prefix):
+        "Return the sorted names of stacks starting with /prefix/."
+        return [i for i in self.names if i.startswith(prefix)]
+
+    def _parked_workspace(self, name):
+        "Return the parked workspace /name/, creating it if it doesn't exist."
+        if len(name) > MAX_NAME_LENGTH:
+            raise InvalidNameError(
+                f"Stack names can be at most {MAX_NAME_LENGTH} characters long.")
+        workspace = self._parked.get(name)
+        if workspace is None:
+            workspace = self._parked[name] = Workspace(name)
+        workspace.page_in()
+        return workspace
+
+    def switch(self, name):
+        """
+        Make the stack /name/ the active one, creating it if it doesn't exist.
+        """
+        if name == self.active_name:
+            return
+        target = self._parked_workspace(name)
+        del self._parked[name]
+
+        # Swap the live state and the parked state. The parked objects are
+        # reused to hold the stack we're leaving.
+        hs = history.hs
+        self.ss.__dict__, target.ss.__dict__ = target.ss.__dict__, self.ss.__dict__
+        hs.__dict__, target.history.__dict__ = target.history.__dict__, hs.__dict__
+        self.ss.editing_last_item = self.ss.editing_last_item  # update status
+
+        target.name, self.active_name = self.active_name, name
+        target.last_used = next(self._clock)
+        self._parked[target.name] = target
+        self._page_out_idle()
+
+    def move_bos(self, name):
+        """
+        Move bos of the active stack to the bottom of the parked stack /name/,
+        creating it if it doesn't exist. Both stacks get an undo checkpoint
+        and a history entry.
+
+        :raises ValueError: if the active stack has an invalid number being
+            entered (see :meth:`StackState.enter_number`).
+        """
+        if name == self.active_name:
+            raise InvalidNameError("That's the stack you're already on.")
+        target = self._parked_workspace(name)
+        self.ss.enter_number()
+        item = self.ss.pop()[0]
+        self.ss.record_operation(f"{item} -> stack {name}")
+
+        target.history.checkpoint_stack(target.ss)
+        target.ss.push((item,), f"{item} <- stack {self.active_name}")
+        target.last_used = next(self._clock)
+        self._page_out_idle()
+
+    def _page_out_idle(self):
+        "Page out the least recently used parked stacks until under the limit."
+        resident = [w for w in self._parked.values() if not w.is_paged_out]
+        total = sum(w.size for w in resident)
+        for workspace in sorted(resident, key=lambda w: w.last_used):
+            if total <= MAX_RESIDENT_ITEMS:
+                break
+            total -= workspace.size
+            workspace.page_out()
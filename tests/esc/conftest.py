@@ -0,0 +1,49 @@
+"""
+Fixtures shared by the tests that drive esc through its headless display.
+"""
+
+import decimal
+
+import pytest
+
+from esc import backends
+from esc import consts
+from esc import display
+from esc import headless
+from esc.history import hs
+from esc.precision import make_context
+from esc.registers import Registry
+from esc.stack import StackState
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def session_options():
+    """
+    How to set up a :func:`session`: a dict which may give the ``precision``
+    to calculate at and ``keys`` to type before the test starts (say, to
+    switch backends). Override this fixture in a test module, or
+    parametrize it, to change them.
+    """
+    return {}
+
+
+@pytest.fixture
+def session(monkeypatch, session_options):
+    """
+    A fresh 24x80 headless screen, an empty stack and registry, and a clear
+    undo history. The precision and number backend are put back afterwards.
+    Yields (screen, stack, registry).
+    """
+    monkeypatch.setattr(display, '_SCREEN', None)
+    hs.clear()
+    precision = session_options.get('precision', consts.PRECISION)
+    with decimal.localcontext(make_context(precision)), \
+            backends.local_backend():
+        scr = headless.init(24, 80)
+        ss, registry = StackState(), Registry()
+        if 'keys' in session_options:
+            headless.run([session_options['keys']], ss, registry)
+        yield scr, ss, registry
+
@@ -0,0 +1,97 @@
+"""
+Tests for calculating with the float backend.
+"""
+
+from decimal import Decimal
+import math
+
+import pytest
+
+from esc import backends
+from esc import functest
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc.commands import main_menu
+from esc.stack import StackItem, StackSegment
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def session_options():
+    "Calculate with floats."
+    return {'precision': 28, 'keys': "nf"}
+
+
+def test_set_backend_invalid():
+    with pytest.raises(ValueError):
+        backends.set_backend('abacus')
+
+
+def test_float_arithmetic(session):
+    _, ss, registry = session
+    assert backends.get_backend() is backends.FLOAT
+    headless.run(["0.1 0.2+"], ss, registry)
+    assert ss.as_decimal() == [0.1 + 0.2]
+    assert ss.bos.string == "0.3"
+    headless.run(["2s*"], ss, registry)
+    assert isinstance(ss.bos.decimal, float)
+    assert ss.bos.decimal == pytest.approx(0.3 * 2 ** 0.5)
+
+
+@pytest.mark.parametrize('keys', ["_8 0.5^", "_2s", "1 0/", "10 400^",
+                                  "1 10 400gg", "1e300 10 100gg"])
+def test_float_errors_leave_stack_unchanged(session, keys):
+    _, ss, registry = session
+    headless.run([keys], ss, registry)
+    assert ss.operation_history == ["fast float arithmetic"]
+
+
+def test_float_modulus_follows_sign_of_dividend(session):
+    _, ss, registry = session
+    headless.run(["7 _4%"], ss, registry)
+    assert ss.as_decimal() == [3.0]
+
+
+def test_items_convert_between_backends(session):
+    "Items made under one backend are read as the other's kind of number."
+    _, ss, registry = session
+    ss.push([StackItem(decval=Decimal("1.5"))])
+    headless.run(["0.1+"], ss, registry)
+    assert ss.as_decimal() == [1.6]
+    headless.run(["nd0.2+"], ss, registry)
+    assert ss.as_decimal() == [Decimal("1.8")]
+
+
+def test_undo_restores_backend(session):
+    _, ss, registry = session
+    headless.run(["1 nd2"], ss, registry)
+    assert backends.get_backend() is backends.DECIMAL
+    headless.run(["\nu"], ss, registry)
+    assert backends.get_backend() is backends.DECIMAL
+    headless.run(["u"], ss, registry)
+    assert backends.get_backend() is backends.FLOAT
+
+
+def test_sequences_and_constants(session):
+    _, ss, registry = session
+    headless.run(["1 1000000gr$+"], ss, registry)
+    assert ss.as_decimal() == [500000500000.0]
+    headless.run(["ip2/"], ss, registry)
+    assert ss.as_decimal()[-1] == pytest.approx(1.5707963267948966)
+
+
+def test_float_segment_overflows_to_infinity():
+    "A term too large for a float is infinite, not an uncaught error."
+    segment = StackSegment(1.0, -10.0, 400, geometric=True)
+    assert segment.value(300) == 1e300
+    assert segment.value(399) == -math.inf
+
+
+def test_ensure_close_works_with_floats(session):  # pylint: disable=unused-argument
+    "Function tests written for Decimals pass under floats with close=True."
+    divide = main_menu.child('/')
+    functest.TestCase(before=[8, 3], after=[Decimal(8) / 3],
+                      close=True).execute(divide)
+    with pytest.raises(Exception):
+        functest.TestCase(before=[8, 3], after=[Decimal(8) / 3]).execute(divide)
@@ -0,0 +1,123 @@
+"""
+Tests for the Decimal square root, trigonometric functions and constants.
+"""
+
+from decimal import Decimal, getcontext, localcontext
+import math
+
+import pytest
+
+from esc import decimalmath
+from esc import functions  # pylint: disable=unused-import
+from esc.commands import main_menu
+from esc.precision import make_context
+from esc.registers import Registry
+from esc.stack import StackState
+
+PI_50 = "3.1415926535897932384626433832795028841971693993751"
+E_50 = "2.7182818284590452353602874713526624977572470937000"
+
+
+@pytest.mark.parametrize('digits', [12, 50, 500])
+def test_constants_to_precision(digits):
+    with localcontext(make_context(digits)):
+        pi, e = decimalmath.pi(), decimalmath.e()
+    with localcontext(make_context(digits + 20)):
+        more_pi, more_e = decimalmath.pi(), decimalmath.e()
+    with localcontext(make_context(digits)):
+        assert pi == +more_pi
+        assert e == +more_e
+    assert len(pi.as_tuple().digits) == digits
+
+
+def test_constants_round_correctly():
+    with localcontext(make_context(50)):
+        assert str(decimalmath.pi()) == PI_50
+        assert str(decimalmath.e()) == E_50
+    with localcontext(make_context(5)):
+        assert decimalmath.pi() == Decimal("3.1416")
+        assert decimalmath.e() == Decimal("2.7183")
+
+
+@pytest.mark.parametrize('value', ["0.5", "2", "-7", "100", "1e6", "3.14159"])
+def test_sin_cos_agree_with_float(value):
+    with localcontext(make_context(50)):
+        x = Decimal(value)
+        sin, cos = decimalmath.sin(x), decimalmath.cos(x)
+        assert abs(sin * sin + cos * cos - 1) <= Decimal("1e-49")
+        assert math.isclose(decimalmath.tan(x), math.tan(float(x)), rel_tol=1e-9)
+    assert math.isclose(sin, math.sin(float(x)), abs_tol=1e-15)
+    assert math.isclose(cos, math.cos(float(x)), abs_tol=1e-15)
+
+
+def test_sin_of_pi_multiples():
+    with localcontext(make_context(40)):
+        assert abs(decimalmath.sin(decimalmath.pi())) < Decimal("1e-39")
+        assert decimalmath.cos(decimalmath.pi()) == -1
+
+
+@pytest.mark.parametrize('value', ["0.3", "1", "-5", "1e10", "0.999"])
+def test_atan_agrees_with_float(value):
+    with localcontext(make_context(60)):
+        x = Decimal(value)
+        assert abs(decimalmath.tan(decimalmath.atan(x)) - x) <= abs(x) * Decimal("1e-45")
+    assert math.isclose(decimalmath.atan(x), math.atan(float(x)), rel_tol=1e-15)
+
+
+def test_arc_sine_and_cosine():
+    with localcontext(make_context(50)):
+        assert decimalmath.asin(Decimal("0.5")) * 6 == decimalmath.pi()
+        assert decimalmath.acos(Decimal(-1)) == decimalmath.pi()
+        assert decimalmath.acos(Decimal(1)) == 0
+        with pytest.raises(ValueError):
+            decimalmath.asin(Decimal("1.5"))
+        with pytest.raises(ValueError):
+            decimalmath.acos(Decimal(-2))
+
+
+def test_degree_conversion_round_trips():
+    with localcontext(make_context(30)):
+        assert decimalmath.degrees(decimalmath.radians(Decimal(30))) == 30
+        assert decimalmath.radians(Decimal(180)) == decimalmath.pi()
+
+
+def test_sqrt():
+    with localcontext(make_context(50)):
+        assert decimalmath.sqrt(Decimal("6.25")) == Decimal("2.5")
+        assert str(decimalmath.sqrt(Decimal(2))).startswith("1.41421356237309504880")
+    with pytest.raises(ValueError):
+        decimalmath.sqrt(Decimal(-1))
+
+
+def test_precision_cache_rounds_higher_precision_values():
+    calls = []
+
+    @decimalmath.PrecisionCache
+    def two_thirds():
+        calls.append(getcontext().prec)
+        return Decimal(2) / 3
+
+    with localcontext(make_context(40)):
+        assert two_thirds() == Decimal(2) / 3
+    with localcontext(make_context(10)):
+        assert two_thirds() == Decimal("0.6666666667")
+        assert two_thirds() == Decimal("0.6666666667")
+    with localcontext(make_context(60)):
+        assert two_thirds() == Decimal(2) / 3
+    assert calls == [40, 60]
+    assert two_thirds.precisions == [10, 40, 60]
+
+    two_thirds.clear()
+    with localcontext(make_context(10)):
+        two_thirds()
+    assert calls == [40, 60, 10]
+
+
+def test_constants_menu_inserts_at_current_precision():
+    ss, registry = StackState(), Registry()
+    constants_menu = main_menu.child('i')
+    with localcontext(make_context(50)):
+        constants_menu.child('p').execute(None, ss, registry)
+        constants_menu.child('e').execute(None, ss, registry)
+    assert ss.s[0].decimal == Decimal(PI_50)
+    assert ss.s[1].decimal == Decimal(E_50)
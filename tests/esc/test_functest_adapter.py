@@ -7,23 +7,73 @@ starting esc or running the unit tests will catch issues.
 
 # pylint: disable=invalid-name, wrong-import-order, unused-import
 
+import decimal
 import importlib
 from pathlib import Path
 import os
 
+import pytest
+
+from esc import backends
+from esc import consts
+from esc import functest
 from esc.commands import main_menu
+from esc.oops import FunctionExecutionError
+from esc.registers import Registry
+from esc.stack import StackState
 
 # Import built-in functions and official plugins, registering them on the menu.
 from esc import functions
 
 script_dir = Path(os.path.dirname(os.path.abspath(__file__)))
 pluginspath = (script_dir / '..' / '..' / 'esc-plugins').resolve()
+plugin_modules = set()
 for child in sorted(pluginspath.iterdir()):
     if child.is_file() and child.name.endswith('.py'):
         mod_name = child.name.rsplit('.', 1)[0]
         importlib.import_module(mod_name)
+        plugin_modules.add(mod_name)
 
 
 def test_functions():
     "All of our built-in functions work."
     main_menu.test()
+
+
+def _plugin_operations(menu=main_menu):
+    "Yield the operations the official plugins put on /menu/ and its submenus."
+    for child in menu.children.values():
+        if child.is_menu:
+            yield from _plugin_operations(child)
+        elif child.function.__module__ in plugin_modules:
+            yield child
+
+
+@pytest.mark.parametrize('backend', ['decimal', 'float', 'rational'])
+def test_plugins_under_each_backend(backend, monkeypatch):
+    """
+    The official plugins' operations give the results their tests expect,
+    or fail cleanly, whatever backend esc is calculating with.
+    """
+    monkeypatch.setattr(consts, 'TESTING', True)
+    operations = list(_plugin_operations())
+    assert operations
+    for operation in operations:
+        for case in operation.function.tests:
+            ss = StackState()
+            ss.push(functest.TestCase._make_stack_items(case.before))
+            with decimal.localcontext(), backends.local_backend():
+                backends.set_backend(backend)
+                try:
+                    operation.execute(None, ss, Registry())
+                except FunctionExecutionError:
+                    # Fractions have no infinity, so infinite results fail.
+                    infinite = (backend == 'rational'
+                                and not all(decimal.Decimal(i).is_finite()
+                                            for i in case.after or ()))
+                    assert case.raises is not None or infinite, (operation, case)
+                    continue
+            if case.after is not None:
+                assert ([float(i.decimal) for i in ss.s]
+                        == pytest.approx([float(i) for i in case.after])), \
+                    (operation, case)
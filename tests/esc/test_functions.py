@@ -0,0 +1,33 @@
+"""
+Tests for built-in operations, beyond the self-tests registered with them.
+"""
+
+from decimal import Decimal
+import random
+
+from esc import functions
+from esc.history import hs
+from esc.registers import Registry
+from esc.stack import StackItem, StackState
+from esc.units import UnitExpression
+
+
+def test_rearranging_keeps_items():
+    "Sorting, reversing and deduplicating reuse the StackItems on the stack."
+    hs.clear()
+    ss = StackState()
+    ss.push([StackItem(decval=Decimal(i), unit=UnitExpression({'m': 1}))
+             for i in random.sample(range(1000), 1000)])
+    before = list(ss.s)
+
+    functions.order_menu.child('a').execute(None, ss, Registry())
+    assert ss.as_decimal() == list(range(1000))
+    assert sorted(map(id, ss.s)) == sorted(map(id, before))
+    assert ss.operation_history == ["sort 1000 items ascending"]
+
+    functions.order_menu.child('r').execute(None, ss, Registry())
+    assert ss.as_decimal() == list(range(999, -1, -1))
+    assert ss.s[0] is max(before, key=lambda i: i.decimal)
+
+    assert hs.undo(ss) and hs.undo(ss)
+    assert ss.s == before
@@ -0,0 +1,269 @@
+"""
+Tests for the headless display backend, driving the real main loop.
+"""
+
+import curses
+from decimal import Decimal
+import pytest
+
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc import modes
+from esc.commands import EscMenu, ModeChange, main_menu
+from esc.registers import RegisterStore, Registry
+from esc.stack import StackItem
+from esc.workspaces import Workspaces
+
+# pylint: disable=redefined-outer-name
+
+
+def test_virtual_window_out_of_bounds():
+    "Writing outside a virtual window raises curses.error, like curses does."
+    term = headless.HeadlessTerminal(5, 10)
+    win = headless.VirtualWindow(term, 2, 4, 1, 1)
+    with pytest.raises(curses.error):
+        win.addstr(3, 0, "x")
+    with pytest.raises(curses.error):
+        win.addstr(1, 0, "12345")
+
+
+def test_refresh_blits_to_grid():
+    "Nothing is visible on the terminal until a window is refreshed."
+    term = headless.HeadlessTerminal(5, 10)
+    win = headless.VirtualWindow(term, 2, 4, 1, 1)
+    win.addstr(0, 0, "hi")
+    assert "hi" not in term.text()
+    win.refresh()
+    assert term.row(1) == " hi       "
+
+
+def test_arithmetic_end_to_end(session):
+    "Keys typed into the main loop update the stack and the screen."
+    scr, ss, registry = session
+    headless.run(["2 3+"], ss, registry)
+    assert [str(i) for i in ss] == ["5"]
+    assert "2 + 3 = 5" in scr.terminal.text()
+
+
+def test_registers_end_to_end(session):
+    "Register commands read their argument from the scripted input."
+    scr, ss, registry = session
+    headless.run(["42>a\n", "p<a\n"], ss, registry)
+    assert registry['a'].string == "42"
+    assert [str(i) for i in ss] == ["42"]
+    assert "a 42" in scr.terminal.text()
+
+
+def test_quit_ends_loop(session):
+    "'q' exits the loop even if more input is queued."
+    _, ss, registry = session
+    headless.run(["1 q2 "], ss, registry)
+    assert [str(i) for i in ss] == ["1"]
+
+
+def test_main_menu_shows_quit(session, monkeypatch):
+    "Every main menu key fits at 24x80, and quit is kept when space is short."
+    scr, ss, registry = session
+    # only the built-in commands, whatever other tests have registered
+    builtins = {k: v for k, v in main_menu.children.items()
+                if k in "+-*/^%sdxprcogniy"}
+    monkeypatch.setattr(main_menu, 'children', builtins)
+    monkeypatch.setattr(main_menu, 'generation', main_menu.generation + 1)
+    headless.run([], ss, registry)
+    assert "q quit" in scr.terminal.text()
+    assert "..." not in scr.terminal.text()
+
+    scr.terminal.simulate_resize(16, 80)
+    headless.run(["1 "], ss, registry)
+    assert "q quit" in scr.terminal.text()
+    assert "..." in scr.terminal.text()
+
+
+def test_resize(session):
+    "A simulated resize reflows the existing windows to the new size."
+    scr, ss, registry = session
+    stack_window = scr.stackw.window
+    scr.terminal.simulate_resize(16, 60)
+    headless.run(["7 "], ss, registry)
+    assert scr.commandsw.window.getmaxyx() == (15, 24)
+    assert scr.commandsw.window.getbegyx() == (1, 36)
+    assert len(scr.terminal.row(0)) == 60
+    assert scr.stackw.window is stack_window
+
+
+def test_resize_burst_coalesced(session, monkeypatch):
+    "A burst of resize events is handled with a single reflow."
+    scr, ss, registry = session
+    reflows = []
+    original_reflow = scr._reflow  # pylint: disable=protected-access
+    def counting_reflow():
+        reflows.append(scr.stdscr.getmaxyx())
+        original_reflow()
+    monkeypatch.setattr(scr, '_reflow', counting_reflow)
+
+    for width in (70, 75, 90):
+        scr.terminal.simulate_resize(24, width)
+    headless.run(["5 "], ss, registry)
+    assert reflows == [(24, 90)]
+    assert [str(i) for i in ss] == ["5"]
+
+
+def test_resize_too_small_and_back(session):
+    "Shrinking below the minimum shows a message; growing again restores esc."
+    scr, ss, registry = session
+    scr.terminal.simulate_resize(10, 40)
+    headless.run(["1 "], ss, registry)
+    assert "Terminal too small" in scr.terminal.text()
+    scr.terminal.simulate_resize(24, 80)
+    headless.run(["2 "], ss, registry)
+    assert "Terminal too small" not in scr.terminal.text()
+    assert "Registers" in scr.terminal.text()
+
+
+def test_menu_layout_cached(session):
+    "The commands window reuses its layout until the menu or modes change."
+    scr, _, _ = session
+    menu = EscMenu('z', "test menu", doc="A menu for testing.",
+                   mode_display=lambda: f"[{modes.get('headless_test')}]")
+    main_menu.register_child(menu)
+    try:
+        modes.register('headless_test', 'one', ('one', 'two'))
+        scr.display_menu(menu)
+        first = scr.commandsw._draw_list()  # pylint: disable=protected-access
+        scr.display_menu(menu)
+        assert scr.commandsw._draw_list() is first  # pylint: disable=protected-access
+
+        modes.set('headless_test', 'two')
+        scr.display_menu(menu)
+        assert "[two]" in scr.terminal.text()
+
+        ModeChange('o', 'one', menu, 'headless_test', 'one')
+        scr.display_menu(menu)
+        assert "o one" in scr.terminal.text()
+    finally:
+        del main_menu.children['z']
+        main_menu.generation += 1
+        del modes.MODES['headless_test']
+
+
+def test_mode_display_follows_backend(session):
+    "The precision menu's mode display isn't reused from the cache when stale."
+    scr, ss, registry = session
+    headless.run(["n", chr(27)], ss, registry)
+    assert "[12 digits]" in scr.terminal.text()
+    headless.run(["nfn"], ss, registry)
+    assert "[fast float]" in scr.terminal.text()
+
+
+def test_unreadable_register_reported(session, tmp_path):
+    "A register that can't be read is reported rather than crashing esc."
+    scr, ss, _ = session
+    path = tmp_path / "registers"
+    path.write_text(RegisterStore.HEADER + "a\tgarbage\n")
+    registry = Registry(RegisterStore(path))
+    headless.run([], ss, registry)
+    assert "Register 'a' couldn't be read and was set aside." in scr.terminal.text()
+    assert registry.unreadable == {'a': "garbage"}
+
+
+def test_registers_redrawn_only_on_change(session, monkeypatch):
+    "Operations that don't touch registers don't redraw the registers window."
+    scr, ss, registry = session
+    headless.run(["5>a\n"], ss, registry)
+    redraws = []
+    monkeypatch.setattr(scr.registersw, 'refresh', lambda: redraws.append(1))
+    headless.run(["3+d"], ss, registry)
+    assert not redraws
+    headless.run([">b\n"], ss, registry)
+    assert redraws
+
+
+def test_register_name_prompt(session, monkeypatch):
+    "Register names can be long, are completed by Tab, and filter the pane."
+    scr, ss, registry = session
+    headless.run(["3>rate\n", "4>radius\n", "5>total "], ss, registry)
+    assert sorted(k for k, _ in registry.items()) == ['radius', 'rate', 'total']
+
+    # Capture the screen while the prompt is still waiting for input.
+    screens = []
+    next_key = scr.terminal.next_key
+    def snapshotting_next_key():
+        screens.append(scr.terminal.text())
+        return next_key()
+    monkeypatch.setattr(scr.terminal, 'next_key', snapshotting_next_key)
+    headless.run(["<ra", "t\t\n"], ss, registry)
+    text = next(s for s in screens if "Register name: ra " in s)
+    assert "rate" in text and "radius" in text and "total" not in text
+    assert [str(i) for i in ss] == ["3", "4", "5", "3"]
+    assert "total" in scr.terminal.text()
+
+
+def test_register_name_cancelled(session):
+    "Esc or backspacing past the start cancels without touching the stack."
+    _, ss, registry = session
+    headless.run(["1>ab", chr(27), ">", chr(127)], ss, registry)
+    assert not registry
+    assert [str(i) for i in ss] == ["1"]
+    headless.run(["<nope\n"], ss, registry)
+    assert [str(i) for i in ss] == ["1"]
+
+
+def test_register_saves_batched(session, tmp_path):
+    "A burst of register stores is saved with a single write once input pauses."
+    scr, ss, _ = session
+    store = RegisterStore(tmp_path / "registers")
+    registry = Registry(store)
+    headless.run(["1>a\n2>b\n3>c\n"], ss, registry)
+    assert store.writes == 1
+    assert not registry.has_unsaved_changes
+    assert [k for k, _ in Registry(store).items()] == ['a', 'b', 'c']
+
+    headless.run(["4 "], ss, registry)
+    assert store.writes == 1
+
+
+def test_saved_registers_shown_at_startup(session, tmp_path):
+    scr, ss, _ = session
+    store = RegisterStore(tmp_path / "registers")
+    registry = Registry(store)
+    registry['saved'] = StackItem(decval=Decimal(3))
+    registry.save()
+    headless.run([], ss, Registry(store))
+    assert "saved 3" in scr.terminal.text()
+
+
+def test_stack_register(session):
+    "A whole stack is captured into one register and pushed back as a unit."
+    scr, ss, registry = session
+    ss.push([StackItem(decval=Decimal(i)) for i in range(100000)])
+    headless.run(["}big\n", "c", "1 <big\n"], ss, registry)
+    assert len(registry['big']) == 100000
+    assert "big [100000] 0, 1, 2" in scr.terminal.text()
+    assert len(ss.s) == 100001
+    assert ss.s[0].string == "1" and ss.bos.string == "99999"
+    assert ss.s[1] is registry['big'].items[0]
+
+    headless.run(["u"], ss, registry)
+    assert [str(i) for i in ss] == ["1"]
+
+
+def test_unit_tag_does_not_change_register(session):
+    "Tagging bos after storing it leaves the register's value alone."
+    _, ss, registry = session
+    headless.run(["5>a\n", "\\m\n"], ss, registry)
+    assert registry['a'].unit is None
+    assert ss.bos.unit is not None
+
+
+def test_named_stacks(session):
+    "W switches stacks, M moves bos across, and the stack window shows the name."
+    scr, ss, registry = session
+    stacks = Workspaces(ss)
+    headless.run(["1 2 3", "Mtape\n", "Wtape\n"], ss, registry, stacks)
+    assert [str(i) for i in ss] == ["3"]
+    assert "Stack: tape" in scr.terminal.text()
+    assert "3 <- stack main" in scr.terminal.text()
+
+    headless.run(["Wm\t\n"], ss, registry, stacks)
+    assert [str(i) for i in ss] == ["1", "2"]
+    assert "Stack: main" in scr.terminal.text()
@@ -0,0 +1,58 @@
+"""
+Tests for the help index and search.
+"""
+
+from esc import functions  # pylint: disable=unused-import
+from esc import helpindex
+from esc.builtin_stubs import Quit
+from esc.commands import EscMenu, Operation, main_menu
+
+
+def test_index_covers_tree():
+    "Builtins, menus, and operations in submenus are all indexed by key path."
+    index = helpindex.help_index()
+    paths = {i.key_path: i for i in index.entries}
+    assert isinstance(paths['q'].command, Quit)
+    assert paths['i'].command.is_menu
+    assert paths['i p'].menu is main_menu.child('i')
+    assert paths['^R'].description == "redo"
+
+
+def test_index_reused_until_menus_change():
+    index = helpindex.help_index()
+    assert helpindex.help_index() is index
+
+    menu = EscMenu('`', "index test", doc="A menu for testing the index.")
+    main_menu.register_child(menu)
+    try:
+        @Operation(key='f', menu=menu, push=1, description="frobnicate",
+                   simulate=False)
+        def frobnicate(bos):
+            "Apply the quux transform."
+            return bos
+
+        new_index = helpindex.help_index()
+        assert new_index is not index
+        assert [i.key_path for i in new_index.search("quux")] == ['` f']
+    finally:
+        del main_menu.children['`']
+        main_menu.generation += 1
+
+
+def test_search_ranking():
+    "Matches in descriptions beat matches in documentation; prefixes match."
+    index = helpindex.help_index()
+    results = [i.description for i in index.search("sto")]
+    assert results[:2] == ["store bos to reg", "store stack to reg"]
+    assert [i.description for i in index.search("store stack")][0] == \
+        "store stack to reg"
+    assert not index.search("store zzz")
+
+
+def test_search_by_key():
+    "A query with no words matches commands by their key."
+    index = helpindex.help_index()
+    results = index.search("+")
+    assert results[0].key_path == '+'
+    assert all(i.command.key == '+' for i in results)
+    assert not index.search("")
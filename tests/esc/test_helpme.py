@@ -2,14 +2,19 @@
 Tests for the on-line help system.
 """
 
+import curses
 from decimal import Decimal
+import threading
 import pytest
 
 from esc import builtin_stubs
 from esc import display
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
 from esc import helpme
+from esc.history import hs
 from esc.status import status
-from esc.commands import main_menu
+from esc.commands import Operation, main_menu
 from esc.registers import Registry
 from esc.stack import StackItem, StackState
 from esc.units import UnitExpression
@@ -48,6 +53,9 @@ class MockScreen:
         self.called.add('getch_status')
         return ord('q')  # get back out of help
 
+    def input_pending(self, wait_ms):  # pylint: disable=unused-argument
+        return False
+
     def refresh_stack(self, ss):
         self.called.add('refresh_stack')
 
@@ -144,3 +152,124 @@ def test_get_help_invalid_key(help_test_case, monkeypatch):
     monkeypatch.setattr(status, 'error', my_error)
     helpme.get_help('Q', main_menu, ss, registry)
     assert the_error == "There's no option 'Q' in this menu."
+
+
+def test_simulated_result_cached(monkeypatch):
+    "Simulations are reused until the stack or the registers change."
+    ss = StackState()
+    ss.push((Decimal(2), Decimal(3)))
+    registry = Registry()
+    add_op = main_menu.child('+')
+    runs = []
+    original_simulate = add_op._simulate  # pylint: disable=protected-access
+    def counting_simulate(*args):
+        runs.append(1)
+        return original_simulate(*args)
+    monkeypatch.setattr(add_op, '_simulate', counting_simulate)
+
+    first = add_op.simulated_result(ss, registry)
+    assert add_op.simulated_result(ss, registry) is first
+    assert len(runs) == 1
+
+    ss.push((Decimal(4),))
+    assert "3 + 4 = 7" in add_op.simulated_result(ss, registry)[1]
+    registry['a'] = StackItem(decval=Decimal(1))
+    add_op.simulated_result(ss, registry)
+    assert len(runs) == 3
+
+    # Simulating leaves the stack's version alone, so it stays cached.
+    version = ss.version
+    add_op.simulated_result(ss, registry)
+    assert ss.version == version
+    assert len(runs) == 3
+
+
+@pytest.fixture
+def slow_operation(session):
+    """
+    A headless session and an operation on 'K' that doesn't finish until the
+    test sets the returned event.
+    """
+    scr, _, _ = session
+    release = threading.Event()
+
+    @Operation(key='K', menu=main_menu, push=1, description="slow double")
+    def slow_double(bos):
+        release.wait(5)
+        return bos * 2
+
+    yield scr, release
+    release.set()
+    del main_menu.children['K']
+    main_menu.generation += 1
+
+
+def test_help_simulates_in_background(slow_operation, monkeypatch):
+    "Help is drawn before the simulation finishes, then filled in."
+    scr, release = slow_operation
+    ss = StackState()
+    ss.push((Decimal(21),))
+    screens = []
+    original_wait = helpme.HelpSimulation.wait
+    def snapshotting_wait(simulation, seconds):
+        screens.append(scr.terminal.text())
+        release.set()
+        original_wait(simulation, seconds)
+    monkeypatch.setattr(helpme.HelpSimulation, 'wait', snapshotting_wait)
+
+    headless.run([curses.KEY_F1, "K"], ss, Registry())
+    assert "Simulating..." in screens[0]
+    assert "    42" in scr.terminal.text()
+    assert [str(i) for i in ss] == ["21"]
+
+
+def test_help_simulation_abandoned(slow_operation, monkeypatch):
+    "A simulation that runs past the time limit is given up on."
+    scr, _ = slow_operation
+    monkeypatch.setattr(helpme, 'SIMULATION_TIME_LIMIT', 0.1)
+    ss = StackState()
+    ss.push((Decimal(21),))
+    headless.run([curses.KEY_F1, "K"], ss, Registry())
+    assert "took too long and was abandoned" in scr.terminal.text()
+    assert [str(i) for i in ss] == ["21"]
+
+
+def test_help_simulation_leaves_history_and_status_alone(session):
+    "A simulation doesn't checkpoint to the user's undo history or set the status."
+    _, ss, registry = session
+    headless.run(["1 2 3+u"], ss, registry)
+    undo, redo = len(hs.undo_stack), len(hs.redo_stack)
+    assert redo == 1
+    status.error("Keep me")
+
+    simulation = helpme.HelpSimulation(main_menu.child('+'), ss, registry)
+    simulation.wait(5)
+    assert simulation.results_info != ("An error would occur.",)
+    assert (len(hs.undo_stack), len(hs.redo_stack)) == (undo, redo)
+    assert status.status_message == "Keep me"
+    status.ready()
+
+
+def test_help_search(session, monkeypatch):
+    "F1 ? searches the help as you type; Enter shows help on the selection."
+    scr, ss, registry = session
+    screens = []
+    next_key = scr.terminal.next_key
+    def snapshotting_next_key():
+        screens.append(scr.terminal.text())
+        return next_key()
+    monkeypatch.setattr(scr.terminal, 'next_key', snapshotting_next_key)
+
+    headless.run([curses.KEY_F1, "?stor", curses.KEY_DOWN, "\n"], ss, registry)
+    listing = next(s for s in screens if "Search help: stor" in s)
+    assert "> >  store bos to reg" in listing
+    assert "  }  store stack to reg" in listing
+    assert "Copy the entire stack into a register" in scr.terminal.text()
+
+
+def test_help_search_cancelled(session):
+    "Esc leaves the search without showing any help."
+    scr, ss, registry = session
+    headless.run([curses.KEY_F1, "?x", chr(27), "1 "], ss, registry)
+    assert scr.searchw is None and scr.helpw is None
+    assert "Search" not in scr.terminal.text()
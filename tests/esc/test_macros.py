@@ -0,0 +1,121 @@
+"""
+Tests for recording and replaying keyboard macros.
+"""
+
+from decimal import Decimal
+import pytest
+
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc import macros
+from esc.commands import EscMenu, Operation, main_menu
+from esc.history import hs
+from esc.macros import Macro
+from esc.oops import FunctionExecutionError, MacroError
+from esc.registers import Registry
+from esc.stack import StackItem, StackState
+
+# pylint: disable=redefined-outer-name
+
+
+def keys(string):
+    return [ord(i) for i in string]
+
+
+@pytest.fixture
+def ss():
+    hs.clear()
+    stack = StackState()
+    stack.push([StackItem(decval=Decimal(i)) for i in (1, 2, 3)])
+    return stack
+
+
+
+@pytest.fixture(autouse=True)
+def recorder(monkeypatch):
+    "A fresh macro recorder for each test."
+    monkeypatch.setattr(macros, 'recorder', macros.MacroRecorder())
+
+
+def test_compile():
+    "Keys are resolved into entered numbers and operations."
+    macro = Macro(keys("2*_1.5 +") + [127] + keys("-"))
+    assert [getattr(i, 'string', None) for i in macro.steps] == \
+        ["2", None, "-1.5", None, None]
+    assert macro.summary == "2, *, -1.5, +, -"
+
+
+def test_compile_submenus():
+    "Operations can be chosen from submenus, and q backs out of one."
+    menu = EscMenu('`', "test menu", doc="A menu for testing.")
+    main_menu.register_child(menu)
+    try:
+        @Operation(key='t', menu=menu, push=1, description="triple it")
+        def triple(bos):  # pylint: disable=unused-variable
+            return bos * 3
+        assert Macro(keys("`q2`t")).summary == "2, triple it"
+    finally:
+        del main_menu.children['`']
+        main_menu.generation += 1
+
+
+@pytest.mark.parametrize('recorded', ["", "5<", "1.2.3 "])
+def test_compile_invalid(recorded):
+    with pytest.raises(MacroError):
+        Macro(keys(recorded))
+
+
+def test_replay_is_one_step(ss):
+    "Replaying any number of times is one undo step and one history line."
+    registry = Registry()
+    Macro(keys("2*")).replay(ss, registry, times=3)
+    assert ss.as_decimal() == [1, 2, 24]
+    assert ss.operation_history == ["Macro [2, *] x 3"]
+    assert hs.undo(ss)
+    assert ss.as_decimal() == [1, 2, 3]
+    assert not hs.undo(ss)
+
+
+def test_replay_failure_rolls_back(ss):
+    "If a step fails partway through, nothing is changed."
+    with pytest.raises(FunctionExecutionError):
+        Macro(keys("+")).replay(ss, Registry(), times=5)
+    assert ss.as_decimal() == [1, 2, 3]
+    assert not ss.operation_history
+
+
+def test_replay_over_items(ss):
+    "Each item gets the macro to itself."
+    Macro(keys("d*1+")).replay_over_items(ss, Registry())
+    assert ss.as_decimal() == [2, 5, 10]
+    assert ss.operation_history == ["Macro [duplicate bos, *, 1, +] on 3 items"]
+    assert hs.undo(ss)
+    assert ss.as_decimal() == [1, 2, 3]
+
+
+def test_replay_over_no_items():
+    with pytest.raises(FunctionExecutionError):
+        Macro(keys("1+")).replay_over_items(StackState(), Registry())
+
+
+def test_record_and_replay_end_to_end(session):
+    "[ starts and stops recording; @ replays, taking a count."
+    _, ss, registry = session
+    headless.run(["3[2*1+[", "@2\n"], ss, registry)
+    assert ss.as_decimal() == [31]
+    assert macros.recorder.macro.summary == "2, *, 1, +"
+    headless.run(["u"], ss, registry)
+    assert ss.as_decimal() == [7]
+
+
+def test_replay_over_items_end_to_end(session):
+    _, ss, registry = session
+    headless.run(["1 2 3[d*[", "uu", "@*"], ss, registry)
+    assert ss.as_decimal() == [1, 4, 9]
+
+
+def test_invalid_recording_keeps_old_macro(session):
+    scr, ss, registry = session
+    headless.run(["[5+[", "[>a\n["], ss, registry)
+    assert macros.recorder.macro.summary == "5, +"
+    assert "Macro not recorded" in scr.terminal.text()
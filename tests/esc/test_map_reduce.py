@@ -0,0 +1,187 @@
+"""
+Tests for running an operation over many stack items at once.
+"""
+
+from decimal import Decimal
+import pytest
+
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc import mapreduce
+from esc.commands import main_menu
+from esc.history import hs
+from esc.oops import FunctionExecutionError, InsufficientItemsError, UnitError
+from esc.registers import Registry
+from esc.stack import StackItem, StackState
+from esc.units import UnitExpression
+
+# pylint: disable=redefined-outer-name
+
+
+def make_stack(*values, unit=None):
+    ss = StackState()
+    ss.push([StackItem(decval=Decimal(i), unit=unit) for i in values])
+    return ss
+
+
+
+def test_map():
+    "Each item is replaced by the result, in one step of history."
+    hs.clear()
+    ss = make_stack(4, 9, 16)
+    mapreduce.map_over(main_menu.child('s'), ss, Registry())
+    assert ss.as_decimal() == [2, 3, 4]
+    assert ss.operation_history == ["s mapped over 3 items"]
+    assert hs.undo(ss)
+    assert ss.as_decimal() == [4, 9, 16]
+
+
+def test_map_last_n():
+    ss = make_stack(4, 9, 16)
+    mapreduce.map_over(main_menu.child('s'), ss, Registry(), count=2)
+    assert ss.as_decimal() == [4, 3, 4]
+    with pytest.raises(InsufficientItemsError):
+        mapreduce.map_over(main_menu.child('s'), ss, Registry(), count=4)
+
+
+def test_map_units_computed_once(monkeypatch):
+    "Result units are worked out once per distinct unit."
+    ss = make_stack(4, 9, 16, unit=UnitExpression({'m': 2}))
+    operation = main_menu.child('s')
+    calls = []
+    original = operation._compute_result_units  # pylint: disable=protected-access
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(operation, '_compute_result_units', counting)
+    mapreduce.map_over(operation, ss, Registry())
+    assert len(calls) == 1
+    assert all(i.unit == UnitExpression({'m': 1}) for i in ss.s)
+
+
+def test_map_failure_rolls_back():
+    "A domain error on any item leaves the stack alone."
+    ss = make_stack(4, -9, 16)
+    with pytest.raises(FunctionExecutionError):
+        mapreduce.map_over(main_menu.child('s'), ss, Registry())
+    assert ss.as_decimal() == [4, -9, 16]
+
+
+def test_map_needs_unary_operation():
+    ss = make_stack(1, 2)
+    with pytest.raises(FunctionExecutionError):
+        mapreduce.map_over(main_menu.child('+'), ss, Registry())
+
+
+def test_map_unit_error_and_override():
+    "A unit error can be overridden the same way as for a single operation."
+    ss = make_stack(1, 4, unit=UnitExpression({'m': 1}))
+    with pytest.raises(UnitError):
+        mapreduce.map_over(main_menu.child('s'), ss, Registry())
+    mapreduce.map_over(main_menu.child('s'), ss, Registry(), unit_override=True)
+    assert ss.as_decimal() == [1, 2]
+    assert all(i.unit is None for i in ss.s)
+
+
+def test_map_end_to_end(session):
+    "& chooses an operation, optionally after a count."
+    _, ss, registry = session
+    headless.run(["4 9 16&s"], ss, registry)
+    assert ss.as_decimal() == [2, 3, 4]
+    headless.run(["&2d"], ss, registry)
+    assert ss.as_decimal() == [2, 3, 4]
+    headless.run(["&1s"], ss, registry)
+    assert ss.as_decimal() == [2, 3, 2]
+
+
+def test_map_cancelled(session):
+    _, ss, registry = session
+    headless.run(["4 9 &", chr(27), "&q"], ss, registry)
+    assert ss.as_decimal() == [4, 9]
+
+
+def test_reduce():
+    hs.clear()
+    ss = make_stack(1, 2, 3, 4)
+    mapreduce.reduce_over(main_menu.child('-'), ss, Registry())
+    assert ss.as_decimal() == [-8]
+    assert ss.operation_history == ["- reduced over 4 items = -8"]
+    assert hs.undo(ss)
+    assert ss.as_decimal() == [1, 2, 3, 4]
+
+
+def test_scan():
+    ss = make_stack(5, 1, 2, 3)
+    mapreduce.reduce_over(main_menu.child('+'), ss, Registry(), count=3, scan=True)
+    assert ss.as_decimal() == [5, 1, 3, 6]
+    assert ss.operation_history == ["+ scanned over 3 items"]
+
+
+def test_reduce_needs_binary_operation():
+    ss = make_stack(4, 9)
+    with pytest.raises(FunctionExecutionError):
+        mapreduce.reduce_over(main_menu.child('s'), ss, Registry())
+    with pytest.raises(InsufficientItemsError):
+        mapreduce.reduce_over(main_menu.child('+'), make_stack(1), Registry())
+    assert ss.as_decimal() == [4, 9]
+
+
+def test_reduce_folds_units():
+    "Units are combined in one pass, not step by step."
+    meters = UnitExpression({'m': 1})
+    ss = make_stack(1, 2, 3, 4, unit=meters)
+    mapreduce.reduce_over(main_menu.child('*'), ss, Registry(), scan=True)
+    assert [i.string_with_units for i in ss.s] == \
+        ["1 m", "2 m^2", "6 m^3", "24 m^4"]
+
+    ss = make_stack(1, 2, unit=meters)
+    ss.push([StackItem(decval=Decimal(3), unit=UnitExpression({'s': 1}))])
+    with pytest.raises(UnitError):
+        mapreduce.reduce_over(main_menu.child('+'), ss, Registry())
+    mapreduce.reduce_over(main_menu.child('+'), ss, Registry(), unit_override=True)
+    assert ss.s[0].string_with_units == "6"
+
+
+def test_reduce_pairwise_units(monkeypatch):
+    "Handlers that can't fold are called once per distinct pair of units."
+    ss = make_stack(1, 2, 3, 4, unit=UnitExpression({'m': 1}))
+    operation = main_menu.child('+')
+    monkeypatch.delattr(type(operation.unit_handling), 'fold')
+    calls = []
+    original = operation._compute_result_units  # pylint: disable=protected-access
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(operation, '_compute_result_units', counting)
+    mapreduce.reduce_over(operation, ss, Registry())
+    assert len(calls) == 1
+    assert ss.s[0].string_with_units == "10 m"
+
+
+def test_reduce_and_scan_end_to_end(session):
+    _, ss, registry = session
+    headless.run(["1 2 3 4$*"], ss, registry)
+    assert ss.as_decimal() == [24]
+    headless.run(["1 2 3#2+"], ss, registry)
+    assert ss.as_decimal() == [24, 1, 2, 5]
+
+
+def test_reduce_sequence_closed_form(session):
+    "Summing a generated sequence doesn't make its items."
+    _, ss, registry = session
+    headless.run(["1 1000000gr"], ss, registry)
+    assert len(ss.s) == 10**6
+    headless.run(["$+"], ss, registry)
+    assert ss.as_decimal() == [500000500000]
+    assert ss.last_operation == "+ reduced over 1000000 items = 500000500000"
+    headless.run(["u"], ss, registry)
+    assert len(ss.s) == 10**6
+
+
+def test_reduce_geometric_sequence_with_units():
+    ss = StackState()
+    ss.push([StackItem(decval=Decimal(1), unit=UnitExpression({'m': 1})),
+             Decimal(2), Decimal(10)])
+    functions.sequence_menu.child('g').execute(None, ss, Registry())
+    mapreduce.reduce_over(main_menu.child('+'), ss, Registry())
+    assert ss.s[0].string_with_units == "1023 m"
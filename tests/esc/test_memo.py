@@ -0,0 +1,97 @@
+from decimal import Decimal, localcontext
+import pytest
+
+from esc import backends, memo, modes
+from esc.commands import EscMenu, Operation
+from esc.oops import ProgrammingError
+from esc.registers import Registry
+from esc.stack import StackItem, StackState
+from esc.units import UnitExpression, preserve_unit_handling
+
+# pylint: disable=redefined-outer-name
+
+test_menu = EscMenu('m', "memo tests", doc="Operations for testing the cache.")
+calls = []
+
+
+@Operation('h', menu=test_menu, push=1, description="half", pure=True,
+           unit_handling=preserve_unit_handling())
+def half(bos):
+    calls.append(bos)
+    return bos / 2
+
+
+@Operation('i', menu=test_menu, push=1, description="impure half")
+def impure_half(bos):
+    calls.append(bos)
+    return bos / 2
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    memo.result_cache.clear()
+    calls.clear()
+    yield
+    memo.result_cache.clear()
+
+
+def run(key, *items):
+    ss = StackState()
+    ss.push(items)
+    test_menu.child(key).execute(key, ss, Registry())
+    return ss.bos
+
+
+def test_repeated_calls_hit():
+    op = test_menu.child('h')
+    assert run('h', StackItem(decval=Decimal(3))).decimal == Decimal('1.5')
+    assert run('h', StackItem(decval=Decimal(3))).decimal == Decimal('1.5')
+    assert calls == [3]
+    assert memo.result_cache.stats(op) == (1, 1)
+    assert "1 hits, 1 misses" in op.signature_info[-1]
+
+
+def test_impure_not_cached():
+    run('i', StackItem(decval=Decimal(3)))
+    run('i', StackItem(decval=Decimal(3)))
+    assert len(calls) == 2
+    assert len(memo.result_cache) == 0
+
+
+def test_key_distinguishes_inputs():
+    "Representation, units, precision, modes and backend separate cache entries."
+    run('h', StackItem(decval=Decimal(2)))
+    run('h', StackItem(decval=Decimal('2.0')))
+    run('h', StackItem(decval=Decimal(2), unit=UnitExpression({'m': 1})))
+    with localcontext() as ctx:
+        ctx.prec = 40
+        run('h', StackItem(decval=Decimal(2)))
+    modes.register('memo_test', 'a', ('a', 'b'))
+    try:
+        run('h', StackItem(decval=Decimal(2)))
+        modes.set('memo_test', 'b')
+        run('h', StackItem(decval=Decimal(2)))
+        modes.set('memo_test', 'a')
+        run('h', StackItem(decval=Decimal(2)))
+    finally:
+        del modes.MODES['memo_test']
+    with backends.local_backend():
+        backends.set_backend('float')
+        run('h', StackItem(decval=Decimal(2)))
+    assert len(calls) == 7
+
+
+def test_cache_bounded(monkeypatch):
+    monkeypatch.setattr(memo.result_cache, 'maxsize', 3)
+    for i in range(5):
+        run('h', StackItem(decval=Decimal(i)))
+    assert len(memo.result_cache) == 3
+    run('h', StackItem(decval=Decimal(0)))
+    assert calls == [0, 1, 2, 3, 4, 0]
+
+
+def test_pure_cannot_take_registry():
+    with pytest.raises(ProgrammingError):
+        @Operation('r', menu=test_menu, push=1, description="bad", pure=True)
+        def bad(bos, registry):  # pylint: disable=unused-argument
+            return bos
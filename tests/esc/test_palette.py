@@ -0,0 +1,85 @@
+"""
+Tests for the command palette.
+"""
+
+import itertools
+from decimal import Decimal
+import pytest
+
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc import palette
+from esc.commands import EscMenu, Operation, main_menu
+
+# pylint: disable=redefined-outer-name
+
+CTRL_P = 0x10
+
+
+@pytest.fixture
+def deep_menus():
+    "Nested menus with a hundred operations at the bottom."
+    top = EscMenu('`', "palette tests", doc="Menus for testing the palette.")
+    main_menu.register_child(top)
+    inner = EscMenu('m', "inner", doc="A nested menu.")
+    top.register_child(inner)
+    submenus = {}
+    for a in "abcdefghij":
+        submenus[a] = EscMenu(a, f"submenu {a}", doc="A deeper menu.")
+        inner.register_child(submenus[a])
+    for n, (a, b) in enumerate(itertools.product("abcdefghij", repeat=2)):
+        Operation(key=b, menu=submenus[a], push=1, simulate=False,
+                  description=f"operation {a}{b} number {n}")(
+                      lambda bos: bos)
+    @Operation(key='t', menu=inner, push=1, description="triple it")
+    def triple(bos):
+        "Multiply the bottom of the stack by three, for tripling."
+        return bos * 3
+
+    yield inner
+    del main_menu.children['`']
+    main_menu.generation += 1
+
+
+def test_fuzzy_matching(deep_menus):
+    "Letters in order match; whole words rank first; long words search docs."
+    finder = palette.FuzzyFinder()
+    assert [i.key_path for i in finder.search("trip")] == ['` m t']
+    assert finder.search("tpl")[0].key_path == '` m t'
+    assert '` m t' in [i.key_path for i in finder.search("multiply")]
+    assert finder.search("exch")[0].key_path == 'x'
+    # too short to look in documentation
+    assert '` m t' not in [i.key_path for i in finder.search("mu")]
+    assert not finder.search("zzz")
+
+
+def test_narrowing_matches_fresh_search(deep_menus):
+    "Searching as the user types gives the same results as searching afresh."
+    finder = palette.FuzzyFinder()
+    query = ""
+    for char in "op 1 multip":
+        query += char
+        narrowed = finder.search(query, limit=None)
+        assert narrowed == palette.FuzzyFinder().search(query, limit=None)
+    assert sum(1 for i in finder.search("operation", limit=None)
+               if i.keys[:2] == ('`', 'm')) == 100
+    assert len(finder.search("operation", limit=10)) == 10
+
+
+def test_palette_runs_operation(deep_menus, session):
+    "^P, part of a name, and Enter run an operation deep in the menus."
+    scr, ss, registry = session
+    headless.run(["7 ", CTRL_P, "triple\n"], ss, registry)
+    assert [str(i) for i in ss] == ["21"]
+    assert scr.searchw is None
+    assert "Find Command" not in scr.terminal.text()
+
+    headless.run(["u"], ss, registry)
+    assert [str(i) for i in ss] == ["7"]
+
+
+def test_palette_cancelled(session):
+    _, ss, registry = session
+    ss.push((Decimal(2), Decimal(3)))
+    headless.run([CTRL_P, "+", chr(27)], ss, registry)
+    assert [str(i) for i in ss] == ["2", "3"]
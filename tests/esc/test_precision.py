@@ -0,0 +1,70 @@
+"""
+Tests for changing the precision and showing long results.
+"""
+
+import curses
+import decimal
+import threading
+
+import pytest
+
+from esc import consts
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc.precision import get_precision, make_context, set_precision
+
+# pylint: disable=redefined-outer-name
+
+
+def test_set_precision_is_per_session():
+    "Changing the precision doesn't affect other threads."
+    seen = []
+    with decimal.localcontext(make_context(12)):
+        set_precision(40)
+        thread = threading.Thread(target=lambda: seen.append(get_precision()))
+        thread.start()
+        thread.join()
+        assert get_precision() == 40
+    assert seen == [decimal.DefaultContext.prec]
+
+
+def test_set_precision_invalid():
+    with pytest.raises(ValueError):
+        set_precision(0)
+    with pytest.raises(ValueError):
+        set_precision(decimal.Decimal("12.5"))
+
+
+def test_undo_restores_precision(session):
+    "The precision is part of each undo checkpoint."
+    _, ss, registry = session
+    headless.run(["nh1 3/"], ss, registry)
+    assert get_precision() == 50
+    assert len(ss.bos.string) == 52
+    headless.run(["uu"], ss, registry)
+    assert get_precision() == 50
+    headless.run(["u"], ss, registry)
+    assert get_precision() == consts.PRECISION
+    headless.run([0x12], ss, registry)  # ^R
+    assert get_precision() == 50
+
+
+def test_long_results_scroll(session):
+    "Numbers too long for the stack window can be scrolled across."
+    scr, ss, registry = session
+    headless.run(["nv2 3/"], ss, registry)
+    row = scr.terminal.row(2)
+    assert "0.6666" in row and "...|" in row
+    headless.run([curses.KEY_RIGHT], ss, registry)
+    assert "|...6666" in scr.terminal.row(2)
+    headless.run([curses.KEY_LEFT], ss, registry)
+    assert "|0.6666" in scr.terminal.row(2)
+
+
+def test_long_entry_shows_its_end(session):
+    "While a long number is typed in, its last digits stay in view."
+    scr, ss, registry = session
+    headless.run(["nh", "1234567890" * 4 + "5"], ss, registry)
+    assert "|...456789012345678905 |" in scr.terminal.row(2)
+    headless.run(["\n"], ss, registry)
+    assert ss.bos.string == "1234567890" * 4 + "5"
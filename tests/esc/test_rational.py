@@ -0,0 +1,97 @@
+"""
+Tests for calculating with the exact rational backend.
+"""
+
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from esc import backends
+from esc import functions  # pylint: disable=unused-import
+from esc import headless
+from esc.stack import StackItem
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def session_options():
+    "Calculate exactly."
+    return {'keys': "nr"}
+
+
+def test_division_chain_is_exact(session):
+    _, ss, registry = session
+    assert backends.get_backend() is backends.RATIONAL
+    headless.run(["1 3/"], ss, registry)
+    assert ss.as_decimal() == [Fraction(1, 3)]
+    assert ss.bos.string == "1/3"
+    headless.run(["3*"], ss, registry)
+    assert ss.as_decimal() == [Fraction(1)]
+    assert ss.bos.string == "1"
+
+
+def test_long_chain_stays_in_lowest_terms(session):
+    "Sum 1/(k(k+1)) for k = 1..200, which telescopes to 200/201."
+    _, ss, registry = session
+    headless.run(["0"], ss, registry)
+    for k in range(1, 201):
+        headless.run([f"1 {k} {k + 1}*/+"], ss, registry)
+    assert ss.as_decimal() == [Fraction(200, 201)]
+    assert ss.bos.string == "200/201"
+
+
+def test_display(session):
+    _, ss, registry = session
+    headless.run(["1 8/ 2 3/ 1 7 10 30^*/"], ss, registry)
+    # Exact decimals are shown as decimals, and fractions too long to read
+    # as the decimal nearest them.
+    assert [i.string for i in ss.s] == ["0.125", "2/3", "1.42857142857e-31"]
+    assert ss.bos.decimal == Fraction(1, 7 * 10 ** 30)
+
+
+def test_inexact_operations_round(session):
+    _, ss, registry = session
+    headless.run(["2s"], ss, registry)
+    assert ss.bos.decimal == Fraction(Decimal("1.41421356237"))
+    headless.run(["c 2 0.5^"], ss, registry)
+    assert ss.bos.decimal == Fraction(Decimal("1.41421356237"))
+    headless.run(["c 2 3/ _2^"], ss, registry)
+    assert ss.bos.decimal == Fraction(2, 3) ** -2
+
+
+@pytest.mark.parametrize('keys', ["_8 0.5^", "_2s", "1 0/", "1 0%"])
+def test_rational_errors_leave_stack_unchanged(session, keys):
+    _, ss, registry = session
+    headless.run([keys], ss, registry)
+    assert ss.operation_history == ["exact rational arithmetic"]
+
+
+def test_rational_modulus_follows_sign_of_dividend(session):
+    _, ss, registry = session
+    headless.run(["7 _4% 1 3/ 1 4/%"], ss, registry)
+    assert ss.as_decimal() == [Fraction(3), Fraction(1, 12)]
+
+
+def test_items_convert_from_other_backends(session):
+    _, ss, registry = session
+    ss.push([StackItem(decval=Decimal("0.1")), StackItem(decval=0.2)])
+    headless.run(["+"], ss, registry)
+    assert ss.as_decimal() == [Fraction(3, 10)]
+
+
+def test_undo_restores_backend(session):
+    _, ss, registry = session
+    headless.run(["1 3/ nd"], ss, registry)
+    assert backends.get_backend() is backends.DECIMAL
+    headless.run(["u"], ss, registry)
+    assert backends.get_backend() is backends.RATIONAL
+
+
+def test_switching_back_to_decimal(session):
+    "Fractions left on the stack are read as Decimals after switching back."
+    _, ss, registry = session
+    headless.run(["1 3/ nd 3*"], ss, registry)
+    assert backends.get_backend() is backends.DECIMAL
+    assert ss.as_decimal() == [Decimal("0.999999999999")]
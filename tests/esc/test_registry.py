@@ -1,9 +1,11 @@
 from decimal import Decimal
 import pytest
 
+from esc import registers
 from esc.oops import InvalidNameError
-from esc.registers import Registry
-from esc.stack import StackItem
+from esc.registers import RegisterStore, Registry
+from esc.stack import StackItem, StackSlice
+from esc.units import UnitExpression
 
 # pylint: disable=redefined-outer-name
 
@@ -34,7 +36,7 @@ def test_iteritems(sample_registry):
     assert needed_pairs == actual_pairs
 
 
-test_names = ['0', 'aa', '+']
+test_names = ['0', '', '+', '_a', 'a b', 'a' * 33]
 @pytest.mark.parametrize("name", test_names)
 def test_setitem_invalid_name(sample_registry, name):
     with pytest.raises(InvalidNameError):
@@ -64,3 +66,167 @@ def test_delete_all(sample_registry):
 
     assert not sample_registry
     assert len(sample_registry) == 0
+
+
+def test_items_sorted_after_changes(sample_registry):
+    "The sorted index stays correct as registers are added and removed."
+    sample_registry['Z'] = StackItem(decval=Decimal(1))
+    sample_registry['c'] = StackItem(decval=Decimal(2))
+    del sample_registry['a']
+    sample_registry['b'] = StackItem(decval=Decimal(3))
+    assert [k for k, _ in sample_registry.items()] == ['Z', 'b', 'c']
+
+
+def test_change_notifications(sample_registry):
+    "Setting or deleting a register bumps the generation and calls listeners."
+    changed = []
+    sample_registry.add_listener(changed.append)
+    generation = sample_registry.generation
+
+    sample_registry['c'] = StackItem(decval=Decimal(2))
+    del sample_registry['a']
+    assert changed == ['c', 'a']
+    assert sample_registry.generation == generation + 2
+
+    with pytest.raises(InvalidNameError):
+        sample_registry['0'] = StackItem(decval=Decimal(2))
+    assert sample_registry.generation == generation + 2
+
+
+def test_multicharacter_names(sample_registry):
+    sample_registry['rate'] = StackItem(decval=Decimal(7))
+    sample_registry['x_2'] = StackItem(decval=Decimal(8))
+    assert sample_registry['rate'].string == "7"
+    assert [k for k, _ in sample_registry.items()] == ['a', 'b', 'rate', 'x_2']
+
+
+def test_prefix_lookups():
+    "Prefix queries only look at the matching run of the sorted index."
+    reg = Registry()
+    for i in range(10**4):
+        reg[f"r{i}"] = StackItem(decval=Decimal(i))
+    reg['rate'] = StackItem(decval=Decimal(1))
+    reg['s'] = StackItem(decval=Decimal(2))
+
+    assert reg.count() == 10**4 + 2
+    assert reg.count('r') == 10**4 + 1
+    assert reg.count('r99') == 111
+    assert reg.count('q') == 0
+    assert reg.completions('ra') == ['rate']
+    assert reg.completions('r999') == ['r999', 'r9990', 'r9991', 'r9992',
+                                       'r9993', 'r9994', 'r9995', 'r9996',
+                                       'r9997', 'r9998', 'r9999']
+    assert reg.completions('r', limit=3) == ['r0', 'r1', 'r10']
+    assert [k for k, _ in reg.items('s')] == ['s']
+
+
+def test_store_round_trip(tmp_path):
+    "Values and units survive a trip through the on-disk store."
+    path = tmp_path / "registers"
+    reg = Registry(RegisterStore(path))
+    reg['speed'] = StackItem(decval=Decimal('12.3456789012345'),
+                             unit=UnitExpression({'m': 1, 's': -1}))
+    reg['n'] = StackItem(decval=Decimal(7))
+    reg['z'] = StackItem(decval=Decimal(0), unit=UnitExpression({}))
+    assert reg.has_unsaved_changes
+    reg.save()
+    assert not reg.has_unsaved_changes
+
+    loaded = Registry(RegisterStore(path))
+    assert [k for k, _ in loaded.items()] == ['n', 'speed', 'z']
+    assert loaded['speed'].decimal == Decimal('12.3456789012345')
+    assert loaded['speed'].unit == UnitExpression({'m': 1, 's': -1})
+    assert loaded['n'].unit is None
+    assert loaded['z'].unit is not None and loaded['z'].unit.is_unitless
+
+
+def test_store_round_trip_stack_slice(tmp_path):
+    path = tmp_path / "registers"
+    reg = Registry(RegisterStore(path))
+    reg['v'] = StackSlice([StackItem(decval=Decimal(1)),
+                           StackItem(decval=Decimal(2), unit=UnitExpression({'m': 1}))])
+    reg.save()
+
+    loaded = Registry(RegisterStore(path))['v']
+    assert isinstance(loaded, StackSlice)
+    assert [i.decimal for i in loaded] == [1, 2]
+    assert loaded.items[1].unit == UnitExpression({'m': 1})
+
+
+def test_store_decodes_lazily(tmp_path, monkeypatch):
+    "Only recalled registers are decoded; the rest are written back verbatim."
+    path = tmp_path / "registers"
+    reg = Registry(RegisterStore(path))
+    for i in range(1000):
+        reg[f"r{i}"] = StackItem(decval=Decimal(i))
+    reg.save()
+
+    decoded = []
+    original_decode = registers.decode_item
+    def counting_decode(encoded):
+        decoded.append(encoded)
+        return original_decode(encoded)
+    monkeypatch.setattr(registers, 'decode_item', counting_decode)
+
+    loaded = Registry(RegisterStore(path))
+    assert len(loaded) == 1000 and 'r500' in loaded
+    assert not decoded
+    assert loaded['r500'].decimal == 500
+    assert len(decoded) == 1
+
+    loaded['r500'] = StackItem(decval=Decimal(-1))
+    loaded.save()
+    assert len(decoded) == 1
+    assert Registry(RegisterStore(path))['r500'].decimal == -1
+
+
+def test_store_write_is_atomic(tmp_path, monkeypatch):
+    "A failed write leaves the previous store in place and no temporary files."
+    path = tmp_path / "registers"
+    reg = Registry(RegisterStore(path))
+    reg['a'] = StackItem(decval=Decimal(1))
+    reg.save()
+    before = path.read_text()
+
+    def failing_replace(src, dst):
+        raise OSError("disk on fire")
+    monkeypatch.setattr(registers.os, 'replace', failing_replace)
+    reg['b'] = StackItem(decval=Decimal(2))
+    with pytest.raises(OSError):
+        reg.save()
+    assert path.read_text() == before
+    assert [p.name for p in tmp_path.iterdir()] == ['registers']
+
+
+def test_store_missing_file(tmp_path):
+    reg = Registry(RegisterStore(tmp_path / "nonexistent" / "registers"))
+    assert not reg
+    reg['a'] = StackItem(decval=Decimal(1))
+    reg.save()
+    assert 'a' in Registry(RegisterStore(tmp_path / "nonexistent" / "registers"))
+
+
+def test_store_unreadable_entry_set_aside(tmp_path):
+    "An entry that can't be decoded is skipped, but kept in the file."
+    path = tmp_path / "registers"
+    path.write_text(RegisterStore.HEADER + "a\tgarbage\n"
+                    'b\t{"value": "2", "unit": null}\n'
+                    'c\t{"value": "1/3", "unit": null}\n')
+    reg = Registry(RegisterStore(path))
+    assert [(k, v.decimal) for k, v in reg.items()] == [('b', 2)]
+    assert 'a' not in reg and len(reg) == 1
+    assert sorted(reg.newly_unreadable()) == ['a', 'c']
+    assert not reg.newly_unreadable()
+
+    reg['d'] = StackItem(decval=Decimal(4))
+    reg.save()
+    assert path.read_text().splitlines()[1:] == [
+        "a\tgarbage",
+        'b\t{"value": "2", "unit": null}',
+        'c\t{"value": "1/3", "unit": null}',
+        'd\t{"value": "4", "unit": null}']
+
+    # Storing to the name replaces the unreadable value.
+    reg['a'] = StackItem(decval=Decimal(1))
+    reg.save()
+    assert Registry(RegisterStore(path))['a'].decimal == 1
@@ -1,7 +1,8 @@
-from decimal import Decimal
+from decimal import Decimal, localcontext
 import pytest
 
 from esc import consts
+from esc.precision import make_context
 from esc.stack import StackItem
 
 # pylint: disable=invalid-name
@@ -44,15 +45,23 @@ def test_stackitem_friendlystring(input_, output):
 test_items = [
     "23",
     23,
-    23.0
 ]
 @pytest.mark.parametrize('val', test_items)
 def test_stackitem_nondecimal(val):
-    "We can't initialize with numbers that aren't of type Decimal."
+    "We can't initialize with numbers that aren't of type Decimal (or float)."
     with pytest.raises(TypeError):
         StackItem(decval=val)
 
 
+def test_stackitem_float():
+    "Items made under the float backend hold a float, shown to 15 digits."
+    si = StackItem(decval=0.1 + 0.2)
+    assert si.decimal == 0.1 + 0.2
+    assert si.string == "0.3"
+    assert StackItem(decval=1e20).string == "100000000000000000000"
+    assert StackItem(decval=1e-7).string == "1e-7"
+
+
 def test_stackitem_string_input():
     "Try entering a moderately complex number."
     si = StackItem(firstchar="2")
@@ -143,9 +152,20 @@ def test_stackitem_invalid_character():
 
 def test_stackitem_too_wide():
     """
-    We can only add characters up to the STACKWIDTH.
+    At the standard precision, we can only add characters up to the STACKWIDTH.
     """
-    si = StackItem(firstchar='1')
-    for _ in range(consts.STACKWIDTH - 1):
-        assert si.add_character('2')
-    assert not si.add_character('3')
+    with localcontext(make_context(consts.PRECISION)):
+        si = StackItem(firstchar='1')
+        for _ in range(consts.STACKWIDTH - 1):
+            assert si.add_character('2')
+        assert not si.add_character('3')
+
+
+def test_stackitem_width_follows_precision():
+    "Higher precisions leave room to type in more digits."
+    with localcontext(make_context(100)):
+        si = StackItem(firstchar='1')
+        for _ in range(99):
+            assert si.add_character('2')
+        assert si.finish_entry()
+        assert len(si.string) == 100
@@ -3,7 +3,7 @@ from decimal import Decimal
 
 import pytest
 from esc.oops import RollbackTransaction
-from esc.stack import StackItem, StackState
+from esc.stack import StackItem, StackSegment, StackSlice, StackState
 from esc.util import decimalize_iterable
 
 # pylint: disable=redefined-outer-name
@@ -199,6 +199,29 @@ def test_memento_restore(sample_stack):
     assert orig_stack == sample_stack
 
 
+def test_memento_shares_entered_items(sample_stack):
+    "Entered items are shared with the memento; the one being typed is not."
+    sample_stack.add_character('7')
+    memento = sample_stack.memento()
+    assert memento['s'][0] is sample_stack.s[0]
+    assert memento['s'] is not sample_stack.s
+
+    sample_stack.add_character('5')
+    sample_stack.push((Decimal("1"),))
+    sample_stack.restore(memento)
+    assert [i.string for i in sample_stack] == ["2", "4", "7"]
+    assert sample_stack.editing_last_item
+
+
+def test_stack_slice(sample_stack):
+    stack_slice = StackSlice(sample_stack.s)
+    assert len(stack_slice) == 2
+    assert stack_slice.items[1] is sample_stack.bos
+    assert stack_slice.string == "[2] 2, 4"
+    sample_stack.clear()
+    assert len(stack_slice) == 2
+
+
 def test_transaction_success(sample_stack):
     assert sample_stack.bos.string == "4"
     with sample_stack.transaction():
@@ -223,3 +246,35 @@ def test_transaction_exception(sample_stack):
             sample_stack.push((Decimal("86"),))
             raise ValueError("I don't like the number 86!")
     assert sample_stack.bos.string == "4"
+
+
+## Segments
+def test_segment_stays_virtual(sample_stack):
+    "A pushed segment is counted and indexed without making all its items."
+    sample_stack.push_segment(StackSegment(Decimal(1), Decimal(1), 10**6))
+    assert len(sample_stack.s) == 10**6 + 2
+    assert sample_stack.s.segments[0].count == 10**6
+    assert sample_stack.bos.string == "1000000"
+    assert sample_stack.s[2].string == "1"
+    assert [i.string for i in sample_stack.last_n_items(2)] == ["999999", "1000000"]
+
+
+def test_segment_cut_back(sample_stack):
+    "Popping, replacing bos and undoing work through a segment."
+    sample_stack.push_segment(
+        StackSegment(Decimal(3), Decimal(2), 5, geometric=True))
+    memento = sample_stack.memento()
+    assert [i.string for i in sample_stack.pop(2)] == ["24", "48"]
+    sample_stack.bos = StackItem(decval=Decimal(0))
+    assert [i.string for i in sample_stack.s] == ["2", "4", "3", "6", "0"]
+    sample_stack.restore(memento)
+    assert sample_stack.as_decimal() == [2, 4, 3, 6, 12, 24, 48]
+
+
+def test_pop_segment(sample_stack):
+    "Only a run of items that is all one segment can be popped as one."
+    sample_stack.push_segment(StackSegment(Decimal(1), Decimal(1), 5))
+    assert sample_stack.pop_segment(6) is None
+    segment = sample_stack.pop_segment(3)
+    assert segment.total() == 12
+    assert sample_stack.as_decimal() == [2, 4, 1, 2]
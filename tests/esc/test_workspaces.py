@@ -0,0 +1,88 @@
+from decimal import Decimal
+import pytest
+
+from esc import history, workspaces
+from esc.oops import InvalidNameError
+from esc.stack import StackItem, StackState
+from esc.workspaces import Workspaces
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def stacks():
+    history.hs.clear()
+    ss = StackState()
+    ss.push((StackItem(decval=Decimal(1)),), "one")
+    return Workspaces(ss)
+
+
+def test_switch_creates_and_returns(stacks):
+    ss = stacks.ss
+    items = ss.s
+    stacks.switch('scratch')
+    assert stacks.active_name == 'scratch'
+    assert ss.is_empty and not ss.operation_history
+    assert stacks.names == ['main', 'scratch']
+
+    ss.push((Decimal(2),), "two")
+    stacks.switch('main')
+    assert ss.s is items
+    assert ss.operation_history == ["one"]
+    stacks.switch('scratch')
+    assert [i.string for i in ss] == ["2"]
+
+
+def test_separate_undo_history(stacks):
+    ss = stacks.ss
+    ss.enter_number()
+    ss.push((Decimal(5),))
+    stacks.switch('other')
+    assert not history.hs.undo(ss)
+    stacks.switch('main')
+    assert history.hs.undo(ss)
+    assert [i.string for i in ss] == ["1"]
+
+
+def test_move_bos(stacks):
+    ss = stacks.ss
+    ss.push((Decimal(2),))
+    stacks.move_bos('other')
+    assert [i.string for i in ss] == ["1"]
+
+    stacks.switch('other')
+    assert [i.string for i in ss] == ["2"]
+    assert ss.operation_history == ["2 <- stack main"]
+    assert history.hs.undo(ss)
+    assert ss.is_empty
+
+
+def test_move_bos_to_active_stack(stacks):
+    with pytest.raises(InvalidNameError):
+        stacks.move_bos('main')
+
+
+def test_completions(stacks):
+    stacks.switch('alpha')
+    stacks.switch('beta')
+    assert stacks.completions('') == ['alpha', 'beta', 'main']
+    assert stacks.completions('a') == ['alpha']
+    assert 'beta' in stacks and 'gamma' not in stacks
+
+
+def test_idle_stacks_page_out(stacks, monkeypatch):
+    "Least recently used parked stacks go to disk and come back intact."
+    monkeypatch.setattr(workspaces, 'MAX_RESIDENT_ITEMS', 150)
+    ss = stacks.ss
+    for name in ('a', 'b', 'c'):
+        stacks.switch(name)
+        ss.push([StackItem(decval=Decimal(i)) for i in range(100)], name)
+    stacks.switch('main')
+
+    parked = {w.name: w for w in stacks._parked.values()}  # pylint: disable=protected-access
+    assert parked['a'].is_paged_out and parked['b'].is_paged_out
+    assert not parked['c'].is_paged_out
+
+    stacks.switch('a')
+    assert len(ss.s) == 100 and ss.bos.decimal == 99
+    assert ss.operation_history == ["a"]